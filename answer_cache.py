@@ -0,0 +1,151 @@
+# Two-tier answer cache in front of the LLM chain:
+#   1. exact match on the normalized transcript (LRU)
+#   2. embedding similarity for paraphrases of a question already answered
+# Both tiers expire entries after a TTL, are size bounded, and are dropped
+# whenever the knowledge base text changes.
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_version(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    answer: str = None
+    tier: str = None
+    embedding: np.ndarray = None
+    kb_version: str = None  # what the answer will have been generated against
+
+
+class _TTLCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        now = time.monotonic()
+        for key, (value, expires) in list(self.entries.items()):
+            if expires < now:
+                del self.entries[key]
+            else:
+                yield key, value
+
+    def clear(self):
+        self.entries.clear()
+
+
+class AnswerCache:
+    def __init__(self, kb_version: str, max_size: int = 256, ttl: float = 3600,
+                 embed=None, semantic_size: int = 256, threshold: float = 0.92):
+        # ``embed`` maps a string to a vector; without it only the exact tier runs
+        self.kb_version = kb_version
+        self.exact = _TTLCache(max_size, ttl)
+        self.semantic = _TTLCache(semantic_size, ttl) if embed else None
+        self.embed = embed
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stale_stores = 0
+        self._lock = threading.Lock()
+
+    def invalidate_if_changed(self, kb_version: str):
+        with self._lock:
+            if kb_version != self.kb_version:
+                self.kb_version = kb_version
+                self.exact.clear()
+                if self.semantic is not None:
+                    self.semantic.clear()
+                print("♻️ Knowledge base changed, answer cache cleared")
+
+    def lookup(self, query: str) -> CacheLookup:
+        key = normalize_query(query)
+        with self._lock:
+            kb_version = self.kb_version
+            answer = self.exact.get(key)
+            if answer is not None:
+                self.exact_hits += 1
+                return CacheLookup(key=key, answer=answer, tier="exact", kb_version=kb_version)
+
+        if self.semantic is None or not key:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(key=key, kb_version=kb_version)
+
+        # Embedding happens outside the lock; it is a network round trip
+        embedding = self._embed(key)
+        with self._lock:
+            best_score, best_answer = 0.0, None
+            for _, (vector, answer) in self.semantic.items():
+                score = float(np.dot(vector, embedding))
+                if score > best_score:
+                    best_score, best_answer = score, answer
+            if best_answer is not None and best_score >= self.threshold:
+                self.semantic_hits += 1
+                return CacheLookup(key=key, answer=best_answer, tier="semantic", embedding=embedding, kb_version=kb_version)
+            self.misses += 1
+        return CacheLookup(key=key, embedding=embedding, kb_version=kb_version)
+
+    def store(self, lookup: CacheLookup, answer: str):
+        if not lookup.key or not answer.strip():
+            return
+        with self._lock:
+            if lookup.kb_version != self.kb_version:
+                # The knowledge base changed while this answer was generated
+                self.stale_stores += 1
+                return
+            self.exact.put(lookup.key, answer)
+            if self.semantic is not None and lookup.embedding is not None:
+                self.semantic.put(lookup.key, (lookup.embedding, answer))
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def stats(self):
+        with self._lock:
+            total = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "stale_stores": self.stale_stores,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / total if total else 0.0,
+                "exact_entries": len(self.exact.entries),
+                "semantic_entries": len(self.semantic.entries) if self.semantic is not None else 0,
+                "kb_version": self.kb_version,
+            }
@@ -0,0 +1,63 @@
+# Single-pass answering. The model labels its own reply with where the
+# answer came from, so there is no need for a second "general" LLM call when
+# the first reply says "I don't know". Questions whose best retrieval score
+# is too low skip the SIT context and go to the general prompt up front.
+import re
+
+SOURCE_RE = re.compile(r"^\s*\[?\s*source\s*:\s*(context|general|unknown)\s*\]?\s*[\r\n:-]*\s*", re.IGNORECASE)
+
+# How many characters to hold back while waiting for the SOURCE tag
+TAG_LOOKAHEAD = 40
+
+
+def choose_mode(retrieval, min_score: float) -> str:
+    if not retrieval.chunks or retrieval.scores[0] < min_score:
+        return "general"
+    return "context"
+
+
+def parse_answer(text: str):
+    """Split ``SOURCE: context\\n<answer>`` into (answer, source)."""
+    match = SOURCE_RE.match(text)
+    if not match:
+        return text.strip(), "unknown"
+    return text[match.end():].strip(), match.group(1).lower()
+
+
+class TagStripper:
+    """Removes the leading SOURCE tag from a token stream as it arrives."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.source = None
+        self.passthrough = False
+
+    def feed(self, token: str) -> str:
+        if self.passthrough:
+            return token
+        self.buffer += token
+        match = SOURCE_RE.match(self.buffer)
+        # Wait until the tag line is complete (or clearly absent)
+        if match and match.end() < len(self.buffer):
+            self.source = match.group(1).lower()
+            return self._release(self.buffer[match.end():])
+        if not match and (len(self.buffer) >= TAG_LOOKAHEAD or not _could_be_tag(self.buffer)):
+            self.source = "unknown"
+            return self._release(self.buffer)
+        return ""
+
+    def flush(self) -> str:
+        if self.passthrough:
+            return ""
+        answer, self.source = parse_answer(self.buffer)
+        return self._release(answer)
+
+    def _release(self, text: str) -> str:
+        self.passthrough = True
+        self.buffer = ""
+        return text.lstrip()
+
+
+def _could_be_tag(prefix: str) -> bool:
+    stripped = prefix.lstrip().lstrip("[").lstrip().lower()
+    return "source".startswith(stripped[:6]) if stripped else True
@@ -0,0 +1,162 @@
+# Audio ingestion: decode uploaded bytes straight to the float32 mono 16 kHz
+# buffer Whisper expects, without temp files or an ffmpeg process per request.
+import io
+import re
+import wave
+
+import av
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+PCM_CONTENT_TYPES = ("audio/l16", "audio/pcm", "audio/x-pcm", "audio/x-raw", "audio/raw")
+PCM_EXTENSIONS = (".pcm", ".raw", ".s16le")
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class AudioTooLongError(AudioDecodeError):
+    def __init__(self, max_seconds: float):
+        super().__init__(f"Audio is longer than {max_seconds:g} s")
+        self.max_seconds = max_seconds
+
+
+def _check_duration(seconds: float, max_seconds: float = None):
+    if max_seconds and seconds > max_seconds:
+        raise AudioTooLongError(max_seconds)
+
+
+def sniff_format(data: bytes, content_type: str = None, filename: str = None) -> str:
+    content_type = (content_type or "").lower()
+    filename = (filename or "").lower()
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "wav"
+    if data[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if data[:4] == b"OggS":
+        return "ogg"
+    if content_type.split(";")[0].strip() in PCM_CONTENT_TYPES or filename.endswith(PCM_EXTENSIONS):
+        return "pcm"
+    return "container"
+
+
+def _pcm_rate(content_type: str, default: int = SAMPLE_RATE) -> int:
+    # e.g. "audio/l16; rate=48000"
+    match = re.search(r"rate=(\d+)", content_type or "")
+    return int(match.group(1)) if match else default
+
+
+def _pcm_channels(content_type: str) -> int:
+    match = re.search(r"channels=(\d+)", content_type or "")
+    return int(match.group(1)) if match else 1
+
+
+def resample(audio: np.ndarray, rate: int) -> np.ndarray:
+    if rate == SAMPLE_RATE or len(audio) == 0:
+        return audio
+    duration = len(audio) / rate
+    target_len = int(round(duration * SAMPLE_RATE))
+    src_t = np.linspace(0.0, duration, num=len(audio), endpoint=False)
+    dst_t = np.linspace(0.0, duration, num=target_len, endpoint=False)
+    return np.interp(dst_t, src_t, audio).astype(np.float32)
+
+
+def _int_to_float(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    if sample_width == 1:
+        audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        audio = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        audio = ints.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        audio = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported sample width: {sample_width}")
+
+    if channels > 1:
+        usable = len(audio) - len(audio) % channels
+        audio = audio[:usable].reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+def _decode_wav(data: bytes, max_seconds: float = None) -> np.ndarray:
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            rate = wav.getframerate()
+            # wave.open accepts a header with zeros here; it would divide by zero below
+            if rate <= 0 or channels <= 0 or sample_width <= 0:
+                raise AudioDecodeError(
+                    f"Invalid WAV header: {channels} channels, {sample_width}-byte samples at {rate} Hz"
+                )
+            # The header says how long it is; reject before reading any frames
+            _check_duration(wav.getnframes() / rate, max_seconds)
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        # Float or extensible WAVs aren't handled by the stdlib reader
+        return _decode_container(data, max_seconds)
+    return resample(_int_to_float(raw, sample_width, channels), rate)
+
+
+def _decode_pcm(data: bytes, content_type: str = None, max_seconds: float = None) -> np.ndarray:
+    # Raw PCM is assumed to be signed 16-bit little-endian
+    channels, rate = _pcm_channels(content_type), _pcm_rate(content_type)
+    _check_duration(len(data) / (2 * channels * rate), max_seconds)
+    usable = len(data) - len(data) % 2
+    audio = _int_to_float(data[:usable], 2, channels)
+    return resample(audio, rate)
+
+
+def _decode_container(data: bytes, max_seconds: float = None) -> np.ndarray:
+    # webm/opus, ogg, mp3, m4a ... decoded in-process by libav
+    try:
+        with av.open(io.BytesIO(data), mode="r") as container:
+            if not container.streams.audio:
+                raise AudioDecodeError("No audio stream found in upload")
+            stream = container.streams.audio[0]
+            resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+            chunks = []
+            samples = 0
+            limit = max_seconds * SAMPLE_RATE if max_seconds else None
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+                    samples += len(chunks[-1])
+                # Stop as soon as the cap is crossed instead of decoding it all
+                if limit is not None and samples > limit:
+                    raise AudioTooLongError(max_seconds)
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise AudioDecodeError(f"Could not decode audio: {e}") from e
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+
+def decode_audio(data: bytes, content_type: str = None, filename: str = None,
+                 max_seconds: float = None) -> np.ndarray:
+    """Decode an upload into a float32 mono 16 kHz NumPy buffer.
+
+    With ``max_seconds`` set, longer audio raises AudioTooLongError before
+    (or while) it is decoded rather than after.
+    """
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+
+    fmt = sniff_format(data, content_type, filename)
+    if fmt == "wav":
+        audio = _decode_wav(data, max_seconds)
+    elif fmt == "pcm":
+        audio = _decode_pcm(data, content_type, max_seconds)
+    else:
+        audio = _decode_container(data, max_seconds)
+    return np.ascontiguousarray(audio, dtype=np.float32)
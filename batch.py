@@ -0,0 +1,202 @@
+# Offline batch mode: the /upload_audio pipeline over a directory of
+# recordings or a JSONL manifest, without going through HTTP.
+#
+#   python -m batch recordings/ --out answers.jsonl
+#   python -m batch benchmarks/requests.jsonl --out faq.jsonl --concurrency 8
+#
+# Manifest lines are {"clip": path} or {"question": text}, optionally with an
+# "id" and a "session_id" for follow-ups; questions skip decode and Whisper. Recordings are decoded in a
+# process pool, several are in flight at once so Whisper's micro-batcher
+# fills its batches, and LLM calls run on the usual LLM pool (LLM_WORKERS).
+# Items are answered concurrently, so a session's follow-ups only see the
+# turns before them in manifest order with --concurrency 1.
+#
+# Every result is appended to --out as soon as it is ready. Rerunning with
+# the same --out skips items that already have an answer, so an interrupted
+# run resumes where it stopped; items that failed are tried again.
+import argparse
+import asyncio
+import functools
+import json
+import mimetypes
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import settings
+from audio_io import AudioDecodeError, AudioTooLongError
+from cancellation import CancelToken, RequestCancelled
+from telemetry import RequestTrace
+
+AUDIO_EXTENSIONS = (".wav", ".webm", ".opus", ".ogg", ".mp3", ".m4a", ".flac", ".pcm")
+
+
+def iter_directory(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                yield {"id": os.path.relpath(path, root), "clip": path}
+
+
+def iter_manifest(path: str):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            session = {"session_id": entry["session_id"]} if entry.get("session_id") else {}
+            if "clip" in entry:
+                clip = entry["clip"] if os.path.isabs(entry["clip"]) else os.path.join(base, entry["clip"])
+                yield {"id": str(entry.get("id", entry["clip"])), "clip": clip, **session}
+            elif "question" in entry:
+                yield {"id": str(entry.get("id", entry["question"])), "question": entry["question"], **session}
+            else:
+                print(f"⚠️ {path}:{number}: expected a \"clip\" or \"question\" field")
+
+
+def iter_items(source: str):
+    # Generators, so a large directory or manifest is never held in memory
+    return iter_directory(source) if os.path.isdir(source) else iter_manifest(source)
+
+
+def load_done(path: str):
+    """IDs already answered in a previous run of the same --out file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # the last line of a run that was killed mid-write
+            if "error" not in result:
+                done.add(result["id"])
+    return done
+
+
+def end_partial_line(path: str):
+    # A run killed mid-write leaves a line without its newline; appending to
+    # it would corrupt the next result too
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+async def process(app, item, decode, timeout: float):
+    trace = RequestTrace("batch")
+    cancel = CancelToken(timeout or None)
+    route_taken, status = "none", "ok"
+    result = {"id": item["id"]}
+    try:
+        if "question" in item:
+            answer = await app.answer_query(item["question"], trace, cancel, session_id=item.get("session_id"))
+        else:
+            with trace.stage("upload_read"):
+                with open(item["clip"], "rb") as f:
+                    data = f.read()
+            answer = await app.answer_recording(
+                data, trace, cancel, content_type=mimetypes.guess_type(item["clip"])[0],
+                filename=item["clip"], decode=decode, session_id=item.get("session_id"),
+            )
+        route_taken = answer.get("route", "none")
+        result.update(answer)
+    except (OSError, AudioDecodeError, AudioTooLongError) as e:
+        status = "bad_audio"
+        result["error"] = str(e)
+    except RequestCancelled as cancelled:
+        status = cancelled.reason
+        trace.record_cancel(cancelled.reason)
+        result["error"] = str(cancelled)
+    except Exception as e:
+        status = "error"
+        result["error"] = str(e)
+    finally:
+        trace.finish(route_taken, status)
+    result.update(request_id=trace.request_id, timings=trace.timings())
+    return result
+
+
+async def run(args):
+    # Imported here so the decode processes, which re-import this module,
+    # don't load the whole app
+    import main as app
+
+    done = load_done(args.out)
+    if done:
+        print(f"↩️ Resuming: {len(done)} items already answered in {args.out}")
+    end_partial_line(args.out)
+
+    # Spawned, not forked: the parent already has model and pool threads
+    decode_pool = ProcessPoolExecutor(
+        max_workers=args.decode_processes, mp_context=multiprocessing.get_context("spawn"),
+    )
+    loop = asyncio.get_running_loop()
+
+    async def decode(fn, *fn_args, **kwargs):
+        return await loop.run_in_executor(decode_pool, functools.partial(fn, *fn_args, **kwargs))
+
+    print("⏳ Loading models...")
+    app.models.start()
+    # Required models retry until they load; don't wait forever offline
+    await loop.run_in_executor(None, app.models.wait, args.load_timeout or None)
+    if not app.models.ready:
+        raise SystemExit(f"Models failed to load: {json.dumps(app.models.status())}")
+
+    items = (item for item in iter_items(args.source) if item["id"] not in done)
+    counts = {"ok": 0, "error": 0}
+    started = time.perf_counter()
+
+    with open(args.out, "a", encoding="utf-8") as out:
+        async def worker():
+            # Pulling from the shared generator needs no lock: there is no
+            # await between checking for and taking the next item
+            for item in items:
+                result = await process(app, item, decode, args.timeout)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["error" if "error" in result else "ok"] += 1
+                if "error" in result:
+                    print(f"❌ {item['id']}: {result['error']}")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        finally:
+            decode_pool.shutdown(cancel_futures=True)
+            app.executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    total = counts["ok"] + counts["error"]
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"✅ {counts['ok']} answered, {counts['error']} failed in {elapsed:.1f}s ({rate:.2f} items/s) -> {args.out}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and answer recordings or questions offline")
+    parser.add_argument("source", help="directory of recordings or a JSONL manifest")
+    parser.add_argument("--out", required=True, help="JSONL results file; rerun with the same file to resume")
+    parser.add_argument(
+        "--concurrency", type=int, default=max(settings.STT_BATCH_MAX_SIZE, settings.LLM_WORKERS),
+        help="items in flight at once (default: enough to fill a Whisper batch)",
+    )
+    parser.add_argument("--decode-processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--timeout", type=float, default=0, help="per-item deadline in seconds, 0 for none")
+    parser.add_argument("--load-timeout", type=float, default=600, help="seconds to wait for models to load, 0 for no limit")
+    args = parser.parse_args()
+
+    counts = asyncio.run(run(args))
+    if counts["error"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
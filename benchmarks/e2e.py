@@ -0,0 +1,376 @@
+# End-to-end load test for /upload_audio against a fake Ollama.
+#
+#   python -m benchmarks.e2e --concurrency 1,2,4,8 --json results/before.json
+#   python -m benchmarks.e2e --json results/after.json --baseline results/before.json
+#
+# Starts benchmarks.fake_ollama and a uvicorn server for main:app, replays the
+# corpus in benchmarks/requests.jsonl at each concurrency level and reports
+# per-stage and end-to-end p50/p95/p99, throughput and peak server RSS.
+# Corpus lines are {"clip": path} for recorded audio or {"question": text},
+# which is rendered to a wav once with pyttsx3 and cached. With --baseline
+# the run exits non-zero when p95 or throughput regress beyond --tolerance.
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.fake_ollama import FakeOllamaConfig, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(ROOT, "benchmarks", "requests.jsonl")
+CLIP_CACHE = os.path.join(ROOT, "benchmarks", ".clips")
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(values):
+    if not values:
+        return {f"p{p}_s": None for p in PERCENTILES}
+    return {f"p{p}_s": round(float(np.percentile(values, p)), 4) for p in PERCENTILES}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# === Corpus ===
+def synthesize_question(text: str) -> str:
+    path = os.path.join(CLIP_CACHE, hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] + ".wav")
+    if not os.path.exists(path):
+        import pyttsx3
+
+        os.makedirs(CLIP_CACHE, exist_ok=True)
+        engine = pyttsx3.init()
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+    return path
+
+
+def load_corpus(path: str):
+    clips = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "clip" in entry:
+                clip = entry["clip"] if os.path.isabs(entry["clip"]) else os.path.join(ROOT, entry["clip"])
+            else:
+                try:
+                    clip = synthesize_question(entry["question"])
+                except Exception as e:
+                    print(f"⚠️ Skipping question {entry['question']!r}: could not synthesize ({e})")
+                    continue
+            with open(clip, "rb") as audio:
+                data = audio.read()
+            content_type = mimetypes.guess_type(clip)[0] or "application/octet-stream"
+            clips.append({"name": os.path.basename(clip), "data": data, "content_type": content_type})
+    if not clips:
+        raise SystemExit(f"No usable clips in {path}")
+    return clips
+
+
+# === Server under test ===
+def read_rss_mb(pid: int, field: str = "VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Polls the server's RSS so each concurrency level gets its own peak."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        peak, self.peak = self.peak, read_rss_mb(self.pid) or 0.0
+        return round(peak, 1) if peak else None
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_app(port: int, ollama_url: str, scratch: str, env_overrides):
+    env = dict(os.environ)
+    env.update({
+        "OLLAMA_BASE_URL": ollama_url,
+        "LLM_PROVIDERS": "ollama",
+        "TTS_ENABLED": "false",
+        # The fake's hashed vectors must never land in the real index or
+        # caches: everything persisted goes to a scratch dir, under a model
+        # name no real index was built with
+        "EMBED_MODEL": "fake-e2e-embed",
+        "KB_INDEX_DIR": os.path.join(scratch, "kb_index"),
+        "TRANSCRIPT_CACHE_DIR": os.path.join(scratch, "transcripts"),
+        "TTS_CACHE_DIR": os.path.join(scratch, "tts"),
+    })
+    env.update(env_overrides)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env,
+    )
+
+
+def wait_ready(url: str, process, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited during startup (code {process.returncode})")
+        try:
+            # /readyz answers 503 until Whisper and the knowledge index are loaded
+            with urllib.request.urlopen(url + "/readyz", timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise SystemExit(f"Server at {url} was not ready after {timeout:.0f}s")
+
+
+# === Client ===
+def post_clip(url: str, clip, timeout: float):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{clip["name"]}"\r\n'
+        f"Content-Type: {clip['content_type']}\r\n\r\n"
+    ).encode("utf-8") + clip["data"] + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    request = urllib.request.Request(
+        url + "/upload_audio", data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read())
+            status = "error" if "error" in payload else "ok"
+    except urllib.error.HTTPError as e:
+        payload = {}
+        status = "rejected" if e.code == 503 else f"http_{e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        payload = {"error": str(e)}
+        status = "error"
+    return {
+        "status": status,
+        "latency_s": time.perf_counter() - start,
+        "route": payload.get("route"),
+        "timings": payload.get("timings", {}),
+    }
+
+
+def run_level(url: str, clips, concurrency: int, requests: int, timeout: float):
+    jobs = [clips[i % len(clips)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda clip: post_clip(url, clip, timeout), jobs))
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == "ok"]
+    stages = {}
+    for r in ok:
+        for stage, seconds in r["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    routes = {}
+    for r in ok:
+        routes[r["route"]] = routes.get(r["route"], 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "rejected": sum(r["status"] == "rejected" for r in results),
+        "errors": sum(r["status"] not in ("ok", "rejected") for r in results),
+        "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0.0,
+        "wall_s": round(wall, 3),
+        "e2e": percentiles([r["latency_s"] for r in ok]),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "routes": routes,
+    }
+
+
+# === Regression check ===
+def compare(current, baseline, tolerance: float):
+    """Return human-readable regressions of ``current`` against ``baseline``."""
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    regressions = []
+    for level in current["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        c = level["concurrency"]
+        for pct in ("p50_s", "p95_s", "p99_s"):
+            old, new = before["e2e"].get(pct), level["e2e"].get(pct)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"c={c} e2e {pct}: {old:.3f}s -> {new:.3f}s")
+        old, new = before["throughput_rps"], level["throughput_rps"]
+        if old and new < old * (1 - tolerance):
+            regressions.append(f"c={c} throughput: {old:.2f} -> {new:.2f} req/s")
+        old, new = before.get("peak_rss_mb"), level.get("peak_rss_mb")
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"c={c} peak RSS: {old:.0f} -> {new:.0f} MB")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for /upload_audio")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated concurrency ramp")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default 4 x concurrency, min 8)")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=20)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on (repeats become hits)")
+    parser.add_argument("--transcript-cache", action="store_true", help="leave the transcript cache on (repeats skip STT)")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server, repeatable")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout")
+    parser.add_argument("--json", help="write the machine-readable report here")
+    parser.add_argument("--baseline", help="previous --json report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    clips = load_corpus(args.corpus)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    fake_config = FakeOllamaConfig(args.first_token_ms / 1000, args.tokens_per_s, args.prefill_tokens_per_s)
+    fake_server, ollama_url = start_server(fake_config)
+    print(f"🦙 Fake Ollama on {ollama_url}")
+
+    process = None
+    scratch = None
+    env_overrides = dict(kv.split("=", 1) for kv in args.env)
+    if not args.answer_cache:
+        env_overrides.setdefault("ANSWER_CACHE_ENABLED", "false")
+    if not args.transcript_cache:
+        env_overrides.setdefault("TRANSCRIPT_CACHE_ENABLED", "false")
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        scratch = tempfile.mkdtemp(prefix="envision-e2e-")
+        process = start_app(port, ollama_url, scratch, env_overrides)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "corpus": os.path.relpath(args.corpus, ROOT),
+            "clips": len(clips),
+            "fake_ollama": {
+                "first_token_ms": args.first_token_ms,
+                "tokens_per_s": args.tokens_per_s,
+                "prefill_tokens_per_s": args.prefill_tokens_per_s,
+            },
+            "server_env": env_overrides,
+        },
+        "levels": [],
+    }
+
+    sampler = None
+    try:
+        started = time.perf_counter()
+        wait_ready(url, process, args.startup_timeout)
+        report["meta"]["startup_s"] = round(time.perf_counter() - started, 2) if process else None
+        if process is not None:
+            report["meta"]["startup_rss_mb"] = read_rss_mb(process.pid)
+            sampler = RssSampler(process.pid)
+
+        print(f"🔥 Warming up with {len(clips)} clip(s)...")
+        for clip in clips:
+            post_clip(url, clip, args.timeout)
+        if sampler is not None:
+            sampler.reset()
+
+        print(f"{'conc':>5} {'ok':>5} {'rej':>4} {'err':>4} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'RSS MB':>7}")
+        for concurrency in levels:
+            requests = args.requests or max(8, 4 * concurrency)
+            row = run_level(url, clips, concurrency, requests, args.timeout)
+            row["peak_rss_mb"] = sampler.reset() if sampler is not None else None
+            report["levels"].append(row)
+            e2e = row["e2e"]
+            print(f"{concurrency:>5} {row['ok']:>5} {row['rejected']:>4} {row['errors']:>4} "
+                  f"{row['throughput_rps']:>7.2f} {e2e['p50_s'] or 0:>7.3f} {e2e['p95_s'] or 0:>7.3f} "
+                  f"{e2e['p99_s'] or 0:>7.3f} {row['peak_rss_mb'] or 0:>7.0f}")
+
+        if process is not None:
+            report["meta"]["peak_rss_mb"] = read_rss_mb(process.pid, "VmHWM")
+        report["meta"]["fake_ollama"]["requests"] = fake_config.requests
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+        fake_server.shutdown()
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print("   " + line)
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# A local stand-in for the Ollama HTTP API so the whole pipeline can be
+# benchmarked without a GPU or a pulled model.
+#
+#   python -m benchmarks.fake_ollama --port 11500 --first-token-ms 300 --tokens-per-s 20
+#
+# Implements the endpoints langchain_ollama uses: /api/generate and /api/chat
+# (streamed NDJSON or a single JSON reply) and /api/embed. Embeddings are a
+# hashed bag of words, so similar questions still get similar vectors and
+# retrieval / the semantic cache behave roughly like they do for real.
+#
+# With --load-ms the "model" unloads when its keep_alive runs out and the
+# next generation pays the load time (reported as load_duration), so cold
+# starts and the keep-alive keeper can be exercised too.
+#
+# Like Ollama, the fake keeps the last prompt it evaluated and only "prefills"
+# the part after the longest common prefix, so --prefill-tokens-per-s shows
+# what a byte-stable prompt prefix saves.
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 256
+DEFAULT_REPLY = (
+    "SOURCE: context\n"
+    "Srinivas Institute of Technology is located in Valachil, Mangaluru. "
+    "It offers undergraduate and postgraduate programs in engineering and management, "
+    "and the Training and Placement cell helps students with internships and campus recruitment."
+)
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+DURATION_RE = re.compile(r"^(-?[0-9.]+)(ms|s|m|h)?$")
+DEFAULT_KEEP_ALIVE_S = 300.0
+
+
+def keep_alive_seconds(value) -> float:
+    """Ollama keep_alive ("5m", "1h", 30, -1) in seconds; negative = forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE_S
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = DURATION_RE.match(str(value).strip())
+        if not match:
+            return DEFAULT_KEEP_ALIVE_S
+        seconds = float(match.group(1)) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+    return math.inf if seconds < 0 else seconds
+
+
+def embed_text(text: str):
+    vector = [0.0] * EMBED_DIM
+    for word in WORD_RE.findall(text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % EMBED_DIM
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOllamaConfig:
+    def __init__(self, first_token_s: float = 0.3, tokens_per_s: float = 20.0,
+                 prefill_tokens_per_s: float = 0.0, reply: str = DEFAULT_REPLY, load_s: float = 0.0):
+        self.first_token_s = first_token_s
+        self.tokens_per_s = tokens_per_s
+        # 0 disables prompt-length dependent prefill time
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.reply = reply
+        self.load_s = load_s
+        self.loads = 0
+        self.requests = 0
+        self._loaded_until = 0.0
+        self._cached_prompt = ""
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def touch(self, keep_alive) -> float:
+        """Mark the model used now; returns the load time this call pays."""
+        with self._lock:
+            now = time.monotonic()
+            cold = now >= self._loaded_until
+            self._loaded_until = now + keep_alive_seconds(keep_alive)
+            if cold:
+                self.loads += 1
+            if cold:
+                self._cached_prompt = ""  # unloading drops the KV cache too
+            return self.load_s if cold else 0.0
+
+    def evaluate(self, text: str) -> int:
+        """Prompt tokens to prefill for ``text`` given the cached prompt."""
+        with self._lock:
+            cached = os.path.commonprefix([self._cached_prompt, text])
+            self._cached_prompt = text
+        return max(1, (len(text) - len(cached)) // 4)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeOllamaConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake", "model": "fake", "size": 0, "digest": "fake"}]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_POST(self):
+        self.config.count()
+        request = self._read_json()
+        if self.path in ("/api/embed", "/api/embeddings"):
+            self._embed(request)
+        elif self.path == "/api/generate":
+            self._generate(request, request.get("prompt", ""), chat=False, system=request.get("system") or "")
+        elif self.path == "/api/chat":
+            prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+            self._generate(request, prompt, chat=True)
+        else:
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def _embed(self, request):
+        if self.path == "/api/embeddings":
+            self._send_json({"embedding": embed_text(request.get("prompt", ""))})
+            return
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self._send_json({"model": request.get("model", "fake"), "embeddings": [embed_text(t) for t in inputs]})
+
+    def _generate(self, request, prompt: str, chat: bool, system: str = ""):
+        config = self.config
+        model = request.get("model", "fake")
+        words = config.reply.split(" ")
+        tokens = [w if i == 0 else " " + w for i, w in enumerate(words)]
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:max(1, num_predict)]
+
+        start = time.perf_counter()
+        load_s = config.touch(request.get("keep_alive"))
+        time.sleep(load_s)
+        if not chat and not prompt:
+            # An empty prompt only loads the model (and resets keep_alive)
+            self._send_json({
+                "model": model, "created_at": _now(), "response": "", "done": True,
+                "done_reason": "load", "load_duration": int(load_s * 1e9),
+            })
+            return
+        prompt_tokens = config.evaluate(f"{system}\n\n{prompt}" if system else prompt)
+        prefill_start = time.perf_counter()
+        delay = config.first_token_s
+        if config.prefill_tokens_per_s > 0:
+            delay += prompt_tokens / config.prefill_tokens_per_s
+        time.sleep(delay)
+        prefill_s = time.perf_counter() - prefill_start
+
+        def chunk(text, done):
+            payload = {"model": model, "created_at": _now(), "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                total = time.perf_counter() - start
+                payload.update({
+                    "done_reason": "stop",
+                    "total_duration": int(total * 1e9),
+                    "load_duration": int(load_s * 1e9),
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(prefill_s * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": int((total - load_s - prefill_s) * 1e9),
+                })
+            return payload
+
+        interval = 1.0 / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+        if not request.get("stream", True):
+            time.sleep(interval * max(0, len(tokens) - 1))
+            self._send_json(chunk("".join(tokens), True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(interval)
+            self._write_chunk(chunk(token, False))
+        self._write_chunk(chunk("", True))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload):
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(config: FakeOllamaConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the fake server on a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (FakeOllamaHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=20)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0, help="0 = ignore prompt length")
+    parser.add_argument("--load-ms", type=float, default=0, help="model load time after keep_alive expires")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        args.first_token_ms / 1000, args.tokens_per_s, args.prefill_tokens_per_s, load_s=args.load_ms / 1000,
+    )
+    server, url = start_server(config, args.host, args.port)
+    print(f"🦙 Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Prefill time per prompt layout, measured by Ollama itself.
+#
+#   python -m benchmarks.prefill --rounds 3
+#   python -m benchmarks.prefill --fake --prefill-tokens-per-s 200   # offline
+#
+# Sends every question in the corpus to Ollama in the "retrieval" layout
+# (top-k chunks, rebuilt per question) and the "prefix" layout (the whole
+# knowledge base as a fixed system prompt, question last) and reports the
+# prompt_eval_duration / prompt_eval_count Ollama returns. Generation is
+# capped at one token so the numbers are prefill only.
+import argparse
+import json
+
+import numpy as np
+from langchain_ollama import OllamaEmbeddings
+
+import settings
+from benchmarks.e2e import DEFAULT_CORPUS
+from benchmarks.fake_ollama import FakeOllamaConfig, start_server
+from ollama_client import make_client, model_options
+from prompts import context_prompt, general_prompt, prefix_prompt, prefix_system
+from retrieval import Retriever, load_text
+
+LAYOUTS = ("retrieval", "prefix")
+
+
+def load_questions(path: str):
+    questions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if "question" in entry:
+                    questions.append(entry["question"])
+    if not questions:
+        raise SystemExit(f"No questions in {path}")
+    return questions
+
+
+def build_prompts(layout: str, questions, retriever, system):
+    if layout == "prefix":
+        return [prefix_prompt(q, system) for q in questions]
+    prompts = []
+    for question in questions:
+        retrieval = retriever.search(question)
+        if retrieval.chunks and retrieval.scores[0] >= settings.RETRIEVAL_MIN_SCORE:
+            prompts.append(context_prompt(question, retrieval.context))
+        else:
+            prompts.append(general_prompt(question))
+    return prompts
+
+
+def run_layout(client, model: str, options, layout: str, prompts, rounds: int):
+    options = {**options, "num_predict": 1}
+    # Warm-up: load the model and, for prefix, leave the prefix in the cache
+    client.generate(model=model, prompt=prompts[0].prompt, system=prompts[0].system, options=options)
+
+    seconds, tokens = [], []
+    for _ in range(rounds):
+        for llm_prompt in prompts:
+            response = client.generate(
+                model=model, prompt=llm_prompt.prompt, system=llm_prompt.system, options=options,
+            )
+            seconds.append((response.prompt_eval_duration or 0) / 1e9)
+            tokens.append(response.prompt_eval_count or 0)
+    return {
+        "layout": layout,
+        "calls": len(seconds),
+        "prompt_tokens_sent": int(np.mean([p.tokens for p in prompts])),
+        "prefill_tokens_mean": round(float(np.mean(tokens)), 1),
+        "prefill_p50_s": round(float(np.percentile(seconds, 50)), 4),
+        "prefill_p95_s": round(float(np.percentile(seconds, 95)), 4),
+        "prefill_total_s": round(float(np.sum(seconds)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Ollama prefill time for the prompt layouts")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the questions per layout")
+    parser.add_argument("--model", default=settings.OLLAMA_MODEL)
+    parser.add_argument("--url", default=settings.OLLAMA_BASE_URL)
+    parser.add_argument("--fake", action="store_true", help="use benchmarks.fake_ollama instead of --url")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=200, help="fake server prefill speed")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    url = args.url
+    if args.fake:
+        _, url = start_server(FakeOllamaConfig(first_token_s=0.0, prefill_tokens_per_s=args.prefill_tokens_per_s))
+        print(f"🦙 Fake Ollama on {url}")
+
+    questions = load_questions(args.corpus)
+    text = load_text(settings.KNOWLEDGE_FILE)
+    retriever = Retriever(
+        OllamaEmbeddings(model=settings.EMBED_MODEL, base_url=url),
+        top_k=settings.RETRIEVAL_TOP_K,
+        token_budget=settings.RETRIEVAL_TOKEN_BUDGET,
+        chunk_size=settings.RETRIEVAL_CHUNK_SIZE,
+    )
+    retriever.index(text)
+    system = prefix_system(text)
+
+    client = make_client(url, max_connections=1, timeout=settings.OLLAMA_TIMEOUT_S)
+    options = model_options(settings.OLLAMA_NUM_CTX, settings.OLLAMA_NUM_THREAD)
+
+    results = []
+    print(f"{'layout':>10} {'sent tok':>9} {'prefilled':>10} {'p50 s':>8} {'p95 s':>8} {'total s':>8}")
+    for layout in LAYOUTS:
+        prompts = build_prompts(layout, questions, retriever, system)
+        row = run_layout(client, args.model, options, layout, prompts, args.rounds)
+        results.append(row)
+        print(f"{layout:>10} {row['prompt_tokens_sent']:>9} {row['prefill_tokens_mean']:>10.0f} "
+              f"{row['prefill_p50_s']:>8.3f} {row['prefill_p95_s']:>8.3f} {row['prefill_total_s']:>8.2f}")
+
+    baseline, prefix = results
+    if prefix["prefill_p50_s"] > 0:
+        print(f"⚡ prefix layout: p50 prefill {baseline['prefill_p50_s'] / prefix['prefill_p50_s']:.1f}x faster")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Throughput vs p95 latency for Whisper micro-batching.
+#
+#   python -m benchmarks.stt_batch --clients 8 --windows 0,20,50 --batch-sizes 1,4,8
+#
+# Each client thread sends the clip back to back; batch size 1 is the
+# unbatched baseline.
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import whisper
+
+from audio_io import decode_audio
+from stt_batcher import WhisperBatcher
+
+DEFAULT_CLIP = "frontend/src/assets/audiosample.opus"
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def run_config(model, audio, clients, requests_per_client, window_ms, max_batch):
+    batcher = WhisperBatcher(model, window_ms=window_ms, max_batch=max_batch)
+    batcher.transcribe(audio)  # warm-up
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            batcher.transcribe(audio)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    batcher.close()
+
+    return {
+        "window_ms": window_ms,
+        "max_batch": max_batch,
+        "clients": clients,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / wall,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "avg_batch_size": batcher.stats()["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper micro-batching")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--clip", default=DEFAULT_CLIP)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--windows", default="0,20,50", help="comma-separated batch windows in ms")
+    parser.add_argument("--batch-sizes", default="1,4,8", help="comma-separated max batch sizes")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    print(f"🎧 Loading Whisper model '{args.model}'...")
+    model = whisper.load_model(args.model)
+    with open(args.clip, "rb") as f:
+        audio = decode_audio(f.read(), filename=args.clip)
+
+    results = []
+    print(f"{'window':>8} {'batch':>6} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'avg batch':>10}")
+    for max_batch in (int(b) for b in args.batch_sizes.split(",")):
+        for window_ms in (float(w) for w in args.windows.split(",")):
+            if max_batch == 1 and window_ms > 0:
+                continue  # windows are meaningless without batching
+            row = run_config(model, audio, args.clients, args.requests, window_ms, max_batch)
+            results.append(row)
+            print(f"{row['window_ms']:>8.0f} {row['max_batch']:>6} {row['throughput_rps']:>8.2f} "
+                  f"{row['p50_s']:>8.3f} {row['p95_s']:>8.3f} {row['avg_batch_size']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
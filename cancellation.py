@@ -0,0 +1,53 @@
+# Request-scoped cancellation. A CancelToken is created per request and
+# handed down to the worker threads (Whisper batcher, LLM streams), which
+# check it between units of work: batches, decoder steps, streamed tokens.
+# It trips when the client disconnects, when the request's deadline passes
+# or when a parent token trips.
+import threading
+import time
+
+
+class RequestCancelled(Exception):
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Request {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self, timeout: float = None, parent: "CancelToken" = None):
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_set(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.is_set():
+            self.cancel(self.parent.reason)
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+            return True
+        return False
+
+    def check(self):
+        if self.is_set():
+            raise RequestCancelled(self.reason)
+
+    def remaining(self):
+        """Seconds until the deadline (None without one)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+def check(cancel):
+    """``cancel.check()`` that tolerates ``cancel=None``."""
+    if cancel is not None:
+        cancel.check()
@@ -0,0 +1,120 @@
+# Inference executor: keeps blocking decode / Whisper / LLM calls off the
+# asyncio event loop and bounds how many requests can be in flight.
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import settings
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, try again later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    def __init__(self, decode_workers: int, stt_workers: int, llm_workers: int,
+                 max_pending: int, retry_after: int, tts_workers: int = 2):
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+        self.stt_pool = ThreadPoolExecutor(max_workers=stt_workers, thread_name_prefix="stt")
+        self.llm_pool = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="llm")
+        self.tts_pool = ThreadPoolExecutor(max_workers=tts_workers, thread_name_prefix="tts")
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.pending >= self.max_pending:
+            raise QueueFullError(self.retry_after)
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    async def _run(self, pool, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+    async def run_decode(self, fn, *args, **kwargs):
+        return await self._run(self.decode_pool, fn, *args, **kwargs)
+
+    async def run_stt(self, fn, *args, **kwargs):
+        return await self._run(self.stt_pool, fn, *args, **kwargs)
+
+    async def run_llm(self, fn, *args, **kwargs):
+        return await self._run(self.llm_pool, fn, *args, **kwargs)
+
+    async def run_tts(self, fn, *args, **kwargs):
+        return await self._run(self.tts_pool, fn, *args, **kwargs)
+
+    async def stream_llm(self, fn, *args, **kwargs):
+        """Iterate a blocking generator (e.g. ``llm.stream``) on the LLM pool.
+
+        If the consumer stops early (error, disconnect, task cancelled) the
+        generator is closed on its thread, releasing the worker and whatever
+        connection it was reading from.
+        """
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        done = object()
+        stopped = threading.Event()
+
+        def produce():
+            iterator = fn(*args, **kwargs)
+            try:
+                for item in iterator:
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, e)
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+                loop.call_soon_threadsafe(items.put_nowait, done)
+
+        producer = loop.run_in_executor(self.llm_pool, produce)
+        finished = False
+        try:
+            while True:
+                item = await items.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            finished = True
+        finally:
+            if not finished:
+                stopped.set()
+        await producer
+
+    def stats(self):
+        return {"pending": self.pending, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        for pool in (self.decode_pool, self.stt_pool, self.llm_pool, self.tts_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# With micro-batching the STT threads mostly wait on the batcher, so there
+# must be enough of them to fill a batch
+_stt_workers = settings.STT_WORKERS
+if settings.STT_BATCHING:
+    _stt_workers = max(_stt_workers, settings.STT_BATCH_MAX_SIZE)
+
+executor = InferenceExecutor(
+    decode_workers=settings.DECODE_WORKERS,
+    stt_workers=_stt_workers,
+    llm_workers=settings.LLM_WORKERS,
+    max_pending=settings.MAX_PENDING_REQUESTS,
+    retry_after=settings.RETRY_AFTER_SECONDS,
+    tts_workers=settings.TTS_POOL_SIZE,
+)
@@ -0,0 +1,157 @@
+# Persistent vector index for the knowledge base.
+#
+# Layout of the index directory:
+#   manifest.json        chunk ids/texts/positions, embedding model and source,
+#                        vector dimension, probe embedding, vectors file name
+#   vectors-<hash>.npy   float32 matrix, one L2-normalized row per chunk
+#
+# On startup the manifest is read and the vectors are memory-mapped. Chunks
+# are identified by a hash of their content, so after an edit to the source
+# text only new or changed chunks are re-embedded. A new vectors file is
+# written first and the manifest is swapped in with os.replace, so readers
+# never see a half-written index.
+#
+# The model name alone doesn't pin down the vectors: the same tag can be
+# re-pulled with new weights or served by another Ollama. So the manifest
+# also keeps the embedding of a fixed probe sentence; on load the probe is
+# embedded again and the saved index is only used if both still agree.
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from retrieval import Chunk, normalize_rows, split_chunks
+
+MANIFEST = "manifest.json"
+PROBE_TEXT = "Srinivas Institute of Technology, Valachil, Mangaluru"
+# Same model and weights give (nearly) the same vector; CPU float noise aside
+PROBE_MIN_SIMILARITY = 0.99
+
+
+class KnowledgeIndex:
+    def __init__(self, directory: str, embeddings, model_name: str, chunk_size: int = 600, source: str = ""):
+        # ``source`` names where the embeddings come from, e.g. the Ollama URL
+        self.directory = directory
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.chunk_size = chunk_size
+        self.source = source
+        self._probe = None
+        self.chunks = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.last_sync = {}
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def load(self) -> bool:
+        """Load the saved index; returns False if there is none usable."""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (
+                manifest.get("model") != self.model_name
+                or manifest.get("chunk_size") != self.chunk_size
+                or manifest.get("source") != self.source
+            ):
+                print("♻️ Saved index was built with different settings, ignoring it")
+                return False
+            matrix = np.load(os.path.join(self.directory, manifest["vectors"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ No usable saved index ({e})")
+            return False
+
+        chunks = [Chunk(id=c["id"], text=c["text"], position=c["position"]) for c in manifest["chunks"]]
+        if len(chunks) != len(matrix) or (chunks and (matrix.ndim != 2 or matrix.shape[1] != manifest.get("dim"))):
+            print("♻️ Saved vectors don't match the manifest, ignoring them")
+            return False
+        # Raises if the model can't be reached; the caller retries the load
+        probe = self.probe()
+        saved_probe = np.asarray(manifest.get("probe") or [], dtype=np.float32)
+        if (
+            len(saved_probe) != len(probe)
+            or (chunks and matrix.shape[1] != len(probe))
+            or float(saved_probe @ probe) < PROBE_MIN_SIMILARITY
+        ):
+            print("♻️ The embedding model's output changed since the index was built, ignoring it")
+            return False
+        with self._lock:
+            self.chunks, self.matrix = chunks, matrix
+        print(f"📂 Loaded {len(chunks)} indexed chunks from {self.directory}")
+        return True
+
+    def probe(self) -> np.ndarray:
+        """Normalized embedding of PROBE_TEXT from the current model (cached)."""
+        if self._probe is None:
+            vector = self.embeddings.embed_documents([PROBE_TEXT])[0]
+            self._probe = normalize_rows(np.asarray([vector], dtype=np.float32))[0]
+        return self._probe
+
+    def sync(self, text: str):
+        """Bring the index in line with ``text``, embedding only changed chunks."""
+        chunks = split_chunks(text, self.chunk_size)
+        with self._lock:
+            known = {chunk.id: row for row, chunk in enumerate(self.chunks)}
+            old_matrix = self.matrix
+
+        missing = [c for c in chunks if c.id not in known]
+        new_vectors = {}
+        if missing:
+            print(f"🔢 Embedding {len(missing)} new or changed chunks...")
+            vectors = self.embeddings.embed_documents([c.text for c in missing])
+            vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            new_vectors = {c.id: v for c, v in zip(missing, vectors)}
+
+        unchanged = (
+            not missing
+            and len(chunks) == len(self.chunks)
+            and all(a.id == b.id and a.position == b.position for a, b in zip(chunks, self.chunks))
+        )
+        self.last_sync = {"chunks": len(chunks), "embedded": len(missing), "reused": len(chunks) - len(missing)}
+        if unchanged:
+            return self.chunks, self.matrix
+
+        rows = [new_vectors[c.id] if c.id in new_vectors else old_matrix[known[c.id]] for c in chunks]
+        matrix = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+        self._save(chunks, matrix)
+        with self._lock:
+            self.chunks, self.matrix = chunks, matrix
+        return chunks, matrix
+
+    def _save(self, chunks, matrix):
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256("".join(c.id for c in chunks).encode("utf-8")).hexdigest()[:16]
+        vectors_name = f"vectors-{digest}.npy"
+        vectors_path = os.path.join(self.directory, vectors_name)
+
+        tmp_vectors = vectors_path + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_vectors, vectors_path)
+
+        manifest = {
+            "model": self.model_name,
+            "source": self.source,
+            "chunk_size": self.chunk_size,
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "probe": self.probe().tolist(),
+            "vectors": vectors_name,
+            "chunks": [{"id": c.id, "text": c.text, "position": c.position} for c in chunks],
+        }
+        tmp_manifest = self.manifest_path + ".tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_manifest, self.manifest_path)
+
+        # Old vector files are only dropped once the new manifest is live
+        for name in os.listdir(self.directory):
+            if name.startswith("vectors-") and name.endswith(".npy") and name != vectors_name:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # still mapped on platforms that lock open files
+        print(f"💾 Saved index with {len(chunks)} chunks to {self.directory}")
@@ -0,0 +1,294 @@
+# Structured fast path for table-style questions ("who heads AIML", "who is
+# the placement officer", "what PG programs are there"). srinivas_data.txt is
+# parsed into departments, faculty, programs and the placement officer, and
+# a small intent router answers direct lookups without calling the LLM.
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+TITLES = ("dr", "mr", "mrs", "ms", "prof")
+STOPWORDS = {
+    "the", "of", "and", "in", "is", "who", "what", "are", "for", "a", "an", "at",
+    "department", "dept", "engineering", "sit", "tell", "me", "about", "please",
+}
+
+
+@dataclass
+class Faculty:
+    name: str
+    designation: str
+    qualification: str
+    department: str
+
+    @property
+    def bare_name(self) -> str:
+        return strip_title(self.name)
+
+
+@dataclass
+class Department:
+    name: str
+    aliases: set = field(default_factory=set)
+    faculty: list = field(default_factory=list)
+
+    @property
+    def head(self):
+        for member in self.faculty:
+            if "head" in member.designation.lower():
+                return member
+        return None
+
+
+@dataclass
+class KnowledgeTables:
+    departments: dict = field(default_factory=dict)
+    programs: dict = field(default_factory=dict)  # section title -> [program, ...]
+    placement_officer: str = None
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("&", " and ")
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def strip_title(name: str) -> str:
+    words = normalize(name).split()
+    while words and words[0] in TITLES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+# === Parsing ===
+def _split_row(line: str):
+    line = re.sub(r"^\s*\d+[.)]?\s*", "", line)
+    parts = [p.strip() for p in re.split(r"\t+|\s+—\s+", line) if p.strip()]
+    return parts if len(parts) >= 2 else None
+
+
+def parse_tables(text: str) -> KnowledgeTables:
+    tables = KnowledgeTables()
+    lines = [line.strip() for line in text.splitlines()]
+
+    section = None
+    department = None
+    expect_officer = False
+    for line in lines:
+        if not line:
+            continue
+
+        if line.startswith("Department of"):
+            name = line[len("Department of"):].strip()
+            department = tables.departments.setdefault(name, Department(name=name))
+            section = None
+            continue
+
+        if re.match(r"(Under|Post)graduate Program", line):
+            section = line
+            tables.programs.setdefault(section, [])
+            department = None
+            continue
+
+        if line == "Training and Placement Officer":
+            expect_officer = True
+            section = department = None
+            continue
+
+        if expect_officer:
+            tables.placement_officer = line
+            expect_officer = False
+            continue
+
+        if department is not None:
+            if line.lower().startswith("sl. no"):
+                continue
+            row = _split_row(line)
+            if row:
+                department.faculty.append(Faculty(
+                    name=row[0],
+                    designation=row[1] if len(row) > 1 else "",
+                    qualification=row[2] if len(row) > 2 else "",
+                    department=department.name,
+                ))
+            continue
+
+        if section is not None:
+            # Program lists end at the next prose paragraph or heading
+            if len(line) > 80 or line.endswith("."):
+                section = None
+                continue
+            program = line.lstrip("-• ").strip()
+            if re.search(r"\(|Engineering|Master|Bachelor|M\.Tech", program):
+                tables.programs[section].append(program)
+            else:
+                section = None
+
+    _add_aliases(tables)
+    return tables
+
+
+def _add_aliases(tables: KnowledgeTables):
+    acronyms = {}
+    for programs in tables.programs.values():
+        for program in programs:
+            match = re.match(r"(.+?)\s*\(([^)]+)\)\s*$", program)
+            if match:
+                acronyms[normalize(match.group(1))] = normalize(match.group(2))
+
+    # Leading words shared by several programs ("artificial ...") are ambiguous
+    first_words = [normalize(p).split()[0] for ps in tables.programs.values() for p in ps if normalize(p)]
+
+    for department in tables.departments.values():
+        full = normalize(department.name)
+        department.aliases.add(full)
+        if full in acronyms:
+            department.aliases.add(acronyms[full])
+        words = [w for w in full.split() if w not in STOPWORDS]
+        if words and first_words.count(words[0]) <= 1:
+            department.aliases.add(words[0])  # "aeronautical"
+        initials = "".join(w[0] for w in words)
+        if len(initials) >= 2:
+            department.aliases.add(initials)
+        # "ai ml", "ai and ml" style spellings Whisper tends to produce
+        acronym = acronyms.get(full, "")
+        if len(acronym) == 4:
+            department.aliases.add(f"{acronym[:2]} {acronym[2:]}")
+            department.aliases.add(f"{acronym[:2]} and {acronym[2:]}")
+
+
+# === Lookups ===
+class StructuredIndex:
+    def __init__(self, text: str):
+        self.tables = parse_tables(text)
+
+    def find_department(self, query: str):
+        q = f" {normalize(query)} "
+        best, best_len = None, 0
+        for department in self.tables.departments.values():
+            for alias in department.aliases:
+                if f" {alias} " in q and len(alias) > best_len:
+                    best, best_len = department, len(alias)
+        if best is not None:
+            return best
+
+        # Fuzzy: compare each alias with same-length word windows of the query
+        words = normalize(query).split()
+        best_score = 0.0
+        for department in self.tables.departments.values():
+            for alias in department.aliases:
+                n = len(alias.split())
+                if len(alias) < 4:
+                    continue
+                for i in range(max(1, len(words) - n + 1)):
+                    score = similarity(" ".join(words[i:i + n]), alias)
+                    if score > best_score:
+                        best, best_score = department, score
+        return best if best_score >= 0.8 else None
+
+    def find_person(self, query: str):
+        """The one faculty member the whole spoken name refers to, if any."""
+        q = normalize(query)
+        # The name is what follows the last "who is" / "designation of" cue
+        cues = list(PERSON_RE.finditer(q))
+        spoken = q[cues[-1].end():] if cues else q
+        words = [w for w in spoken.split() if w not in TITLES and w not in STOPWORDS and w not in FILLERS]
+        if not words:
+            return None
+        matches = []
+        for department in self.tables.departments.values():
+            for member in department.faculty:
+                score = _name_match(words, member.bare_name.split())
+                if score is not None:
+                    matches.append((score, member))
+        if not matches:
+            return None
+        matches.sort(key=lambda m: -m[0])
+        # Two members fit equally well ("Rajesh"): let the LLM ask or explain
+        if len(matches) > 1 and matches[1][0] == matches[0][0]:
+            return None
+        return matches[0][1]
+
+
+def _name_match(spoken, name_words):
+    """Mean similarity when every spoken word matches its own word of the
+    name (initials may be left out), else None: "Rajesh Khanna" is not
+    "Dr. Rajesh"."""
+    remaining = list(name_words)
+    scores = []
+    for word in spoken:
+        best, best_score = None, 0.0
+        for candidate in remaining:
+            score = similarity(word, candidate)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < 0.85:
+            return None
+        remaining.remove(best)
+        scores.append(best_score)
+    if len(spoken) == 1 and len(spoken[0]) < 3:
+        return None  # a lone initial names nobody
+    return sum(scores) / len(scores)
+
+
+# === Intent router ===
+HEAD_RE = re.compile(r"\b(head|heads|hod|in charge|incharge)\b")
+PLACEMENT_RE = re.compile(r"\b(placement|placements|tpo)\b")
+FACULTY_RE = re.compile(r"\b(faculty|faculties|staff|teachers|professors|lecturers|teaches|teach)\b")
+PROGRAM_RE = re.compile(r"\b(programs?|programmes?|courses?|branches|degrees?)\b")
+PERSON_RE = re.compile(r"\b(who is|who s|designation|qualification|qualified)\b")
+# Program questions are about SIT only with a cue like these; "what courses
+# does Coursera offer" is a general question
+SIT_CUE_RE = re.compile(r"\b(sit|srinivas|college|institute|institution|campus|here|you|your|this)\b")
+FILLERS = {"sir", "madam", "mam", "maam", "your", "here"}
+
+
+def _faculty_line(member: Faculty) -> str:
+    line = f"{member.name}, {member.designation}"
+    if member.qualification:
+        line += f" ({member.qualification})"
+    return line
+
+
+def route(index: StructuredIndex, query: str):
+    """Answer direct lookups from the tables; None means "ask the LLM"."""
+    q = normalize(query)
+    if not q:
+        return None
+    tables = index.tables
+
+    if PLACEMENT_RE.search(q) and ("officer" in q or "who" in q or "tpo" in q):
+        if tables.placement_officer:
+            return f"The Training and Placement Officer of Srinivas Institute of Technology is {tables.placement_officer}."
+
+    department = index.find_department(query)
+
+    if HEAD_RE.search(q) and department is not None:
+        head = department.head
+        if head is not None:
+            return f"The head of the Department of {department.name} is {head.name}, {head.designation}."
+
+    if FACULTY_RE.search(q) and department is not None and department.faculty:
+        members = "; ".join(_faculty_line(m) for m in department.faculty)
+        return f"The Department of {department.name} faculty are: {members}."
+
+    if PROGRAM_RE.search(q) and department is None and SIT_CUE_RE.search(q):
+        if "post" in q or "pg" in q.split() or "masters" in q or "master" in q:
+            sections = [s for s in tables.programs if s.startswith("Post")]
+        elif "under" in q or "ug" in q.split() or "b e" in q or "bachelor" in q:
+            sections = [s for s in tables.programs if s.startswith("Under")]
+        else:
+            sections = list(tables.programs)
+        if sections:
+            parts = [f"{s}: {', '.join(tables.programs[s])}" for s in sections if tables.programs[s]]
+            return "Srinivas Institute of Technology offers the following. " + ". ".join(parts) + "."
+
+    if PERSON_RE.search(q):
+        member = index.find_person(query)
+        if member is not None:
+            return f"{_faculty_line(member)} is in the Department of {member.department}."
+
+    return None
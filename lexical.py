@@ -0,0 +1,88 @@
+# In-process BM25 index over the knowledge chunks.
+#
+# Names and acronyms ("CSBS", "Dr. Dheeraj Hebri") are exactly what dense
+# embeddings from a small chat model handle worst, and exactly what an
+# inverted index finds for free. Built once per index() from the same chunks
+# the vector side uses; searching is a few dictionary lookups and no model
+# call.
+#
+# Besides the raw BM25 scores, search() reports how much of the query each
+# chunk covers (IDF-weighted share of the query's terms it contains). That
+# is on a fixed 0..1 scale, so it can be thresholded and fused with cosine
+# similarity, which raw BM25 scores can't.
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+a about an and are as at be by can could do does for from has have how i in is it me my
+of on or please tell that the their there this to was what when where which who whom
+whose why will with you your
+""".split())
+
+
+def tokenize(text: str):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        # Plural "s" only: enough to match "departments" with "department"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, texts, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+        docs = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(doc.values()) for doc in docs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        # Per-document BM25 length normalization, precomputed
+        self.norms = k1 * (1 - b + b * lengths / avg_length)
+
+        postings = {}
+        for row, doc in enumerate(docs):
+            for term, tf in doc.items():
+                postings.setdefault(term, []).append((row, tf))
+        self.postings = {
+            term: (np.array([r for r, _ in rows], dtype=np.int32), np.array([tf for _, tf in rows], dtype=np.float32))
+            for term, rows in postings.items()
+        }
+        self.idf = {term: self._idf(len(rows)) for term, (rows, _) in self.postings.items()}
+        # A query term no chunk contains is as informative as the rarest one
+        self.unseen_idf = self._idf(0)
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str):
+        """(bm25, coverage): one score per chunk, in index order."""
+        bm25 = np.zeros(self.size, dtype=np.float32)
+        coverage = np.zeros(self.size, dtype=np.float32)
+        terms = set(tokenize(query))
+        total_idf = sum(self.idf.get(term, self.unseen_idf) for term in terms)
+        if not terms or not self.size:
+            return bm25, coverage
+        for term in terms:
+            if term not in self.postings:
+                continue
+            rows, tf = self.postings[term]
+            idf = self.idf[term]
+            bm25[rows] += idf * tf * (self.k1 + 1) / (tf + self.norms[rows])
+            coverage[rows] += idf / total_idf
+        return bm25, coverage
+
+    def scores(self, query: str) -> np.ndarray:
+        """0..1 lexical relevance: coverage, scaled down for weaker BM25 matches."""
+        bm25, coverage = self.search(query)
+        best = float(bm25.max()) if self.size else 0.0
+        if best <= 0:
+            return coverage
+        return coverage * (bm25 / best)
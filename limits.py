@@ -0,0 +1,49 @@
+# Request body cap enforced while the upload streams in. FastAPI parses the
+# whole multipart body (spooling it to memory / a temp file) before the
+# endpoint runs, so checking len(data) there is too late to protect memory.
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+
+class UploadLimitMiddleware:
+    """Rejects bodies over ``max_bytes`` with 413 without reading the rest.
+
+    A declared Content-Length is checked up front; chunked uploads are
+    counted as they arrive and cut off as soon as they cross the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, paths=None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths or ())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0 or (self.paths and scope["path"] not in self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Upload is larger than {self.max_bytes / (1024 * 1024):g} MB"
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": self._detail()}, headers={"Connection": "close"})
+        await response(scope, receive, send)
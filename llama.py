@@ -7,11 +7,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from langchain_core.prompts import PromptTemplate
 from langchain_classic.chains import RetrievalQA
-from langchain_community.document_loaders import TextLoader
 from langchain_community.vectorstores import FAISS
-from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
 
+import settings
+from answering import parse_answer
+from kb_index import KnowledgeIndex
+from retrieval import load_text
+
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
@@ -32,125 +35,37 @@ app.add_middleware(
 print("🎧 Loading Whisper model...")
 stt_model = whisper.load_model("base")
 
-# === Load Srinivas Institute Data ===
-# print("📄 Loading Srinivas data...")
-# if not os.path.exists("srinivas_data.txt"):
-#     raise FileNotFoundError("❌ srinivas_data.txt not found! Please place it in the project root.")
-
-# loader = TextLoader("srinivas_data.txt")
-# docs = loader.load()
-
-# === Split data into manageable chunks ===
-# print("✂️ Splitting text into chunks...")
-# text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-# splits = text_splitter.split_documents(docs)
-
-# === Create embeddings using Ollama ===
-# print("🔢 Creating embeddings (Llama3.2:3b)...")
-# embeddings = OllamaEmbeddings(model="llama3.2:3b", base_url="http://localhost:11434")
-
-# === Build FAISS Vector Database ===
-# print("📚 Creating FAISS vector database...")
-# vectordb = FAISS.from_documents(splits, embedding=embeddings)
-# vectordb.save_local("college_faiss_index")
+# === Load the persisted knowledge index ===
+# Vectors live in kb_index/ (see kb_index.py); only chunks that changed in
+# srinivas_data.txt since the last run are re-embedded.
+print("📚 Loading knowledge index...")
+embeddings = OllamaEmbeddings(model=settings.EMBED_MODEL, base_url=settings.OLLAMA_BASE_URL)
+knowledge_index = KnowledgeIndex(
+    settings.KB_INDEX_DIR,
+    embeddings,
+    model_name=settings.EMBED_MODEL,
+    chunk_size=settings.RETRIEVAL_CHUNK_SIZE,
+    source=settings.OLLAMA_BASE_URL,
+)
+knowledge_index.load()
+chunks, vectors = knowledge_index.sync(load_text(settings.KNOWLEDGE_FILE))
+vectordb = FAISS.from_embeddings(
+    [(chunk.text, vector.tolist()) for chunk, vector in zip(chunks, vectors)],
+    embedding=embeddings,
+)
 
 # === Initialize Ollama LLM ===
 print("🧠 Loading Ollama model...")
-llm = OllamaLLM(model="llama3.2:3b", base_url="http://localhost:11434")
+llm = OllamaLLM(model=settings.OLLAMA_MODEL, base_url=settings.OLLAMA_BASE_URL)
 
 # === Define custom prompt ===
 template = """
 You are Envision Junior, a voice assistant for Srinivas Institute of Technology (SIT).
 Answer questions using the provided context accurately and politely.
-If the question is unrelated to SIT or its departments, reply as a general AI assistant.
-
-
-The Srinivas Group of Colleges was the dream of an ideal teacher, A. Shama Rao, and was brought to reality by his noble son, CA A. Raghavendra Rao. The A. Shama Rao Foundation, named after the great visionary, was established by Dr. Rao in 1988 with the goal of providing quality education and fostering ethical, responsible citizens.
-
-Education at Srinivas institutions goes beyond imparting knowledge — it aims to nurture moral and ethical values in students, enabling them to apply their learning constructively.
-Today, the Srinivas Group educates over 12,000 students across 18 colleges, located on three campuses — Pandeshwar, Valachil, and Mukka. Each institution is supported by a team of highly qualified faculty and dedicated support staff, ensuring holistic development and academic excellence.
- Srinivas Institute of Technology (SIT), Mangaluru
-
-Srinivas Institute of Technology (SIT), located in Valachil, Mangaluru, is a premier engineering institution established in 2006. It is affiliated with Visvesvaraya Technological University (VTU), Belagavi, and is part of the Srinivas Group of Institutions, founded by Dr. CA A. Raghavendra Rao under the A. Shama Rao Foundation.
-
-Over the years, SIT has grown into one of the most highly regarded self-financed engineering colleges in the region, currently hosting more than 13,000 students pursuing higher education. The institution is known for its focus on innovation, research, and industry-oriented learning.
- Proud Achievement
-
-Srinivas Institute of Technology has been awarded an ‘A’ Grade in the Second Cycle of NAAC Accreditation — a recognition of its commitment to academic excellence, innovation, and holistic growth.
-This achievement reflects the collective efforts of the management, faculty, students, alumni, parents, recruiters, and well-wishers. Together, the SIT community continues to set new benchmarks in quality education and sustainable development.
-
-Academic Programs
-Undergraduate Programs (B.E.)
-
-Computer Science and Engineering (CSE)
-
-Computer Science and Design (CSD)
-
-Computer Science and Business Systems (CSBS)
-
-Electronics and Communication Engineering (ECE)
-
-Mechanical Engineering (ME)
-
-Information Science and Engineering (ISE)
-
-Electrical and Electronics Engineering (EEE)
-
-Aeronautical Engineering
-
-Automobile Engineering
-
-Marine Engineering
-
-Artificial Intelligence and Machine Learning (AIML)
-
-Artificial Intelligence and Data Science (AIDS)
-
-Undergraduate Program – Architecture
-
-Bachelor of Architecture (B.Arch)
-
-Postgraduate Programs
-
-Master of Business Administration (MBA)
-
-Master of Computer Applications (MCA)
-
-M.Tech in Computer Science and Engineering
-
-M.Tech in Industrial Automation and Robotics
-
-M.Tech in Digital Electronics
-
- Institutional Ethos
-
-SIT aims to create a vibrant learning environment where innovation, research, ethics, and leadership form the core values. The institution emphasizes industry collaboration, placements, entrepreneurship, and community development — nurturing students to become globally competent professionals.
-
-Training and Placement Officer
-
-Dr. Dheeraj Hebri, MCA, Ph.D
-Training and Placement Officer, Srinivas Institute of Technology
-
-
-Department of Aeronautical Engineering
-Sl. No.	Name of the Faculty	Designation	Qualification
-1	Dr. Praveen Shenoy	Assistant Professor	B.E., M.Tech, Ph.D
-2	Dr. Gangadhara Rao	Professor	B.E., M.Tech, Ph.D
-3	Mr. P. Ramesh Kumar	Professor	B.E., M.Tech
-4	Dr. Lokesh K. S.	Assistant Professor	B.E., M.Tech, (Ph.D)
-5	Dr. Rajesh	Assistant Professor	B.E., M.Tech, Ph.D
-6	Mr. Jagadeesh B	Assistant Professor	B.E., M.Tech
-7	Ms. Srinidhi Kukkila	Assistant Professor	B.E., M.Tech, MBA
-
-Department of Artificial Intelligence and Machine Learning
-Sl. No.	Name of the Faculty	Designation	Qualification
-1	Mrs. Daya Naik	Professor & Head of Department (In-Charge)	B.E., M.Tech
-2	Dr. Parvathraj K. M. M.	Associate Professor	B.E., M.Tech, Ph.D
-3	Mr. Ganesh M. S.	Assistant Professor	B.E., M.Tech
-4	Mr. Nivin	Assistant Professor	B.E., M.Tech, Diploma
-5	Mrs. Nithya B. P.	Assistant Professor	B.E., M.Tech
-6	Mr. Madhusudhan S.	Assistant Professor	B.E., M.Tech (Best Teacher Award 2022–23)
-
+If the question is unrelated to SIT or its departments, or the context does not
+contain the answer, reply as a general AI assistant.
+Begin your reply with one line, "SOURCE: context" if the answer comes from the
+context or "SOURCE: general" if it does not, then give the answer.
 
 Context:
 {context}
@@ -196,12 +111,8 @@ async def upload_audio(file: UploadFile = File(...)):
 
         # Step 4: Query RAG system
         rag_response = qa.invoke({"query": query})
-        response = rag_response["result"]
-        print(f"🧠 Model (RAG) Response: {response}")
-
-        # Fallback: If no relevant context found, answer generally
-        if "don't know" in response.lower() or "not sure" in response.lower():
-            response = llm.invoke(query)
+        response, source = parse_answer(rag_response["result"])
+        print(f"🧠 Model (RAG) Response ({source}): {response}")
 
         # Step 5: Clean up temporary files
         os.remove(temp_webm_path)
@@ -0,0 +1,436 @@
+# Pluggable LLM backends behind one interface, plus a router that sends each
+# prompt to the fastest healthy provider and can hedge slow requests.
+#
+#   OllamaProvider  local llama3.2 over the shared pooled client (ollama_client.py)
+#   GeminiProvider  Google Gemini (google-generativeai, optional dependency)
+#   StubProvider    canned replies with configurable latency, for offline tests
+#
+# RoutedLLM wraps the router as a LangChain LLM so LLMChain / llm.stream keep
+# working unchanged.
+#
+# Every call takes an optional cancel token (see cancellation.py). It is
+# checked between streamed tokens; abandoning a stream closes its HTTP
+# response, which makes Ollama stop generating. An optional ``info`` dict
+# is filled with details of the call that answered (provider, warm/cold,
+# prefill time). ``system`` is a static system prompt kept apart from the
+# per-request prompt so Ollama can reuse its KV cache (see prompts.py).
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from cancellation import CancelToken, RequestCancelled, check
+from ollama_client import COLD_LOAD_S, load_seconds, make_client, model_options, parse_keep_alive
+
+# How often a hedged generate() wakes up to check its cancel token
+CANCEL_POLL_S = 0.1
+
+
+class ProviderError(Exception):
+    pass
+
+
+def with_system(system: Optional[str], prompt: str) -> str:
+    """For providers without a separate system prompt."""
+    return f"{system}\n\n{prompt}" if system else prompt
+
+
+class LLMProvider:
+    name = "provider"
+
+    def generate(self, prompt: str, cancel=None, info=None, system=None) -> str:
+        return "".join(self.stream(prompt, cancel, info, system))
+
+    def stream(self, prompt: str, cancel=None, info=None, system=None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def warm(self, system=None):
+        """Page the model in ahead of the first real request (optional)."""
+
+
+class OllamaProvider(LLMProvider):
+    def __init__(self, model: str, client, keep_alive=None, options=None, name: str = "ollama"):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.keep_alive = keep_alive
+        self.options = options or None
+        self.warm_calls = 0
+        self.cold_calls = 0
+
+    def warm(self, system=None):
+        # A one-token generation loads the weights and runs the model once;
+        # with a system prompt it also leaves that prefix in the KV cache
+        self.client.generate(
+            model=self.model, prompt="Hi", system=system, keep_alive=self.keep_alive,
+            options={**(self.options or {}), "num_predict": 1},
+        )
+
+    def _record_call(self, response, info):
+        loaded_s = load_seconds(response)
+        cold = loaded_s > COLD_LOAD_S
+        if cold:
+            self.cold_calls += 1
+        else:
+            self.warm_calls += 1
+        if info is not None:
+            info.update(model_state="cold" if cold else "warm", load_s=round(loaded_s, 3))
+            if response.prompt_eval_duration is not None:
+                # Tokens actually evaluated, i.e. not served from the KV cache
+                info.update(
+                    prefill_tokens=response.prompt_eval_count or 0,
+                    prefill_s=round(response.prompt_eval_duration / 1e9, 4),
+                )
+
+    def generate(self, prompt: str, cancel=None, info=None, system=None) -> str:
+        if cancel is not None:
+            # Streamed under the hood so a cancelled request can hang up mid-answer
+            return "".join(self.stream(prompt, cancel, info, system))
+        response = self.client.generate(
+            model=self.model, prompt=prompt, system=system, keep_alive=self.keep_alive, options=self.options,
+        )
+        self._record_call(response, info)
+        return response.response
+
+    def stream(self, prompt: str, cancel=None, info=None, system=None) -> Iterator[str]:
+        chunks = self.client.generate(
+            model=self.model, prompt=prompt, system=system, stream=True,
+            keep_alive=self.keep_alive, options=self.options,
+        )
+        try:
+            for chunk in chunks:
+                check(cancel)
+                if chunk.response:
+                    yield chunk.response
+                if chunk.done:
+                    self._record_call(chunk, info)
+        finally:
+            chunks.close()  # closes the HTTP response; Ollama stops generating
+
+
+class GeminiProvider(LLMProvider):
+    def __init__(self, model: str, api_key: str, name: str = "gemini"):
+        import google.generativeai as genai
+
+        if not api_key:
+            raise ProviderError("GEMINI_API_KEY is not set")
+        genai.configure(api_key=api_key)
+        self.name = name
+        self.model = genai.GenerativeModel(model)
+
+    def generate(self, prompt: str, cancel=None, info=None, system=None) -> str:
+        check(cancel)
+        response = self.model.generate_content(with_system(system, prompt))
+        if not response.text:
+            raise ProviderError("Gemini returned an empty response")
+        return response.text.strip()
+
+    def stream(self, prompt: str, cancel=None, info=None, system=None) -> Iterator[str]:
+        for chunk in self.model.generate_content(with_system(system, prompt), stream=True):
+            check(cancel)
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider(LLMProvider):
+    def __init__(self, name: str = "stub", reply: str = "SOURCE: general\nThis is a stub answer.",
+                 first_token_s: float = 0.05, tokens_per_s: float = 50.0,
+                 jitter_s: float = 0.0, error_rate: float = 0.0):
+        self.name = name
+        self.reply = reply
+        self.first_token_s = first_token_s
+        self.tokens_per_s = tokens_per_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+
+    def stream(self, prompt: str, cancel=None, info=None, system=None) -> Iterator[str]:
+        time.sleep(self.first_token_s + random.uniform(0, self.jitter_s))
+        if random.random() < self.error_rate:
+            raise ProviderError(f"{self.name}: injected failure")
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1.0 / self.tokens_per_s)
+            check(cancel)
+            yield word if i == 0 else " " + word
+
+
+class ProviderStats:
+    """Rolling latency and error window for one provider."""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float = None, ok: bool = True):
+        with self._lock:
+            self.requests += 1
+            self.outcomes.append(ok)
+            if ok and latency is not None:
+                self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+
+    def record_cancelled(self, elapsed: float = None):
+        # A hedge loser is stopped at ``elapsed``: it would have taken at least
+        # that long. Keeping it as a (censored) sample stops the p95 from only
+        # ever seeing the attempts that won.
+        with self._lock:
+            self.cancelled += 1
+            if elapsed is not None:
+                self.latencies.append(elapsed)
+
+    def record_hedge_won(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    def samples(self) -> int:
+        with self._lock:
+            return len(self.latencies)
+
+    def percentile(self, pct: float, default: float = None):
+        with self._lock:
+            values = list(self.latencies)
+        return float(np.percentile(values, pct)) if values else default
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return 1.0 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "cancelled": self.cancelled,
+            "p50_s": self.percentile(50),
+            "p95_s": self.percentile(95),
+            "hedges_won": self.hedges_won,
+        }
+
+
+class LLMRouter:
+    def __init__(self, providers: List[LLMProvider], hedge: bool = True, hedge_after_s: float = 0.0,
+                 window: int = 50, max_error_rate: float = 0.5, min_samples: int = 5):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.stats = {p.name: ProviderStats(window) for p in providers}
+        self.hedge = hedge and len(providers) > 1
+        self.hedge_after_s = hedge_after_s
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.hedged_requests = 0
+        self._lock = threading.Lock()
+        # Hedged calls run here, not on the caller's pool, so they can't deadlock it
+        self._pool = ThreadPoolExecutor(max_workers=4 * len(providers), thread_name_prefix="llm-route")
+
+    def healthy(self, provider: LLMProvider) -> bool:
+        stats = self.stats[provider.name]
+        return len(stats.outcomes) < self.min_samples or stats.error_rate <= self.max_error_rate
+
+    def sampled(self, provider: LLMProvider) -> bool:
+        return self.stats[provider.name].samples() >= self.min_samples
+
+    def ordered(self) -> List[LLMProvider]:
+        # Fastest healthy first (by rolling p50); until every provider has
+        # min_samples latencies they keep their configured order, so an
+        # untried fallback never jumps ahead of the primary; unhealthy ones go
+        # last as a fallback
+        by_latency = all(self.sampled(p) for p in self.providers)
+
+        def key(indexed):
+            index, provider = indexed
+            p50 = self.stats[provider.name].percentile(50) if by_latency else 0.0
+            return (not self.healthy(provider), p50, index)
+
+        return [p for _, p in sorted(enumerate(self.providers), key=key)]
+
+    def _hedge_deadline(self, provider: LLMProvider) -> Optional[float]:
+        if self.hedge_after_s > 0:
+            return self.hedge_after_s
+        return self.stats[provider.name].percentile(95)
+
+    def _timed_generate(self, provider: LLMProvider, prompt: str, cancel, system=None):
+        start = time.perf_counter()
+        info = {"provider": provider.name}
+        try:
+            text = provider.generate(prompt, cancel, info, system)
+        except RequestCancelled as cancelled:
+            # "superseded": the other side of a hedge won; any other reason is
+            # the caller giving up, which says nothing about this provider
+            elapsed = time.perf_counter() - start if cancelled.reason == "superseded" else None
+            self.stats[provider.name].record_cancelled(elapsed)
+            raise
+        except Exception:
+            self.stats[provider.name].record(ok=False)
+            raise
+        self.stats[provider.name].record(time.perf_counter() - start)
+        return provider, text, info
+
+    def generate(self, prompt: str, cancel=None, info=None, system=None) -> str:
+        candidates = self.ordered()
+        primary, backups = candidates[0], candidates[1:]
+        # One child token per request: cancelling the caller stops all of
+        # them, and whichever loses a hedge is stopped when the other wins
+        attempts = CancelToken(parent=cancel)
+        running = {self._pool.submit(self._timed_generate, primary, prompt, attempts, system)}
+        deadline = self._hedge_deadline(primary) if self.hedge else None
+        hedge_at = time.monotonic() + deadline if deadline is not None else None
+        last_error = None
+
+        try:
+            while running or backups:
+                check(cancel)
+                if not running:
+                    running.add(self._pool.submit(self._timed_generate, backups.pop(0), prompt, attempts, system))
+                timeout = CANCEL_POLL_S if cancel is not None else None
+                if hedge_at is not None and backups:
+                    until_hedge = max(0.0, hedge_at - time.monotonic())
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+                done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    if hedge_at is not None and backups and time.monotonic() >= hedge_at:
+                        # Primary missed its p95: fire a hedged request at the next provider
+                        hedge_at = None  # hedge at most once per request
+                        with self._lock:
+                            self.hedged_requests += 1
+                        running.add(self._pool.submit(self._timed_generate, backups.pop(0), prompt, attempts, system))
+                    continue
+                hedge_at = None  # something finished first; no hedging after that
+
+                for future in done:
+                    try:
+                        provider, text, attempt_info = future.result()
+                    except RequestCancelled:
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if provider is not primary:
+                        self.stats[provider.name].record_hedge_won()
+                    if info is not None:
+                        info.update(attempt_info)
+                    return text
+        finally:
+            attempts.cancel("superseded")
+
+        check(cancel)
+        raise ProviderError(f"All LLM providers failed: {last_error}")
+
+    def stream(self, prompt: str, cancel=None, info=None, system=None) -> Iterator[str]:
+        # Streams can't be hedged (tokens can't be merged), but a provider
+        # that fails before its first token falls through to the next one
+        last_error = None
+        for provider in self.ordered():
+            check(cancel)
+            start = time.perf_counter()
+            started = False
+            if info is not None:
+                info["provider"] = provider.name
+            try:
+                for token in provider.stream(prompt, cancel, info, system):
+                    started = True
+                    yield token
+            except RequestCancelled:
+                self.stats[provider.name].record_cancelled()
+                raise
+            except Exception as e:
+                self.stats[provider.name].record(ok=False)
+                if started:
+                    raise
+                last_error = e
+                continue
+            self.stats[provider.name].record(time.perf_counter() - start)
+            return
+        raise ProviderError(f"All LLM providers failed: {last_error}")
+
+    def warm(self, system=None):
+        """Warm every provider; failures are reported, not raised."""
+        results = {}
+        for provider in self.providers:
+            start = time.perf_counter()
+            try:
+                provider.warm(system)
+                results[provider.name] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                print(f"⚠️ Warming LLM provider '{provider.name}' failed: {e}")
+                results[provider.name] = None
+        if self.providers and all(v is None for v in results.values()):
+            raise ProviderError("No LLM provider could be warmed up")
+        return results
+
+    def snapshot(self):
+        return {
+            "order": [p.name for p in self.ordered()],
+            "hedged_requests": self.hedged_requests,
+            "providers": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+class RoutedLLM(LLM):
+    """LangChain adapter so chains and ``llm.stream`` go through the router."""
+
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+              cancel=None, info=None, system=None, **kwargs) -> str:
+        return self.router.generate(prompt, cancel, info, system)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                cancel=None, info=None, system=None, **kwargs) -> Iterator[GenerationChunk]:
+        for token in self.router.stream(prompt, cancel, info, system):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def build_providers(names, settings) -> List[LLMProvider]:
+    providers = []
+    client = None
+    for name in names:
+        name = name.strip().lower()
+        if not name:
+            continue
+        try:
+            if name == "ollama":
+                if client is None:
+                    client = make_client(
+                        settings.OLLAMA_BASE_URL, settings.OLLAMA_MAX_CONNECTIONS, settings.OLLAMA_TIMEOUT_S,
+                    )
+                providers.append(OllamaProvider(
+                    settings.OLLAMA_MODEL,
+                    client,
+                    keep_alive=parse_keep_alive(settings.OLLAMA_KEEP_ALIVE),
+                    options=model_options(settings.OLLAMA_NUM_CTX, settings.OLLAMA_NUM_THREAD),
+                ))
+            elif name == "gemini":
+                providers.append(GeminiProvider(settings.GEMINI_MODEL, settings.GEMINI_API_KEY))
+            elif name == "stub":
+                providers.append(StubProvider(
+                    first_token_s=settings.STUB_FIRST_TOKEN_S,
+                    tokens_per_s=settings.STUB_TOKENS_PER_S,
+                ))
+            else:
+                print(f"⚠️ Unknown LLM provider '{name}', skipping")
+        except (ImportError, ProviderError) as e:
+            print(f"⚠️ LLM provider '{name}' unavailable: {e}")
+    return providers
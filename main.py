@@ -1,17 +1,56 @@
+import asyncio
+import json
 import os
-import tempfile
-import subprocess
-import whisper
-from fastapi import FastAPI, File, UploadFile
-from fastapi.middleware.cors import CORSMiddleware
+import time
 
-from langchain_core.prompts import PromptTemplate
-from langchain_classic.chains import LLMChain
-from langchain_ollama import OllamaLLM
+from fastapi import FastAPI, File, Form, Request, Response, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from langchain_ollama import OllamaEmbeddings
+from pydantic import BaseModel
+
+import settings
+from answer_cache import AnswerCache, text_version
+from answering import TagStripper, choose_mode, parse_answer
+from audio_io import SAMPLE_RATE, AudioDecodeError, AudioTooLongError, decode_audio
+from cancellation import CancelToken, RequestCancelled, check
+from inference import QueueFullError, executor
+from kb_index import KnowledgeIndex
+from kb_lookup import StructuredIndex, route
+from limits import UploadLimitMiddleware
+from llm_providers import LLMRouter, OllamaProvider, RoutedLLM, build_providers
+from memory import process_memory
+from model_loader import ModelLoader
+from ollama_client import ModelKeeper, client_kwargs, keep_alive_seconds, parse_active_hours
+from prompts import LLMPrompt, context_prompt, general_prompt, prefix_prompt, prefix_system
+from retrieval import CachedEmbeddings, Retriever, estimate_tokens, load_text
+from sessions import SessionStore
+from stt_server import RemoteTranscriber
+from stt_tiers import TieredTranscriber
+from telemetry import RequestTrace, gauge, metrics_payload
+from transcript_cache import TranscriptCache, TranscriptEntry, config_signature, raw_key
+from transcript_normalizer import TranscriptNormalizer
+from tts_service import (
+    PCM_CONTENT_TYPE,
+    PhraseAudioCache,
+    SpeechStream,
+    TTSEnginePool,
+    TTSService,
+    split_sentences,
+)
+from vad import trim_silence
+from voice_stream import VoiceStream
 
 # === FastAPI setup ===
 app = FastAPI()
 
+# Added first so it sits inside CORSMiddleware (the last one added is the
+# outermost): its 413 needs CORS headers or the browser only sees a
+# network error
+MAX_UPLOAD_BYTES = int(settings.MAX_UPLOAD_MB * 1024 * 1024)
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, paths=["/upload_audio"])
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # change to your frontend URL in production
@@ -20,183 +59,958 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# === Load Whisper (Speech-to-Text) ===
-print("🎧 Loading Whisper model...")
-stt_model = whisper.load_model("base")
+# === Whisper (Speech-to-Text) ===
+# Loaded in the background by load_whisper(); see "Model loading" below
+stt_model = None
+stt_batcher = None
+stt_remote = None
+stt_tiers = None
+transcribe = None
+
+
+def load_whisper():
+    global stt_model, stt_batcher, stt_remote, stt_tiers, transcribe
+    if settings.STT_SERVER_ADDRESS:
+        # Whisper lives in the shared `python -m stt_server` process
+        print(f"🎧 Connecting to STT server at {settings.STT_SERVER_ADDRESS}...")
+        stt_remote = RemoteTranscriber(settings.STT_SERVER_ADDRESS, settings.STT_SERVER_AUTHKEY)
+        stt_remote.wait_until_ready(settings.STT_SERVER_CONNECT_TIMEOUT_S)
+        transcribe = stt_remote.transcribe
+        return
+
+    # Imported here so torch / whisper don't delay binding the port
+    from stt_batcher import WhisperBatcher, load_model
+
+    def transcriber(model):
+        if not settings.STT_BATCHING:
+            def transcribe_one(audio, cancel=None):
+                # Whisper's own transcribe() can't be interrupted once it starts
+                check(cancel)
+                return model.transcribe(audio, initial_prompt=STT_PROMPT)
+            return None, transcribe_one
+        batcher = WhisperBatcher(
+            model,
+            window_ms=settings.STT_BATCH_WINDOW_MS,
+            max_batch=settings.STT_BATCH_MAX_SIZE,
+            language=settings.STT_LANGUAGE,
+            prompt=STT_PROMPT,
+        )
+        return batcher, batcher.transcribe
+
+    print(f"🎧 Loading Whisper model '{settings.STT_MODEL}' (quantize={settings.STT_QUANTIZE})...")
+    stt_model = load_model(settings.STT_MODEL, settings.MODEL_CACHE_DIR, settings.STT_QUANTIZE)
+    stt_batcher, accurate = transcriber(stt_model)
+    if not settings.STT_FAST_MODEL:
+        transcribe = accurate
+        return
+
+    print(f"🎧 Loading fast Whisper tier '{settings.STT_FAST_MODEL}'...")
+    fast_model = load_model(settings.STT_FAST_MODEL, settings.MODEL_CACHE_DIR, settings.STT_QUANTIZE)
+    _, fast = transcriber(fast_model)
+    stt_tiers = TieredTranscriber(
+        fast,
+        accurate,
+        max_fast_audio_s=settings.STT_FAST_MAX_AUDIO_S,
+        min_avg_logprob=settings.STT_ESCALATE_LOGPROB,
+        max_no_speech_prob=settings.STT_ESCALATE_NO_SPEECH,
+    )
+    transcribe = stt_tiers.transcribe
+
+VAD_OPTIONS = dict(
+    frame_ms=settings.VAD_FRAME_MS,
+    threshold_db=settings.VAD_THRESHOLD_DB,
+    margin_db=settings.VAD_MARGIN_DB,
+    min_speech_ms=settings.VAD_MIN_SPEECH_MS,
+    max_gap_ms=settings.VAD_MAX_GAP_MS,
+    pad_ms=settings.VAD_PAD_MS,
+)
+
+# === Text-to-speech ===
+tts = None
+
+
+def load_tts():
+    global tts
+    print("🔊 Warming up TTS engines...")
+    tts = TTSService(
+        TTSEnginePool(settings.TTS_POOL_SIZE, voice=settings.TTS_VOICE, rate=settings.TTS_RATE),
+        PhraseAudioCache(settings.TTS_CACHE_MB * 1024 * 1024, directory=settings.TTS_CACHE_DIR),
+    )
+
+# === Load LLM providers ===
+print(f"🧠 Loading LLM providers: {settings.LLM_PROVIDERS}")
+llm_router = LLMRouter(
+    build_providers(settings.LLM_PROVIDERS.split(","), settings),
+    hedge=settings.LLM_HEDGE,
+    hedge_after_s=settings.LLM_HEDGE_AFTER_S,
+    window=settings.LLM_STATS_WINDOW,
+    max_error_rate=settings.LLM_MAX_ERROR_RATE,
+)
+llm = RoutedLLM(router=llm_router)
+
+# Keeps the local model loaded during the kiosk's active hours
+ollama_keeper = None
+ollama = next((p for p in llm_router.providers if isinstance(p, OllamaProvider)), None)
+if ollama is not None and settings.OLLAMA_KEEPER:
+    ollama_keeper = ModelKeeper(
+        ollama.client,
+        ollama.model,
+        keep_alive=ollama.keep_alive,
+        options=ollama.options,
+        active_hours=parse_active_hours(settings.OLLAMA_ACTIVE_HOURS),
+        interval_s=settings.OLLAMA_KEEPER_INTERVAL_S,
+    )
+
+
+# === Knowledge base ===
+# srinivas_data.txt is the single source of truth; only the chunks relevant
+# to each question are sent to the model.
+SIT_CONTEXT_TEXT = load_text(settings.KNOWLEDGE_FILE)
+
+# In prefix mode the whole file goes into one static system prompt instead,
+# which Ollama keeps in its KV cache between requests (see prompts.py)
+PREFIX_MODE = settings.PROMPT_MODE == "prefix"
+static_prefix = prefix_system(SIT_CONTEXT_TEXT) if PREFIX_MODE else None
+
+
+def warm_llm():
+    # Also pre-evaluates the static prefix, so the first visitor doesn't pay for it
+    return llm_router.warm(static_prefix)
+
+
+embedding_options = {}
+if settings.EMBED_MODEL == settings.OLLAMA_MODEL:
+    # Same weights as the chat model: different options would make Ollama reload it
+    embedding_options = dict(num_ctx=settings.OLLAMA_NUM_CTX or None, num_thread=settings.OLLAMA_NUM_THREAD or None)
+embeddings = OllamaEmbeddings(
+    model=settings.EMBED_MODEL,
+    base_url=settings.OLLAMA_BASE_URL,
+    client_kwargs=client_kwargs(settings.OLLAMA_MAX_CONNECTIONS, settings.OLLAMA_TIMEOUT_S),
+    # Without it every embedding call resets the model's timer to Ollama's 5m default
+    keep_alive=keep_alive_seconds(settings.OLLAMA_KEEP_ALIVE),
+    **embedding_options,
+)
+
+knowledge_index = KnowledgeIndex(
+    settings.KB_INDEX_DIR,
+    embeddings,
+    model_name=settings.EMBED_MODEL,
+    chunk_size=settings.RETRIEVAL_CHUNK_SIZE,
+    source=settings.OLLAMA_BASE_URL,
+)
+# Shared by the retriever and the semantic answer cache
+query_embeddings = CachedEmbeddings(embeddings, max_size=settings.QUERY_EMBED_CACHE_SIZE)
+retriever = Retriever(
+    query_embeddings,
+    top_k=settings.RETRIEVAL_TOP_K,
+    token_budget=settings.RETRIEVAL_TOKEN_BUDGET,
+    chunk_size=settings.RETRIEVAL_CHUNK_SIZE,
+    store=knowledge_index,
+    lexical_weight=settings.RETRIEVAL_LEXICAL_WEIGHT,
+    lexical_min_score=settings.RETRIEVAL_LEXICAL_MIN_SCORE,
+    lexical_margin=settings.RETRIEVAL_LEXICAL_MARGIN,
+)
+
+
+def load_knowledge():
+    print("📚 Loading knowledge index...")
+    knowledge_index.load()
+    retriever.index(SIT_CONTEXT_TEXT)  # embeds only chunks missing from the saved index
+
+# Faculty / department / program tables for direct lookups
+structured_index = StructuredIndex(SIT_CONTEXT_TEXT)
+
+# Proper nouns from the knowledge base: fix misheard names in transcripts
+# and prime Whisper with them (replaces the old qa2 LLM correction pass)
+normalizer = TranscriptNormalizer(SIT_CONTEXT_TEXT) if settings.TRANSCRIPT_NORMALIZER else None
+STT_PROMPT = (normalizer or TranscriptNormalizer(SIT_CONTEXT_TEXT)).initial_prompt() if settings.STT_PROMPT_BIAS else None
+
+
+def normalize_transcript(text: str, trace: RequestTrace) -> str:
+    text = text.strip()
+    if normalizer is None:
+        return text
+    with trace.stage("normalize"):
+        normalized = normalizer.normalize(text)
+    if normalized != text:
+        trace.set(transcript=text)
+        print(f"🔤 Normalized transcript: {text!r} -> {normalized!r}")
+    return normalized
+
+
+# === Transcript cache ===
+# Repeated recordings (the demo clip, regression runs) skip decode and STT.
+# Anything that changes what Whisper returns is part of the cache namespace.
+transcript_cache = None
+if settings.TRANSCRIPT_CACHE_ENABLED:
+    transcript_cache = TranscriptCache(
+        settings.TRANSCRIPT_CACHE_SIZE,
+        directory=settings.TRANSCRIPT_CACHE_DIR,
+        signature=config_signature(
+            model=settings.STT_MODEL,
+            quantize=settings.STT_QUANTIZE,
+            fast_model=settings.STT_FAST_MODEL,
+            fast_max_audio_s=settings.STT_FAST_MAX_AUDIO_S,
+            escalate=(settings.STT_ESCALATE_LOGPROB, settings.STT_ESCALATE_NO_SPEECH),
+            language=settings.STT_LANGUAGE,
+            prompt=STT_PROMPT,
+            vad=VAD_OPTIONS if settings.VAD_ENABLED else None,
+        ),
+    )
+
+
+# === Answer cache ===
+answer_cache = None
+if settings.ANSWER_CACHE_ENABLED:
+    answer_cache = AnswerCache(
+        text_version(SIT_CONTEXT_TEXT),
+        max_size=settings.ANSWER_CACHE_SIZE,
+        ttl=settings.ANSWER_CACHE_TTL_S,
+        embed=query_embeddings.embed_query if settings.SEMANTIC_CACHE_ENABLED else None,
+        semantic_size=settings.SEMANTIC_CACHE_SIZE,
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    )
+
+
+# === Conversation sessions ===
+sessions = None
+if settings.SESSIONS_ENABLED:
+    sessions = SessionStore(
+        max_sessions=settings.SESSION_MAX,
+        ttl_s=settings.SESSION_TTL_S,
+        max_turns=settings.SESSION_MAX_TURNS,
+        token_budget=settings.SESSION_TOKEN_BUDGET,
+        summary_tokens=settings.SESSION_SUMMARY_TOKENS,
+    )
+
+
+def session_history(session_id, trace: RequestTrace):
+    if sessions is None or not session_id:
+        return None
+    history = sessions.history(session_id)
+    if history is not None:
+        trace.set(session_turns=history.turns, history_tokens=history.tokens)
+    return history
+
+
+def remember_turn(session_id, query: str, response: str):
+    if sessions is not None and session_id and response:
+        sessions.record(session_id, query, response)
+
+
+# === Model loading ===
+# Everything slow loads in parallel after the port is bound. Whisper and the
+# knowledge index gate /readyz; the LLM warm-up and TTS are best effort.
+models = ModelLoader(
+    parallel=settings.PARALLEL_MODEL_LOADING,
+    attempts=settings.MODEL_LOAD_ATTEMPTS,
+    retry_s=settings.MODEL_LOAD_RETRY_S,
+    retry_max_s=settings.MODEL_LOAD_RETRY_MAX_S,
+)
+models.add("whisper", load_whisper)
+models.add("knowledge", load_knowledge)
+if settings.WARMUP_LLM:
+    models.add("llm", warm_llm, required=False)
+if settings.TTS_ENABLED:
+    models.add("tts", load_tts, required=False)
+
+
+def not_ready_response(request_id=None):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Models are still loading", "request_id": request_id, "models": models.status()},
+        headers={"Retry-After": str(settings.RETRY_AFTER_SECONDS)},
+    )
+
+
+async def run_until_cancelled(coro, cancel: CancelToken, request: Request = None):
+    """Await ``coro``, aborting it on the deadline or when the client goes away.
+
+    Raising here releases the caller's executor slot right away; the worker
+    threads see the tripped token and stop at their next check.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            remaining = cancel.remaining()
+            poll = settings.DISCONNECT_POLL_S if remaining is None else min(settings.DISCONNECT_POLL_S, remaining)
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if done:
+                return task.result()
+            if request is not None and await request.is_disconnected():
+                cancel.cancel("disconnected")
+            cancel.check()
+    finally:
+        if not task.done():
+            cancel.cancel("cancelled")
+            task.cancel()
+
+
+async def prepare_llm_call(query, trace, cached=None, history=None) -> LLMPrompt:
+    history_text = history.text if history is not None else None
+    if PREFIX_MODE:
+        # Nothing to retrieve: the whole knowledge base is already in the prefix
+        return prefix_prompt(query, static_prefix, history_text)
+
+    # Reuse the query embedding the semantic cache already paid for; a
+    # follow-up is searched together with the question before it
+    query_vector = cached.embedding if cached is not None else None
+    search_query = query
+    if history is not None:
+        search_query, query_vector = history.retrieval_query(query), None
+    with trace.stage("retrieval"):
+        retrieval = await executor.run_llm(retriever.search, search_query, query_vector)
+
+    # Weak retrieval means the question is not about SIT: go straight to the
+    # general prompt instead of finding out after a wasted generation
+    mode = choose_mode(retrieval, settings.RETRIEVAL_MIN_SCORE)
+    if mode == "context":
+        llm_prompt = context_prompt(query, retrieval.context, history_text)
+    else:
+        llm_prompt = general_prompt(query, history_text)
+
+    best = retrieval.scores[0] if retrieval.scores else 0.0
+    trace.set(retrieval=retrieval.method)
+    print(f"📎 Retrieved {len(retrieval.chunks)} chunks ({retrieval.method}, best {best:.2f}), "
+          f"{mode} prompt ≈ {llm_prompt.tokens} tokens")
+    return llm_prompt
+
+
+async def watch_knowledge_file():
+    global structured_index, normalizer, static_prefix
+    # Re-sync the index (changed chunks only) and drop cached answers when
+    # srinivas_data.txt is edited
+    last_mtime = os.path.getmtime(settings.KNOWLEDGE_FILE)
+    while True:
+        await asyncio.sleep(settings.KB_WATCH_INTERVAL_S)
+        try:
+            mtime = os.path.getmtime(settings.KNOWLEDGE_FILE)
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            text = load_text(settings.KNOWLEDGE_FILE)
+            await executor.run_llm(retriever.index, text)
+            structured_index = StructuredIndex(text)
+            if normalizer is not None:
+                normalizer = TranscriptNormalizer(text)
+            if PREFIX_MODE:
+                static_prefix = prefix_system(text)
+            print(f"📚 Knowledge base re-synced: {knowledge_index.last_sync}")
+            if answer_cache is not None:
+                answer_cache.invalidate_if_changed(text_version(text))
+            if PREFIX_MODE:
+                await executor.run_llm(warm_llm)  # evaluate the new prefix now
+        except Exception as e:
+            print("❌ Knowledge base re-sync failed:", e)
+
+
+# === Lifecycle ===
+@app.on_event("startup")
+def start_model_loading():
+    models.start()
+    if ollama_keeper is not None:
+        ollama_keeper.start()
+
+
+@app.on_event("startup")
+async def start_knowledge_watcher():
+    if settings.KB_WATCH_INTERVAL_S > 0:
+        app.state.kb_watcher = asyncio.create_task(watch_knowledge_file())
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
+    if ollama_keeper is not None:
+        ollama_keeper.stop()
+
+
+# === Metrics ===
+gauge("voice_inflight_requests", "Requests admitted and not yet finished", lambda: executor.pending)
+gauge("llm_hedged_requests", "Hedged LLM requests fired", lambda: llm_router.hedged_requests)
+gauge(
+    "llm_cancelled_generations", "LLM generations stopped early (cancelled, expired or lost a hedge)",
+    lambda: sum(stats.cancelled for stats in llm_router.stats.values()),
+)
+if answer_cache is not None:
+    gauge("answer_cache_exact_hits", "Exact-match answer cache hits", lambda: answer_cache.exact_hits)
+    gauge("answer_cache_semantic_hits", "Semantic answer cache hits", lambda: answer_cache.semantic_hits)
+    gauge("answer_cache_misses", "Answer cache misses", lambda: answer_cache.misses)
+gauge("query_embed_cache_hits", "Query embeddings served from the cache", lambda: query_embeddings.hits)
+gauge("query_embed_cache_misses", "Query embeddings that called the embedding model", lambda: query_embeddings.misses)
+gauge("retrieval_lexical_only", "Retrievals answered by BM25 without embedding the query", lambda: retriever.methods["lexical"])
+if ollama is not None:
+    gauge("ollama_cold_calls", "LLM calls that had to wait for Ollama to load the model", lambda: ollama.cold_calls)
+if ollama_keeper is not None:
+    gauge("ollama_model_resident", "1 if the keeper's last ping found the model loaded", lambda: int(bool(ollama_keeper.resident)))
+    gauge("ollama_keeper_reloads", "Times the keeper found the model unloaded", lambda: ollama_keeper.reloads)
+gauge("models_ready", "1 once all required models are loaded", lambda: int(models.ready))
+if settings.STT_BATCHING:
+    gauge(
+        "stt_avg_batch_size", "Average Whisper micro-batch size",
+        lambda: stt_batcher.stats()["avg_batch_size"] if stt_batcher is not None else 0,
+    )
+    gauge(
+        "stt_cancelled_jobs", "Whisper jobs dropped or aborted because nobody was waiting",
+        lambda: stt_batcher.stats()["cancelled"] if stt_batcher is not None else 0,
+    )
+if transcript_cache is not None:
+    gauge("transcript_cache_raw_hits", "Uploads answered from the transcript cache by byte hash", lambda: transcript_cache.raw_hits)
+    gauge("transcript_cache_pcm_hits", "Uploads answered from the transcript cache by audio fingerprint", lambda: transcript_cache.pcm_hits)
+if normalizer is not None:
+    gauge("transcript_corrections", "Misheard words fixed by the transcript normalizer", lambda: normalizer.corrections)
+if sessions is not None:
+    gauge("sessions_active", "Conversation sessions that have not expired", lambda: sessions.stats()["sessions"])
+    gauge("session_memory_bytes", "Text held by conversation sessions (turns and summaries)", sessions.memory_bytes)
+    gauge("session_turns_summarized", "Turns folded into session summaries to stay within the token budget", lambda: sessions.folded)
+if settings.TTS_ENABLED:
+    gauge("tts_cache_hits", "Phrase audio cache hits", lambda: tts.cache.hits if tts is not None and tts.cache else 0)
+
+
+@app.get("/metrics")
+def metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
+# === Health ===
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving, models may still be loading
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    status = models.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+# === Stats ===
+@app.get("/stats/memory")
+def memory_stats():
+    stats = {
+        "low_memory": settings.LOW_MEMORY,
+        "process": process_memory(),
+        # RSS growth while each component loaded
+        "components": {name: c.rss_delta_mb for name, c in models.components.items()},
+    }
+    if stt_remote is not None:
+        try:
+            stats["stt_server"] = stt_remote.stats()
+        except Exception as e:
+            stats["stt_server"] = {"error": str(e)}
+    return stats
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    return answer_cache.stats() if answer_cache is not None else {"enabled": False}
+
+
+@app.get("/stats/stt")
+def stt_stats():
+    if stt_remote is not None:
+        try:
+            return stt_remote.stats()
+        except Exception as e:
+            return {"error": str(e)}
+    stats = {"model": settings.STT_MODEL, "quantize": settings.STT_QUANTIZE}
+    if stt_batcher is not None:
+        stats["batching"] = stt_batcher.stats()
+    if stt_tiers is not None:
+        stats["tiers"] = stt_tiers.report()
+    return stats
+
+
+@app.get("/stats/retrieval")
+def retrieval_stats():
+    return {**retriever.stats(), "query_embeddings": query_embeddings.stats()}
+
+
+@app.get("/stats/transcripts")
+def transcript_stats():
+    return transcript_cache.stats() if transcript_cache is not None else {"enabled": False}
+
+
+@app.get("/stats/sessions")
+def session_stats():
+    return sessions.stats() if sessions is not None else {"enabled": False}
+
+
+@app.get("/stats/llm")
+def llm_stats():
+    stats = llm_router.snapshot()
+    if ollama is not None:
+        stats["ollama"] = {"warm_calls": ollama.warm_calls, "cold_calls": ollama.cold_calls}
+        if ollama_keeper is not None:
+            stats["ollama"]["keeper"] = ollama_keeper.status()
+    return stats
+
+
+@app.get("/stats/tts")
+def tts_stats():
+    return tts.stats() if tts is not None else {"enabled": False}
 
-# === Load Ollama model ===
-print("🧠 Loading Ollama model...")
-llm = OllamaLLM(model="llama3.2:3b", base_url="http://localhost:11434")
-
-# === Define custom prompt ===
-template = """
-You are Envision Junior, a voice assistant for Srinivas Institute of Technology (SIT).
-Answer questions using the provided context accurately and politely.
-If the question is unrelated to SIT or its departments, reply as a general AI assistant.
-
-
-
-Context:
-{context}
-
-Question:
-{question}
-"""
-template2 = """
-You are a grammar correction and information-enhancement assistant for Srinivas Institute of Technology (SIT), Mangaluru.
-
-Your responsibilities:
-1. Correct grammar and spelling mistakes in the provided text.
-2. Fix any misspellings or variations of the name “Srinivas Institute of Technology” 
-   (e.g., “Shinwas”, “Srinivaas”, “Srinivas collage”, etc.) and ensure it’s correctly written.
-3. Maintain the original tone and style of the user’s input.
-4. Use the provided context about Srinivas Institute of Technology (SIT) to make the response 
-   informative and relevant.
-5. If the question relates to SIT, include accurate and verified information about:
-   - Location (Valachil, Mangaluru)
-   - Founder (Dr. CA A. Raghavendra Rao, under A. Shama Rao Foundation)
-   - Courses and academic programs
-   - Departments and faculty
-   - Facilities and infrastructure
-   - Placements and industry collaborations
-   - Extracurricular activities and student life
-   - Institutional ethos and values
-6. If the question is unrelated to SIT, only correct grammar and tone — do not add new details.
-
-Context:
-{context}
-
-Question or Text to Correct:
-{question}
-"""
-
-
-prompt = PromptTemplate(template=template, input_variables=["context", "question"])
-prompt2 = PromptTemplate(template=template2, input_variables=["context", "question"])
-
-qa = LLMChain(llm=llm, prompt=prompt)
-qa2 = LLMChain(llm=llm, prompt=prompt2)
-
-
-
-SIT_CONTEXT_TEXT = """The Srinivas Group of Colleges was the dream of an ideal teacher, A. Shama Rao, and was brought to reality by his noble son, CA A. Raghavendra Rao. The A. Shama Rao Foundation, named after the great visionary, was established by Dr. Rao in 1988 with the goal of providing quality education and fostering ethical, responsible citizens.
-
-Education at Srinivas institutions goes beyond imparting knowledge — it aims to nurture moral and ethical values in students, enabling them to apply their learning constructively.
-Today, the Srinivas Group educates over 12,000 students across 18 colleges, located on three campuses — Pandeshwar, Valachil, and Mukka. Each institution is supported by a team of highly qualified faculty and dedicated support staff, ensuring holistic development and academic excellence.
-
-Srinivas Institute of Technology (SIT), located in Valachil, Mangaluru, is a premier engineering institution established in 2006. It is affiliated with Visvesvaraya Technological University (VTU), Belagavi, and is part of the Srinivas Group of Institutions, founded by Dr. CA A. Raghavendra Rao under the A. Shama Rao Foundation.
-
-Over the years, SIT has grown into one of the most highly regarded self-financed engineering colleges in the region, currently hosting more than 13,000 students pursuing higher education. The institution is known for its focus on innovation, research, and industry-oriented learning.
-
-Srinivas Institute of Technology has been awarded an ‘A’ Grade in the Second Cycle of NAAC Accreditation — a recognition of its commitment to academic excellence, innovation, and holistic growth.
-This achievement reflects the collective efforts of the management, faculty, students, alumni, parents, recruiters, and well-wishers. Together, the SIT community continues to set new benchmarks in quality education and sustainable development.
-
-Academic Programs
-Undergraduate Programs (B.E.)
-- Computer Science and Engineering (CSE)
-- Computer Science and Design (CSD)
-- Computer Science and Business Systems (CSBS)
-- Electronics and Communication Engineering (ECE)
-- Mechanical Engineering (ME)
-- Information Science and Engineering (ISE)
-- Electrical and Electronics Engineering (EEE)
-- Aeronautical Engineering
-- Automobile Engineering
-- Marine Engineering
-- Artificial Intelligence and Machine Learning (AIML)
-- Artificial Intelligence and Data Science (AIDS)
-
-Undergraduate Program – Architecture
-- Bachelor of Architecture (B.Arch)
-
-Postgraduate Programs
-- Master of Business Administration (MBA)
-- Master of Computer Applications (MCA)
-- M.Tech in Computer Science and Engineering
-- M.Tech in Industrial Automation and Robotics
-- M.Tech in Digital Electronics
-
-Institutional Ethos
-SIT aims to create a vibrant learning environment where innovation, research, ethics, and leadership form the core values. The institution emphasizes industry collaboration, placements, entrepreneurship, and community development — nurturing students to become globally competent professionals.
-
-Training and Placement Officer
-Dr. Dheeraj Hebri, MCA, Ph.D
-Training and Placement Officer, Srinivas Institute of Technology
-
-Department of Aeronautical Engineering
-1. Dr. Praveen Shenoy — Assistant Professor — B.E., M.Tech, Ph.D
-2. Dr. Gangadhara Rao — Professor — B.E., M.Tech, Ph.D
-3. Mr. P. Ramesh Kumar — Professor — B.E., M.Tech
-4. Dr. Lokesh K. S. — Assistant Professor — B.E., M.Tech, (Ph.D)
-5. Dr. Rajesh — Assistant Professor — B.E., M.Tech, Ph.D
-6. Mr. Jagadeesh B — Assistant Professor — B.E., M.Tech
-7. Ms. Srinidhi Kukkila — Assistant Professor — B.E., M.Tech, MBA
-
-Department of Artificial Intelligence and Machine Learning
-1. Mrs. Daya Naik — Professor & Head (In-Charge) — B.E., M.Tech
-2. Dr. Parvathraj K. M. M. — Associate Professor — B.E., M.Tech, Ph.D
-3. Mr. Ganesh M. S. — Assistant Professor — B.E., M.Tech
-4. Mr. Nivin — Assistant Professor — B.E., M.Tech, Diploma
-5. Mrs. Nithya B. P. — Assistant Professor — B.E., M.Tech
-6. Mr. Madhusudhan S. — Assistant Professor — B.E., M.Tech (Best Teacher Award 2022–23)"""
 
 # === FastAPI route for voice input ===
 @app.post("/upload_audio")
-async def upload_audio(file: UploadFile = File(...)):
+async def upload_audio(request: Request, response: Response, file: UploadFile = File(...),
+                       session_id: str = Form(None)):
+    trace = RequestTrace("upload_audio")
+    response.headers["X-Request-ID"] = trace.request_id
+    cancel = CancelToken(settings.REQUEST_TIMEOUT_S or None)
+    route_taken, status = "none", "ok"
+    try:
+        if not models.ready:
+            status = "not_ready"
+            return not_ready_response(trace.request_id)
+
+        async with executor.admit():
+            # The form field, or a header for clients that can't add one
+            session_id = session_id or request.headers.get("X-Session-ID")
+            result = await run_until_cancelled(answer_audio(file, trace, cancel, session_id), cancel, request)
+            route_taken = result.get("route", "none")
+            return {**result, "request_id": trace.request_id, "timings": trace.timings()}
+
+    except QueueFullError as busy:
+        status = "rejected"
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(busy), "request_id": trace.request_id},
+            headers={"Retry-After": str(busy.retry_after), "X-Request-ID": trace.request_id},
+        )
+
+    except AudioTooLongError as too_long:
+        status = "too_long"
+        return JSONResponse(status_code=413, content={"error": str(too_long), "request_id": trace.request_id})
+
+    except RequestCancelled as cancelled:
+        status = cancelled.reason
+        trace.record_cancel(cancelled.reason)
+        print(f"🛑 Request {trace.request_id} {cancelled.reason} during {trace.attrs['cancelled_in']}")
+        if cancelled.reason == "deadline":
+            return JSONResponse(status_code=504, content={"error": "Request timed out", "request_id": trace.request_id})
+        # 499: the client closed the request (nobody is listening any more)
+        return JSONResponse(status_code=499, content={"error": str(cancelled), "request_id": trace.request_id})
+
+    except AudioDecodeError as decode_error:
+        status = "bad_audio"
+        print("❌ Audio decoding failed:", decode_error)
+        return {"error": "Failed to decode audio", "request_id": trace.request_id}
+
+    except Exception as e:
+        status = "error"
+        print("❌ Error:", e)
+        return {"error": str(e), "request_id": trace.request_id}
+
+    finally:
+        trace.finish(route_taken, status)
+
+
+async def transcribe_upload(audio, trace: RequestTrace, cancel: CancelToken = None) -> TranscriptEntry:
+    # Trim silence; all-silent uploads never reach Whisper or the LLM
+    audio_s = len(audio) / SAMPLE_RATE
+    if settings.VAD_ENABLED:
+        with trace.stage("vad"):
+            vad_result = await executor.run_decode(trim_silence, audio, **VAD_OPTIONS)
+        audio_metrics = vad_result.metrics()
+        print(f"✂️ VAD: {audio_metrics}")
+        if vad_result.is_silent:
+            return TranscriptEntry("", audio_s, vad_result.speech_s, audio_metrics, silent=True)
+        speech_s, audio = vad_result.speech_s, vad_result.audio
+    else:
+        audio_metrics, speech_s = None, None
+
+    with trace.stage("stt"):
+        result = await executor.run_stt(transcribe, audio, cancel=cancel)
+    trace.record_stt(result)
+    return TranscriptEntry(result["text"], audio_s, speech_s, audio_metrics)
+
+
+async def answer_audio(file: UploadFile, trace: RequestTrace, cancel: CancelToken = None, session_id: str = None):
+    # Step 1: Read the upload into memory
+    with trace.stage("upload_read"):
+        data = await file.read()
+    return await answer_recording(
+        data, trace, cancel, content_type=file.content_type, filename=file.filename, session_id=session_id,
+    )
+
+
+async def answer_recording(data: bytes, trace: RequestTrace, cancel: CancelToken = None,
+                           content_type: str = None, filename: str = None, decode=None, session_id: str = None):
+    """Steps 2-9 for one recording; ``decode`` replaces the decode pool (batch mode)."""
+    # Step 2: A byte-identical upload was transcribed before: skip decode and STT
+    heard, key = None, None
+    if transcript_cache is not None:
+        with trace.stage("transcript_cache"):
+            key = await executor.run_decode(raw_key, data)
+            heard = transcript_cache.get_raw(key)
+        if heard is not None:
+            trace.set(transcript_cache="raw")
+
+    if heard is None:
+        # Step 3: Decode to 16 kHz mono float32 PCM (webm/opus, wav or raw PCM)
+        with trace.stage("decode"):
+            audio = await (decode or executor.run_decode)(
+                decode_audio, data, content_type=content_type, filename=filename,
+                max_seconds=settings.MAX_AUDIO_SECONDS,
+            )
+
+        # Step 4: The same recording, re-encoded, was transcribed before
+        if transcript_cache is not None:
+            with trace.stage("transcript_cache"):
+                heard = await executor.run_decode(transcript_cache.get_pcm, audio)
+            if heard is not None:
+                trace.set(transcript_cache="pcm")
+
+        # Step 5: Trim silence and transcribe with Whisper
+        if heard is None:
+            heard = await transcribe_upload(audio, trace, cancel)
+            if transcript_cache is not None:
+                await executor.run_decode(transcript_cache.put, key, heard, audio)
+
+    trace.record_audio(heard.audio_s, heard.speech_s)
+    audio_metrics = heard.audio
+    if heard.silent:
+        return {"query": "", "response": "", "audio": audio_metrics, "route": "silent"}
+    query = normalize_transcript(heard.text, trace)
+    print(f"🎙️ User said: {query}")
+    return await answer_query(query, trace, cancel, audio_metrics, session_id)
+
+
+async def answer_query(query: str, trace: RequestTrace, cancel: CancelToken = None, audio_metrics=None,
+                       session_id: str = None):
+    """Steps 6-9: lookup, answer cache, retrieval and the LLM for a transcribed question."""
+    history = session_history(session_id, trace)
+
+    # Step 6: Table lookups (faculty, heads, programs) need no LLM at all
+    if settings.LOOKUP_ENABLED:
+        with trace.stage("lookup"):
+            direct = route(structured_index, query)
+        if direct is not None:
+            print(f"📇 Direct lookup: {direct}")
+            remember_turn(session_id, query, direct)
+            return {"query": query, "response": direct, "audio": audio_metrics, "route": "lookup"}
+
+    # Step 7: Answer from the cache when this question was already asked.
+    # Follow-ups depend on the conversation, so they never use the cache.
+    cached = None
+    if answer_cache is not None and history is None:
+        with trace.stage("cache"):
+            cached = await executor.run_llm(answer_cache.lookup, query)
+        if cached.answer is not None:
+            print(f"⚡ Answer cache hit ({cached.tier})")
+            remember_turn(session_id, query, cached.answer)
+            return {"query": query, "response": cached.answer, "audio": audio_metrics, "route": "cache", "cache": cached.tier}
+
+    # Step 8: Retrieve the relevant chunks and answer with them
+    llm_prompt = await prepare_llm_call(query, trace, cached, history)
+    llm_info = {"prompt_mode": llm_prompt.mode}
+    with trace.stage("llm"):
+        raw_text = await executor.run_llm(
+            llm.invoke, llm_prompt.prompt, system=llm_prompt.system, cancel=cancel, info=llm_info,
+        )
+    trace.record_llm_call(llm_info)
+    trace.record_generation(llm_prompt.tokens, estimate_tokens(raw_text), trace.stages["llm"])
+    response, source = parse_answer(raw_text)
+
+    print(f"🧠 Model Response ({source}): {response}")
+
+    if cached is not None:
+        answer_cache.store(cached, response)
+    remember_turn(session_id, query, response)
+
+    # Step 9: Send back response
+    return {"query": query, "response": response, "audio": audio_metrics, "route": "llm", "source": source, "prompt_tokens": llm_prompt.tokens}
+
+# === Server-side speech ===
+class SpeakRequest(BaseModel):
+    text: str
+
+
+@app.post("/speak")
+async def speak_text(request: SpeakRequest):
+    if not settings.TTS_ENABLED:
+        return JSONResponse(status_code=404, content={"error": "TTS is disabled"})
+    if tts is None:
+        return not_ready_response()
+
+    trace = RequestTrace("speak")
+
+    async def synthesize(sentence):
+        with trace.stage("tts"):
+            return await executor.run_tts(tts.synthesize, sentence)
+
+    # Start every sentence right away; the pool works through them while
+    # earlier audio is already streaming out
+    jobs = [asyncio.ensure_future(synthesize(s)) for s in split_sentences(request.text)]
+
+    async def audio():
+        status = "ok"
+        try:
+            for job in jobs:
+                yield await job
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            for job in jobs:
+                job.cancel()
+            trace.finish("tts", status)
+
+    return StreamingResponse(audio(), media_type=PCM_CONTENT_TYPE, headers={"X-Request-ID": trace.request_id})
+
+
+# === Streaming voice WebSocket ===
+# Protocol (JSON text frames + binary audio frames):
+#   client -> {"type": "start", "format": "pcm" | "webm", "content_type": "audio/l16; rate=16000", "tts": false}
+#   client -> <binary audio chunk> ...
+#   client -> {"type": "end"}            (optional, silence also ends the utterance)
+#   server -> {"type": "partial", "text": ...}
+#   server -> {"type": "final", "text": ...}
+#   server -> {"type": "token", "text": ...} ...
+#   server -> {"type": "audio", "text": <sentence>, "content_type": ...} + <binary PCM>   (when "tts" is set)
+#   server -> {"type": "done", "query": ..., "response": ...}
+# Audio keeps being received while an answer streams; the next utterance (or
+# a new "start") stops an answer that is still running.
+@app.websocket("/ws/voice")
+async def voice_socket(ws: WebSocket):
+    await ws.accept()
+    if not models.ready:
+        await ws.send_json({"type": "error", "error": "Models are still loading", "retry_after": settings.RETRY_AFTER_SECONDS})
+        await ws.close(code=1013)  # try again later
+        return
+
+    stream = VoiceStream()
+    speak = False
+    session_id = ws.query_params.get("session_id")
+    partial_task = None
+    partial_cancel = None
+    answer_task = None
+    answer_cancel = None
+    last_partial = 0.0
+
+    async def send_partial(window, cancel):
+        result = await executor.run_stt(transcribe, window, cancel=cancel)
+        await ws.send_json({"type": "partial", "text": result["text"].strip()})
+
+    def stop_partial():
+        # A stale partial is worthless: drop it from the STT queue too
+        nonlocal partial_task, partial_cancel
+        if partial_task is not None:
+            partial_cancel.cancel("superseded")
+            partial_task.cancel()
+            partial_task = partial_cancel = None
+
+    def stop_answer(reason):
+        # The answer runs beside the receive loop, so a disconnect or a new
+        # utterance is seen (and stops Whisper / the LLM) mid-answer
+        nonlocal answer_task, answer_cancel
+        if answer_task is not None and not answer_task.done():
+            answer_cancel.cancel(reason)
+            answer_task.cancel()
+        answer_task = answer_cancel = None
+
+    def answer_done(task):
+        # e.g. a send after the socket closed; nobody awaits the task to see it
+        if not task.cancelled() and task.exception() is not None:
+            print("❌ Voice answer failed:", task.exception())
+
     try:
-        # Step 1: Save uploaded audio temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_webm:
-            temp_webm.write(await file.read())
-            temp_webm_path = temp_webm.name
-
-        # Step 2: Convert .webm → .wav using ffmpeg
-        wav_path = temp_webm_path.replace(".webm", ".wav")
-        command = [
-            "ffmpeg", "-y",
-            "-i", temp_webm_path,
-            "-ar", "16000",  # sample rate
-            "-ac", "1",      # mono
-            wav_path
-        ]
-        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-
-        # Step 3: Transcribe audio using Whisper
-        result = stt_model.transcribe(wav_path)
-        query = result["text"].strip()
-        print(f"🎙️ User said: {query}")
-
-#         query = qa2.invoke({
-#          "context": "",
-#             "question": query
-# })['text']
-
-        # print(f"📝 Corrected Query: {query}")
-        response = qa.invoke({
-    "context": SIT_CONTEXT_TEXT,  # full paragraph you included
-    "question": query
-})
-        response = response['text']
-       
-        print(f"🧠 Model (RAG) Response: {response}")
-
-        # Fallback: If no relevant context found, answer generally
-        if "don't know" in response.lower() or "not sure" in response.lower() or "cannot answer" in response.lower() or len(response.strip()) == 0 or "I'm not aware" in response.lower():
-            response = llm.invoke(query+SIT_CONTEXT_TEXT)
-
-        # Step 5: Clean up temporary files
-        os.remove(temp_webm_path)
-        os.remove(wav_path)
-
-        # Step 6: Send back response
-        return {"query": query, "response": response}
-
-    except subprocess.CalledProcessError as ffmpeg_error:
-        print("❌ FFmpeg conversion failed:", ffmpeg_error.stderr.decode())
-        return {"error": "FFmpeg failed to convert audio"}
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            end_of_speech = False
+            if message.get("bytes"):
+                if stream.bytes_received + len(message["bytes"]) > MAX_UPLOAD_BYTES:
+                    await ws.send_json({"type": "error", "error": "Utterance is too large"})
+                    stream = stream.restart()
+                    last_partial = 0.0
+                    continue
+                # Decodes on the decode pool; the reads below only use its result
+                await executor.run_decode(stream.feed, message["bytes"])
+
+                duration = stream.duration
+                if duration > settings.MAX_AUDIO_SECONDS:
+                    await ws.send_json({"type": "error", "error": str(AudioTooLongError(settings.MAX_AUDIO_SECONDS))})
+                    stream = stream.restart()
+                    last_partial = 0.0
+                    continue
+                if duration - last_partial >= settings.WS_PARTIAL_INTERVAL_S and (partial_task is None or partial_task.done()):
+                    last_partial = duration
+                    partial_cancel = CancelToken()
+                    partial_task = asyncio.create_task(send_partial(stream.window(settings.WS_WINDOW_S), partial_cancel))
+
+                end_of_speech = (
+                    duration >= settings.WS_MIN_SPEECH_S + settings.WS_ENDPOINT_SILENCE_S
+                    and stream.ends_in_silence(settings.WS_ENDPOINT_SILENCE_S, settings.WS_SILENCE_RMS)
+                )
+
+            elif message.get("text"):
+                control = json.loads(message["text"])
+                if control.get("type") == "start":
+                    stop_answer("superseded")
+                    stream = VoiceStream(control.get("format", "pcm"), control.get("content_type"))
+                    speak = bool(control.get("tts", False))
+                    session_id = control.get("session_id", session_id)
+                    last_partial = 0.0
+                elif control.get("type") == "end":
+                    end_of_speech = True
+
+            if end_of_speech:
+                stop_partial()
+                stop_answer("superseded")
+                answer_cancel = CancelToken(settings.REQUEST_TIMEOUT_S or None)
+                answer_task = asyncio.create_task(answer_stream(ws, stream, speak, session_id, answer_cancel))
+                answer_task.add_done_callback(answer_done)
+                stream = stream.restart()
+                last_partial = 0.0
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        stop_partial()
+        stop_answer("disconnected")
+
+
+async def answer_stream(ws: WebSocket, stream: VoiceStream, speak: bool = False, session_id: str = None,
+                        cancel: CancelToken = None):
+    trace = RequestTrace("ws_voice")
+    cancel = cancel or CancelToken(settings.REQUEST_TIMEOUT_S or None)
+    route_taken, status = "none", "ok"
+
+    speech = None
+    if speak and tts is not None:
+        async def synthesize(sentence):
+            with trace.stage("tts"):
+                return await executor.run_tts(tts.synthesize, sentence)
+
+        async def send_audio(sentence, pcm):
+            await ws.send_json({"type": "audio", "text": sentence, "content_type": PCM_CONTENT_TYPE})
+            await ws.send_bytes(pcm)
+
+        speech = SpeechStream(synthesize, send_audio)
+
+    async def emit(text):
+        await ws.send_json({"type": "token", "text": text})
+        if speech is not None:
+            speech.feed(text)
+
+    async def done(message):
+        if speech is not None:
+            await speech.finish()
+        await ws.send_json({"type": "done", "request_id": trace.request_id, "timings": trace.timings(), **message})
+
+    try:
+        async with executor.admit():
+            with trace.stage("decode"):
+                audio = await executor.run_decode(stream.audio)
+            trace.record_audio(len(audio) / SAMPLE_RATE)
+            with trace.stage("stt"):
+                result = await executor.run_stt(transcribe, audio, cancel=cancel)
+            trace.record_stt(result)
+            query = normalize_transcript(result["text"], trace)
+            print(f"🎙️ User said: {query}")
+            await ws.send_json({"type": "final", "text": query, "request_id": trace.request_id})
+            history = session_history(session_id, trace)
+
+            if settings.LOOKUP_ENABLED:
+                with trace.stage("lookup"):
+                    direct = route(structured_index, query)
+                if direct is not None:
+                    route_taken = "lookup"
+                    print(f"📇 Direct lookup: {direct}")
+                    remember_turn(session_id, query, direct)
+                    await emit(direct)
+                    await done({"query": query, "response": direct, "route": "lookup"})
+                    return
+
+            cached = None
+            if answer_cache is not None and history is None:
+                with trace.stage("cache"):
+                    cached = await executor.run_llm(answer_cache.lookup, query)
+                if cached.answer is not None:
+                    route_taken = "cache"
+                    print(f"⚡ Answer cache hit ({cached.tier})")
+                    remember_turn(session_id, query, cached.answer)
+                    await emit(cached.answer)
+                    await done({"query": query, "response": cached.answer, "route": "cache"})
+                    return
+
+            route_taken = "llm"
+            llm_prompt = await prepare_llm_call(query, trace, cached, history)
+            stripper = TagStripper()
+            tokens = []
+            raw_text = ""
+            llm_info = {"prompt_mode": llm_prompt.mode}
+            llm_start = time.perf_counter()
+            with trace.stage("llm"):
+                async for token in executor.stream_llm(
+                    llm.stream, llm_prompt.prompt, system=llm_prompt.system, cancel=cancel, info=llm_info,
+                ):
+                    if not raw_text:
+                        trace.record_stage("llm_first_token", time.perf_counter() - llm_start)
+                    raw_text += token
+                    text = stripper.feed(token)
+                    if text:
+                        tokens.append(text)
+                        await emit(text)
+                tail = stripper.flush()
+                if tail:
+                    tokens.append(tail)
+                    await emit(tail)
+            trace.record_llm_call(llm_info)
+            trace.record_generation(llm_prompt.tokens, estimate_tokens(raw_text), trace.stages["llm"])
+
+            response = "".join(tokens).strip()
+            print(f"🧠 Model (streamed) Response ({stripper.source}): {response}")
+            if cached is not None:
+                answer_cache.store(cached, response)
+            remember_turn(session_id, query, response)
+            await done({"query": query, "response": response, "route": "llm", "source": stripper.source, "prompt_tokens": llm_prompt.tokens})
+
+    except QueueFullError as busy:
+        status = "rejected"
+        await ws.send_json({"type": "error", "error": str(busy), "retry_after": busy.retry_after})
+
+    except AudioDecodeError as decode_error:
+        status = "bad_audio"
+        print("❌ Audio decoding failed:", decode_error)
+        await ws.send_json({"type": "error", "error": "Failed to decode audio"})
+
+    except RequestCancelled as cancelled:
+        status = cancelled.reason
+        trace.record_cancel(cancelled.reason)
+        # Superseded by the next utterance, or nobody left to tell
+        if cancelled.reason not in ("superseded", "disconnected"):
+            await ws.send_json({"type": "error", "error": "Request timed out" if cancelled.reason == "deadline" else str(cancelled)})
+
+    except asyncio.CancelledError:
+        # Stopped by the socket handler: disconnected, or a new utterance
+        status = cancel.reason or "cancelled"
+        trace.record_cancel(status)
+        raise
+
+    except WebSocketDisconnect:
+        # Stop Whisper / the LLM stream for an answer nobody will hear; the
+        # receive loop sees the disconnect itself
+        cancel.cancel("disconnected")
+        status = "disconnected"
+        trace.record_cancel("disconnected")
 
     except Exception as e:
+        status = "error"
         print("❌ Error:", e)
-        return {"error": str(e)}
+        await ws.send_json({"type": "error", "error": str(e)})
+
+    finally:
+        if speech is not None:
+            speech.cancel()
+        trace.finish(route_taken, status)
 
 # === Run command ===
 # uvicorn main:app --reload
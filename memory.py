@@ -0,0 +1,28 @@
+# Resident memory readings for the memory budget report. Linux exposes them
+# in /proc; elsewhere only this process's peak is available, via getrusage.
+import resource
+import sys
+
+
+def rss_mb(pid="self", field: str = "VmRSS"):
+    """Current (VmRSS) or peak (VmHWM) resident set size in MB, or None."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid == "self" and field == "VmHWM":
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return None
+
+
+def peak_rss_mb(pid="self"):
+    return rss_mb(pid, "VmHWM")
+
+
+def process_memory():
+    return {"rss_mb": rss_mb(), "peak_rss_mb": peak_rss_mb()}
@@ -0,0 +1,146 @@
+# Background model loading. The server binds its port right away; Whisper,
+# the knowledge index, the LLM warm-up and TTS engines load in parallel on
+# their own threads and /readyz reports when the required ones are done.
+#
+# Each component's RSS growth while it loads is recorded. With parallel
+# loading the deltas overlap; load sequentially for a clean per-component
+# breakdown (and a lower peak).
+#
+# A load that raises is retried with capped exponential backoff. Required
+# components retry until they load, so a dependency that comes up after us
+# (Ollama in the same compose file) is waited for however late it is;
+# optional ones give up after a few attempts.
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from memory import rss_mb
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+@dataclass
+class Component:
+    name: str
+    load: Callable[[], object]
+    required: bool = True
+    state: str = PENDING
+    attempts: int = 0
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+    rss_delta_mb: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event)
+    started: Optional[float] = field(default=None, repr=False)
+    rss_before_mb: Optional[float] = field(default=None, repr=False)
+
+
+class ModelLoader:
+    def __init__(self, parallel: bool = True, attempts: int = 1, retry_s: float = 2.0, retry_max_s: float = 30.0):
+        self.components = {}
+        self.parallel = parallel
+        self.max_attempts = max(1, attempts)
+        self.retry_s = retry_s
+        self.retry_max_s = retry_max_s
+        self.started_at = None
+
+    def add(self, name: str, load: Callable[[], object], required: bool = True):
+        """Register a loader; ``required`` components gate readiness."""
+        self.components[name] = Component(name, load, required)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        if not self.parallel:
+            threading.Thread(target=self._load_all, name="load-models", daemon=True).start()
+            return
+        for component in self.components.values():
+            threading.Thread(target=self._load, args=(component,), name=f"load-{component.name}", daemon=True).start()
+
+    def _load_all(self):
+        # One attempt each in order first, so a late dependency doesn't hold
+        # up components that would load right away; then retry the rest
+        retry = [c for c in self.components.values() if not self._load(c, retry=False)]
+        # Optional ones first: they give up eventually, required ones may not
+        retry.sort(key=lambda c: c.required)
+        for component in retry:
+            time.sleep(self._retry_delay(component.attempts))
+            self._load(component)
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_max_s, self.retry_s * 2 ** (attempts - 1))
+
+    def _gives_up(self, component: Component) -> bool:
+        return not component.required and component.attempts >= self.max_attempts
+
+    def _load(self, component: Component, retry: bool = True) -> bool:
+        """Load until ready or given up; False if it failed once with ``retry=False``."""
+        if component.started is None:
+            component.state = LOADING
+            component.started = time.perf_counter()
+            component.rss_before_mb = rss_mb()
+        while True:
+            component.attempts += 1
+            try:
+                component.load()
+            except Exception as e:
+                component.error = str(e)
+                if self._gives_up(component):
+                    print(f"❌ Loading {component.name} failed after {component.attempts} attempts:", e)
+                    self._finish(component, FAILED)
+                    return True
+                if not retry:
+                    print(f"⚠️ Loading {component.name} failed (attempt {component.attempts}), will retry:", e)
+                    return False
+                delay = self._retry_delay(component.attempts)
+                print(f"⚠️ Loading {component.name} failed (attempt {component.attempts}), retrying in {delay:.0f}s:", e)
+                time.sleep(delay)
+                continue
+            component.error = None
+            print(f"✅ {component.name} ready in {time.perf_counter() - component.started:.1f}s")
+            self._finish(component, READY)
+            return True
+
+    def _finish(self, component: Component, state: str):
+        component.state = state
+        component.seconds = round(time.perf_counter() - component.started, 3)
+        rss_after = rss_mb()
+        if component.rss_before_mb is not None and rss_after is not None:
+            component.rss_delta_mb = round(rss_after - component.rss_before_mb, 1)
+        component.done.set()
+
+    @property
+    def ready(self) -> bool:
+        return all(c.state == READY for c in self.components.values() if c.required)
+
+    def is_ready(self, name: str) -> bool:
+        component = self.components.get(name)
+        return component is not None and component.state == READY
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until every component has finished (or failed) loading.
+
+        A required component that can't load keeps this waiting: pass a timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for component in self.components.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not component.done.wait(remaining):
+                return False
+        return True
+
+    def status(self):
+        uptime = time.perf_counter() - self.started_at if self.started_at is not None else None
+        return {
+            "ready": self.ready,
+            "uptime_s": round(uptime, 3) if uptime is not None else None,
+            "components": {
+                c.name: {
+                    "state": c.state, "required": c.required, "attempts": c.attempts, "seconds": c.seconds,
+                    "rss_delta_mb": c.rss_delta_mb, "error": c.error,
+                }
+                for c in self.components.values()
+            },
+        }
@@ -0,0 +1,181 @@
+# One pooled HTTP client for every Ollama call, and a keeper thread that
+# keeps the chat model resident during the kiosk's active hours.
+#
+# Ollama unloads a model once its keep_alive runs out, and the next
+# question then waits seconds for the weights to page back in. Each
+# generation reports how long loading took, so every request can be
+# labelled "warm" or "cold".
+#
+# All calls to one model must use the same num_ctx / num_thread: Ollama
+# reloads the model whenever those options change.
+import re
+import threading
+import time
+from datetime import datetime
+
+# A generation whose load took longer than this had to page the model in
+COLD_LOAD_S = 0.25
+
+ACTIVE_HOURS_RE = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+DURATION_RE = re.compile(r"^(-?\d+(?:\.\d+)?)([smh])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value: str):
+    """"30m" / "1h" stay strings; plain numbers are seconds (-1 = forever)."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return value
+    return int(seconds) if seconds.is_integer() else seconds
+
+
+def keep_alive_seconds(value: str):
+    """parse_keep_alive as whole seconds, for clients that only take an int."""
+    keep_alive = parse_keep_alive(value)
+    if isinstance(keep_alive, str):
+        match = DURATION_RE.match(keep_alive)
+        if not match:
+            raise ValueError(f"Unsupported keep_alive {value!r}: use e.g. 300, 30m or 1h")
+        return int(float(match.group(1)) * DURATION_UNITS[match.group(2)])
+    return None if keep_alive is None else int(keep_alive)
+
+
+def parse_active_hours(spec: str):
+    """"08:00-18:00,19:00-21:00" -> [(480, 1080), (1140, 1260)] in minutes.
+
+    An empty spec means always active. A window may wrap past midnight
+    ("22:00-06:00").
+    """
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip().replace(" ", "")
+        if not part:
+            continue
+        match = ACTIVE_HOURS_RE.match(part)
+        if not match:
+            raise ValueError(f"Bad active hours window {part!r}, expected HH:MM-HH:MM")
+        h1, m1, h2, m2 = map(int, match.groups())
+        windows.append((h1 * 60 + m1, h2 * 60 + m2))
+    return windows
+
+
+def in_active_hours(windows, now: datetime = None) -> bool:
+    if not windows:
+        return True
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end in windows:
+        if start <= end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):
+            return True
+    return False
+
+
+def model_options(num_ctx: int = 0, num_thread: int = 0):
+    """Ollama ``options``; 0 leaves a value at the model's default."""
+    options = {}
+    if num_ctx > 0:
+        options["num_ctx"] = num_ctx
+    if num_thread > 0:
+        options["num_thread"] = num_thread
+    return options
+
+
+def client_kwargs(max_connections: int, timeout: float):
+    """httpx settings for ollama.Client / langchain_ollama ``client_kwargs``."""
+    import httpx
+
+    return {
+        "timeout": timeout or None,
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        ),
+    }
+
+
+def make_client(base_url: str, max_connections: int, timeout: float):
+    from ollama import Client
+
+    # httpx.Client is thread-safe: the LLM pool's threads and the router's
+    # hedges all share these keep-alive connections
+    return Client(host=base_url, **client_kwargs(max_connections, timeout))
+
+
+def load_seconds(response) -> float:
+    return (getattr(response, "load_duration", None) or 0) / 1e9
+
+
+class ModelKeeper:
+    """Refreshes the model's keep_alive every ``interval_s`` while active.
+
+    An empty-prompt generate loads the model if needed and resets its
+    unload timer without generating anything.
+    """
+
+    def __init__(self, client, model: str, keep_alive=None, options=None,
+                 active_hours=None, interval_s: float = 60):
+        self.client = client
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = options or None
+        self.active_hours = active_hours or []
+        self.interval_s = interval_s
+        self.pings = 0
+        self.reloads = 0
+        self.errors = 0
+        self.resident = None
+        self.last_ping = None
+        self.last_error = None
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="ollama-keeper", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            if in_active_hours(self.active_hours):
+                self.ping()
+
+    def ping(self):
+        try:
+            response = self.client.generate(
+                model=self.model, prompt="", keep_alive=self.keep_alive, options=self.options,
+            )
+        except Exception as e:
+            self.errors += 1
+            self.resident = False
+            self.last_error = str(e)
+            print(f"⚠️ Ollama keeper ping failed: {e}")
+            return
+        self.pings += 1
+        self.last_ping = time.time()
+        self.resident = True
+        loaded_s = load_seconds(response)
+        if loaded_s > COLD_LOAD_S:
+            # It had been unloaded; the next visitor would have paid this
+            self.reloads += 1
+            print(f"🦙 Ollama model '{self.model}' was unloaded, reloaded in {loaded_s:.1f}s")
+
+    def status(self):
+        return {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "options": self.options or {},
+            "active": in_active_hours(self.active_hours),
+            "resident": self.resident,
+            "pings": self.pings,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_ping": self.last_ping,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,98 @@
+# Prompt layouts for the answer LLM call.
+#
+#   context  instructions, the top-k retrieved chunks, then the question
+#   general  instructions and the question, for questions not about SIT
+#   prefix   instructions plus the whole knowledge base as a static system
+#            prompt; the prompt itself is only the question
+#
+# Ollama keeps the KV cache of the last prompt in each of its slots and
+# only prefills the tokens after the longest common prefix. In prefix mode
+# every request starts with the same ~1k tokens, so after the first one only
+# the question is prefilled. That only holds while the system prompt stays
+# byte-for-byte identical: nothing per-request (dates, IDs, retrieved
+# chunks, conversation history) may go into it.
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.prompts import PromptTemplate
+
+from retrieval import estimate_tokens
+
+CONTEXT_PROMPT = PromptTemplate(
+    template="""
+You are Envision Junior, a voice assistant for Srinivas Institute of Technology (SIT).
+Answer questions using the provided context accurately and politely.
+If the question is unrelated to SIT or its departments, or the context does not
+contain the answer, reply as a general AI assistant.
+Begin your reply with one line, "SOURCE: context" if the answer comes from the
+context or "SOURCE: general" if it does not, then give the answer.
+
+Context:
+{context}
+
+{history}Question:
+{question}
+""",
+    input_variables=["context", "history", "question"],
+)
+
+GENERAL_PROMPT = PromptTemplate(
+    template="""
+You are Envision Junior, a friendly voice assistant at Srinivas Institute of Technology (SIT).
+Answer the question as a general AI assistant, accurately and politely.
+Begin your reply with one line, "SOURCE: general", then give the answer.
+
+{history}Question:
+{question}
+""",
+    input_variables=["history", "question"],
+)
+
+PREFIX_SYSTEM = """You are Envision Junior, a voice assistant for Srinivas Institute of Technology (SIT).
+Answer questions using the context below accurately and politely.
+If the question is unrelated to SIT or its departments, or the context does not
+contain the answer, reply as a general AI assistant.
+Begin your reply with one line, "SOURCE: context" if the answer comes from the
+context or "SOURCE: general" if it does not, then give the answer.
+
+Context:
+{context}"""
+
+QUESTION_PROMPT = "{history}Question:\n{question}"
+
+# Session history goes after the static parts and right before the
+# question, so it never breaks the cached prefix
+HISTORY_PROMPT = "Conversation so far:\n{history}\n\n"
+
+
+@dataclass
+class LLMPrompt:
+    mode: str
+    prompt: str
+    system: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens((self.system or "") + self.prompt)
+
+
+def history_block(history: str = None) -> str:
+    return HISTORY_PROMPT.format(history=history) if history else ""
+
+
+def context_prompt(question: str, context: str, history: str = None) -> LLMPrompt:
+    prompt = CONTEXT_PROMPT.format(context=context, history=history_block(history), question=question)
+    return LLMPrompt("context", prompt)
+
+
+def general_prompt(question: str, history: str = None) -> LLMPrompt:
+    return LLMPrompt("general", GENERAL_PROMPT.format(history=history_block(history), question=question))
+
+
+def prefix_system(knowledge_text: str) -> str:
+    """The static system prompt for prefix mode; build once per knowledge file."""
+    return PREFIX_SYSTEM.format(context=knowledge_text.strip())
+
+
+def prefix_prompt(question: str, system: str, history: str = None) -> LLMPrompt:
+    return LLMPrompt("prefix", QUESTION_PROMPT.format(history=history_block(history), question=question.strip()), system)
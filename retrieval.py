@@ -0,0 +1,250 @@
+# Retrieval stage: index srinivas_data.txt once at startup and build each
+# prompt from only the top-k relevant chunks, within a token budget, instead
+# of pasting the whole document into every request.
+#
+# With a lexical weight set, retrieval is hybrid: a BM25 index over the same
+# chunks answers on its own when one chunk clearly covers the query (no
+# embedding call at all), and otherwise its scores are fused with cosine
+# similarity.
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from answer_cache import normalize_query
+from lexical import BM25Index
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    position: int
+
+
+@dataclass
+class Retrieval:
+    chunks: list
+    scores: list
+    context: str
+    context_tokens: int
+    method: str = "vector"  # "vector", "lexical" or "hybrid"
+
+
+def estimate_tokens(text: str) -> int:
+    # Llama-family tokenizers average roughly four characters per token on
+    # English prose; close enough for budgeting without loading a tokenizer.
+    return math.ceil(len(text) / 4)
+
+
+def load_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def split_chunks(text: str, chunk_size: int = 600):
+    """Greedily pack blank-line separated blocks into chunks of ~chunk_size chars."""
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+
+    pieces = []
+    for block in blocks:
+        if len(block) <= chunk_size:
+            pieces.append(block)
+            continue
+        # Oversized prose: break on sentence ends
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", block):
+            if current and len(current) + len(sentence) + 1 > chunk_size:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            pieces.append(current)
+
+    # A short block followed by a long or multi-line one is a section title
+    # (e.g. "Institutional Ethos", "Department of ..."). Chunks may restart at
+    # titles so they stay with the text they introduce.
+    def is_heading(i):
+        piece = pieces[i]
+        if len(piece) >= 60 or i + 1 >= len(pieces):
+            return False
+        following = pieces[i + 1]
+        return "\n" in piece or "\n" in following or len(following) >= 200
+
+    chunks = []
+    current = ""
+    for i, piece in enumerate(pieces):
+        if current and (len(current) + len(piece) + 1 > chunk_size
+                        or (is_heading(i) and len(current) > chunk_size // 3)):
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+    return [
+        Chunk(id=hashlib.sha256(c.encode("utf-8")).hexdigest()[:16], text=c, position=i)
+        for i, c in enumerate(chunks)
+    ]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CachedEmbeddings:
+    """LRU cache in front of ``embed_query``; documents pass straight through.
+
+    Keys are normalized the way the answer cache normalizes questions, so the
+    semantic cache and the retriever share entries for the same question.
+    """
+
+    def __init__(self, embeddings, max_size: int = 1024):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # key -> Event for embeddings being computed, so concurrent requests
+        # for the same question wait for one call instead of each making it
+        self._pending = {}
+        # Guards entries, _pending and the counters: this is called from
+        # every LLM pool thread at once
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str):
+        key = normalize_query(text) or text
+        while True:
+            with self._lock:
+                vector = self.entries.get(key)
+                if vector is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is embedding this key; if it failed, try ourselves
+            pending.wait()
+        try:
+            vector = self.embeddings.embed_query(key)
+            with self._lock:
+                self.entries[key] = vector
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class Retriever:
+    def __init__(self, embeddings, top_k: int = 3, token_budget: int = 600, chunk_size: int = 600,
+                 store=None, lexical_weight: float = 0.0, lexical_min_score: float = 0.75,
+                 lexical_margin: float = 1.25):
+        # ``store`` is an optional kb_index.KnowledgeIndex that persists vectors.
+        # ``lexical_weight`` > 0 turns on hybrid search: a query whose best
+        # lexical score reaches ``lexical_min_score`` and beats the runner-up
+        # by ``lexical_margin`` skips the embedding entirely.
+        self.embeddings = embeddings
+        self.store = store
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.chunk_size = chunk_size
+        self.lexical_weight = lexical_weight
+        self.lexical_min_score = lexical_min_score
+        self.lexical_margin = lexical_margin
+        self.chunks = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.lexical = None
+        self.methods = Counter()
+        self._lock = threading.Lock()
+
+    def index(self, text: str):
+        if self.store is not None:
+            chunks, matrix = self.store.sync(text)
+        else:
+            chunks = split_chunks(text, self.chunk_size)
+            vectors = self.embeddings.embed_documents([c.text for c in chunks])
+            matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        lexical = BM25Index([c.text for c in chunks]) if self.lexical_weight > 0 else None
+        with self._lock:
+            self.chunks, self.matrix, self.lexical = chunks, matrix, lexical
+        print(f"📚 Indexed {len(chunks)} knowledge chunks")
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return normalize_rows(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+
+    def search(self, query: str, query_vector: np.ndarray = None) -> Retrieval:
+        with self._lock:
+            chunks, matrix, lexical = self.chunks, self.matrix, self.lexical
+        if not chunks:
+            return Retrieval(chunks=[], scores=[], context="", context_tokens=0)
+
+        method = "vector"
+        lexical_scores = lexical.scores(query) if lexical is not None else None
+        # Only worth skipping the vector side when it would cost an embedding
+        if lexical_scores is not None and query_vector is None:
+            order = np.argsort(-lexical_scores)[:max(self.top_k, 2)]
+            best = float(lexical_scores[order[0]])
+            runner_up = float(lexical_scores[order[1]]) if len(order) > 1 else 0.0
+            if best >= self.lexical_min_score and best >= self.lexical_margin * runner_up:
+                order = order[:self.top_k]
+                self._count("lexical")
+                return self._pack(
+                    [chunks[i] for i in order], [float(lexical_scores[i]) for i in order], "lexical",
+                )
+
+        if query_vector is None:
+            query_vector = self.embed_query(query)
+        scores = matrix @ query_vector
+        if lexical_scores is not None:
+            # Both are on a 0..1 scale for relevant chunks, so the fused score
+            # still works with RETRIEVAL_MIN_SCORE
+            scores = (1 - self.lexical_weight) * scores + self.lexical_weight * lexical_scores
+            method = "hybrid"
+        self._count(method)
+        order = np.argsort(-scores)[:self.top_k]
+        return self._pack([chunks[i] for i in order], [float(scores[i]) for i in order], method)
+
+    def _count(self, method: str):
+        # search() runs on several LLM pool threads; Counter += isn't atomic
+        with self._lock:
+            self.methods[method] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"chunks": len(self.chunks), "lexical": self.lexical is not None, "searches": dict(self.methods)}
+
+    def _pack(self, ranked, scores, method: str = "vector") -> Retrieval:
+        # Take chunks best-first until the budget is spent; always keep the
+        # best one so the model has something to go on
+        picked, picked_scores, used = [], [], 0
+        for chunk, score in zip(ranked, scores):
+            cost = estimate_tokens(chunk.text)
+            if picked and used + cost > self.token_budget:
+                continue
+            picked.append(chunk)
+            picked_scores.append(score)
+            used += cost
+        context = "\n\n".join(c.text for c in picked)
+        return Retrieval(chunks=picked, scores=picked_scores, context=context, context_tokens=used, method=method)
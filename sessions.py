@@ -0,0 +1,159 @@
+# Conversation sessions, so follow-ups ("and who teaches there?") keep
+# their referent without the visitor repeating the whole question.
+#
+# Each session keeps its last few turns verbatim. Older turns are folded into
+# a short extractive summary (the question and the first sentence of the
+# answer), and the oldest summary clauses are dropped in turn, so the
+# history sent to the LLM stays under a fixed token budget however long the
+# conversation runs. Sessions expire after a TTL of inactivity and the
+# store is LRU-bounded.
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from retrieval import estimate_tokens
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` at a word boundary to roughly ``max_tokens``."""
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    clipped = text[:max_tokens * 4].rsplit(" ", 1)[0]
+    return clipped.rstrip(",;:") + "…"
+
+
+def first_sentence(text: str) -> str:
+    return SENTENCE_END_RE.split(text.strip(), 1)[0]
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+@dataclass
+class Session:
+    turns: deque = field(default_factory=deque)
+    summary: deque = field(default_factory=deque)  # one clause per folded turn
+    summarized_turns: int = 0
+    total_turns: int = 0
+    last_seen: float = 0.0
+
+
+@dataclass
+class SessionHistory:
+    text: str
+    turns: int
+    tokens: int
+    last_question: str
+
+    def retrieval_query(self, question: str) -> str:
+        # "who teaches there?" alone retrieves nothing useful; the previous
+        # question carries the referent
+        return f"{self.last_question} {question}"
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 1000, ttl_s: float = 600, max_turns: int = 3,
+                 token_budget: int = 400, summary_tokens: int = 120):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        # A single turn may use at most this much of the budget
+        self.turn_tokens = max(16, (token_budget - summary_tokens) // max(1, max_turns))
+        self.sessions = OrderedDict()  # least recently used first
+        self.expired = 0
+        self.evicted = 0
+        self.folded = 0
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float):
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_seen <= self.ttl_s:
+                break
+            self.sessions.popitem(last=False)
+            self.expired += 1
+
+    def history(self, session_id: str):
+        """The conversation so far, or None for a new (or expired) session."""
+        with self._lock:
+            self._sweep(time.monotonic())
+            session = self.sessions.get(session_id)
+            if session is None or not session.turns:
+                return None
+            text = self._render(session)
+            return SessionHistory(text, session.total_turns, estimate_tokens(text), session.turns[-1].question)
+
+    def record(self, session_id: str, question: str, answer: str):
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session()
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    self.evicted += 1
+            self.sessions.move_to_end(session_id)
+            session.last_seen = now
+            session.total_turns += 1
+            session.turns.append(Turn(
+                clip_tokens(question, self.turn_tokens // 2), clip_tokens(answer, self.turn_tokens // 2),
+            ))
+            self._compact(session)
+
+    def _compact(self, session: Session):
+        while len(session.turns) > self.max_turns or (
+            len(session.turns) > 1 and estimate_tokens(self._render(session)) > self.token_budget
+        ):
+            turn = session.turns.popleft()
+            session.summary.append(f"{turn.question} → {first_sentence(turn.answer)}")
+            session.summarized_turns += 1
+            self.folded += 1
+            while len(session.summary) > 1 and estimate_tokens(" ".join(session.summary)) > self.summary_tokens:
+                session.summary.popleft()
+
+    @staticmethod
+    def _render(session: Session) -> str:
+        lines = []
+        if session.summary:
+            lines.append("Earlier: " + "; ".join(session.summary))
+        for turn in session.turns:
+            lines.append(f"User: {turn.question}")
+            lines.append(f"Assistant: {turn.answer}")
+        return "\n".join(lines)
+
+    def memory_bytes(self) -> int:
+        """Approximate text held by all sessions (UTF-8)."""
+        with self._lock:
+            return sum(
+                sum(len(t.question.encode("utf-8")) + len(t.answer.encode("utf-8")) for t in s.turns)
+                + sum(len(clause.encode("utf-8")) for clause in s.summary)
+                for s in self.sessions.values()
+            )
+
+    def stats(self):
+        memory = self.memory_bytes()
+        with self._lock:
+            self._sweep(time.monotonic())
+            turns = sum(len(s.turns) for s in self.sessions.values())
+            return {
+                "sessions": len(self.sessions),
+                "turns_kept": turns,
+                "turns_summarized": sum(s.summarized_turns for s in self.sessions.values()),
+                "memory_bytes": memory,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "folded": self.folded,
+                "token_budget": self.token_budget,
+                "ttl_s": self.ttl_s,
+            }
@@ -0,0 +1,190 @@
+# Runtime configuration, read from environment variables so the same code
+# runs on a laptop, the kiosk and the backend container.
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# === Memory budget ===
+# LOW_MEMORY picks defaults that fit the 1 GB backend container: int8 Whisper,
+# small STT batches, one TTS engine, tighter upload caps and sequential model
+# loading. Each of them can still be overridden on its own.
+LOW_MEMORY = _bool("LOW_MEMORY", False)
+MAX_UPLOAD_MB = _float("MAX_UPLOAD_MB", 5 if LOW_MEMORY else 25)
+MAX_AUDIO_SECONDS = _float("MAX_AUDIO_SECONDS", 30 if LOW_MEMORY else 120)
+
+# === Inference executor ===
+DECODE_WORKERS = _int("DECODE_WORKERS", 2)
+STT_WORKERS = _int("STT_WORKERS", 1)
+LLM_WORKERS = _int("LLM_WORKERS", 4)
+MAX_PENDING_REQUESTS = _int("MAX_PENDING_REQUESTS", 8)
+RETRY_AFTER_SECONDS = _int("RETRY_AFTER_SECONDS", 5)
+
+# === Model loading ===
+STT_MODEL = os.getenv("STT_MODEL", "base")
+# Whisper checkpoints are downloaded to / read from here; bake it into the
+# image or mount it as a volume so cold starts never re-download
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR") or None
+WARMUP_LLM = _bool("WARMUP_LLM", True)
+# Parallel loading is faster but the peak is the sum of all components
+PARALLEL_MODEL_LOADING = _bool("PARALLEL_MODEL_LOADING", not LOW_MEMORY)
+# A failed load (e.g. Ollama still starting) is retried with exponential
+# backoff: MODEL_LOAD_RETRY_S, doubling up to MODEL_LOAD_RETRY_MAX_S.
+# Required components (Whisper, knowledge index) retry until they load;
+# optional ones (LLM warm-up, TTS) stop after MODEL_LOAD_ATTEMPTS.
+MODEL_LOAD_ATTEMPTS = _int("MODEL_LOAD_ATTEMPTS", 5)
+MODEL_LOAD_RETRY_S = _float("MODEL_LOAD_RETRY_S", 2)
+MODEL_LOAD_RETRY_MAX_S = _float("MODEL_LOAD_RETRY_MAX_S", 30)
+# "int8": dynamically quantized Linear layers (CPU only)
+STT_QUANTIZE = os.getenv("STT_QUANTIZE", "int8" if LOW_MEMORY else "").strip().lower() or None
+
+# === Shared STT process ===
+# When set, Whisper runs once in `python -m stt_server` and every uvicorn
+# worker talks to it over IPC instead of loading its own copy.
+# A Unix socket path, or "host:port" for TCP on a loopback address only.
+# The authkey has no default: set the same secret (16+ characters) for the
+# server and the workers of each deployment.
+STT_SERVER_ADDRESS = os.getenv("STT_SERVER_ADDRESS") or None
+STT_SERVER_AUTHKEY = os.getenv("STT_SERVER_AUTHKEY", "").encode("utf-8") or None
+STT_SERVER_CONNECT_TIMEOUT_S = _float("STT_SERVER_CONNECT_TIMEOUT_S", 120)
+
+# === Deadlines ===
+# Whole-request budget for /upload_audio and each WebSocket answer; 0 = none.
+# Work still running when it expires (or the client disconnects) is aborted.
+REQUEST_TIMEOUT_S = _float("REQUEST_TIMEOUT_S", 60)
+DISCONNECT_POLL_S = _float("DISCONNECT_POLL_S", 0.25)
+
+# === Whisper micro-batching ===
+STT_BATCHING = _bool("STT_BATCHING", True)
+STT_BATCH_WINDOW_MS = _float("STT_BATCH_WINDOW_MS", 30)
+STT_BATCH_MAX_SIZE = _int("STT_BATCH_MAX_SIZE", 2 if LOW_MEMORY else 8)
+STT_LANGUAGE = os.getenv("STT_LANGUAGE") or None
+
+# === STT tiers ===
+# Short clips are transcribed by STT_FAST_MODEL first and re-run on
+# STT_MODEL only when the fast pass looks unsure. Empty disables tiering;
+# low-memory hosts skip it so only one Whisper model is resident.
+STT_FAST_MODEL = os.getenv("STT_FAST_MODEL", "" if LOW_MEMORY else "tiny").strip() or None
+STT_FAST_MAX_AUDIO_S = _float("STT_FAST_MAX_AUDIO_S", 8)
+STT_ESCALATE_LOGPROB = _float("STT_ESCALATE_LOGPROB", -0.7)
+STT_ESCALATE_NO_SPEECH = _float("STT_ESCALATE_NO_SPEECH", 0.5)
+
+# === Streaming voice WebSocket ===
+WS_PARTIAL_INTERVAL_S = _float("WS_PARTIAL_INTERVAL_S", 1.0)
+WS_WINDOW_S = _float("WS_WINDOW_S", 10.0)
+WS_MIN_SPEECH_S = _float("WS_MIN_SPEECH_S", 0.5)
+WS_ENDPOINT_SILENCE_S = _float("WS_ENDPOINT_SILENCE_S", 0.8)
+WS_SILENCE_RMS = _float("WS_SILENCE_RMS", 0.01)
+
+# === Voice-activity detection ===
+VAD_ENABLED = _bool("VAD_ENABLED", True)
+VAD_FRAME_MS = _float("VAD_FRAME_MS", 30)
+VAD_THRESHOLD_DB = _float("VAD_THRESHOLD_DB", -45)
+VAD_MARGIN_DB = _float("VAD_MARGIN_DB", 10)
+VAD_MIN_SPEECH_MS = _float("VAD_MIN_SPEECH_MS", 150)
+VAD_MAX_GAP_MS = _float("VAD_MAX_GAP_MS", 500)
+VAD_PAD_MS = _float("VAD_PAD_MS", 200)
+
+# === Ollama ===
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "llama3.2:3b")
+# One pooled HTTP client is shared by every LLM call
+OLLAMA_MAX_CONNECTIONS = _int("OLLAMA_MAX_CONNECTIONS", 8)
+OLLAMA_TIMEOUT_S = _float("OLLAMA_TIMEOUT_S", 120)  # 0 = no timeout
+# How long Ollama keeps the model loaded after a call: "30m", "2h",
+# seconds, or -1 for as long as the server runs
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = _int("OLLAMA_NUM_CTX", 0)  # 0 = model default
+OLLAMA_NUM_THREAD = _int("OLLAMA_NUM_THREAD", 0)  # 0 = Ollama picks
+# The keeper re-pings the model so it never unloads during active hours
+# ("08:00-18:00,19:00-21:00", local time; empty = always)
+OLLAMA_KEEPER = _bool("OLLAMA_KEEPER", True)
+OLLAMA_ACTIVE_HOURS = os.getenv("OLLAMA_ACTIVE_HOURS", "")
+OLLAMA_KEEPER_INTERVAL_S = _float("OLLAMA_KEEPER_INTERVAL_S", 120)
+
+# === Answer cache ===
+ANSWER_CACHE_ENABLED = _bool("ANSWER_CACHE_ENABLED", True)
+ANSWER_CACHE_SIZE = _int("ANSWER_CACHE_SIZE", 256)
+ANSWER_CACHE_TTL_S = _float("ANSWER_CACHE_TTL_S", 3600)
+SEMANTIC_CACHE_ENABLED = _bool("SEMANTIC_CACHE_ENABLED", True)
+SEMANTIC_CACHE_SIZE = _int("SEMANTIC_CACHE_SIZE", 256)
+SEMANTIC_CACHE_THRESHOLD = _float("SEMANTIC_CACHE_THRESHOLD", 0.92)
+
+# === Conversation sessions ===
+# Clients that send a session ID get follow-up questions answered with the
+# recent turns (older ones summarized) in the prompt, within a token budget
+SESSIONS_ENABLED = _bool("SESSIONS_ENABLED", True)
+SESSION_TTL_S = _float("SESSION_TTL_S", 600)
+SESSION_MAX = _int("SESSION_MAX", 200 if LOW_MEMORY else 1000)
+SESSION_MAX_TURNS = _int("SESSION_MAX_TURNS", 3)
+SESSION_TOKEN_BUDGET = _int("SESSION_TOKEN_BUDGET", 400)
+SESSION_SUMMARY_TOKENS = _int("SESSION_SUMMARY_TOKENS", 120)
+
+# === Knowledge base retrieval ===
+KNOWLEDGE_FILE = os.getenv("KNOWLEDGE_FILE", os.path.join(BASE_DIR, "srinivas_data.txt"))
+RETRIEVAL_TOP_K = _int("RETRIEVAL_TOP_K", 3)
+RETRIEVAL_TOKEN_BUDGET = _int("RETRIEVAL_TOKEN_BUDGET", 600)
+RETRIEVAL_CHUNK_SIZE = _int("RETRIEVAL_CHUNK_SIZE", 600)
+RETRIEVAL_MIN_SCORE = _float("RETRIEVAL_MIN_SCORE", 0.2)
+KB_INDEX_DIR = os.getenv("KB_INDEX_DIR", os.path.join(BASE_DIR, "kb_index"))
+KB_WATCH_INTERVAL_S = _float("KB_WATCH_INTERVAL_S", 30)
+# Hybrid retrieval: BM25 alone when one chunk clearly covers the question,
+# otherwise BM25 fused with the vector scores (0 = vector search only)
+RETRIEVAL_LEXICAL_WEIGHT = _float("RETRIEVAL_LEXICAL_WEIGHT", 0.3)
+RETRIEVAL_LEXICAL_MIN_SCORE = _float("RETRIEVAL_LEXICAL_MIN_SCORE", 0.75)
+RETRIEVAL_LEXICAL_MARGIN = _float("RETRIEVAL_LEXICAL_MARGIN", 1.25)
+QUERY_EMBED_CACHE_SIZE = _int("QUERY_EMBED_CACHE_SIZE", 1024)
+
+# === Prompt layout ===
+# "retrieval": top-k chunks per question (small prompt, prefilled every time)
+# "prefix": the whole knowledge base as a fixed system prompt, so Ollama's
+# KV cache covers it and only the question is prefilled (see prompts.py)
+PROMPT_MODE = os.getenv("PROMPT_MODE", "retrieval").strip().lower()
+
+# === Transcript normalization ===
+# Fix misheard proper nouns locally and prime Whisper with them
+TRANSCRIPT_NORMALIZER = _bool("TRANSCRIPT_NORMALIZER", True)
+STT_PROMPT_BIAS = _bool("STT_PROMPT_BIAS", True)
+
+# === Transcript cache ===
+# Uploads heard before (same bytes, or the same recording re-encoded) skip
+# decode and Whisper. The directory, if set, keeps them across restarts.
+TRANSCRIPT_CACHE_ENABLED = _bool("TRANSCRIPT_CACHE_ENABLED", True)
+TRANSCRIPT_CACHE_SIZE = _int("TRANSCRIPT_CACHE_SIZE", 512)
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR") or None
+
+# === Structured lookups ===
+LOOKUP_ENABLED = _bool("LOOKUP_ENABLED", True)
+
+# === Text-to-speech ===
+TTS_ENABLED = _bool("TTS_ENABLED", False)
+TTS_POOL_SIZE = _int("TTS_POOL_SIZE", 1 if LOW_MEMORY else 2)
+TTS_VOICE = os.getenv("TTS_VOICE") or None
+TTS_RATE = _int("TTS_RATE", 0) or None
+TTS_CACHE_MB = _int("TTS_CACHE_MB", 32)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR") or None
+
+# === LLM providers and routing ===
+# Comma-separated, in order of preference: ollama, gemini, stub
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "ollama")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+LLM_HEDGE = _bool("LLM_HEDGE", True)
+LLM_HEDGE_AFTER_S = _float("LLM_HEDGE_AFTER_S", 0)  # 0 = primary's rolling p95
+LLM_STATS_WINDOW = _int("LLM_STATS_WINDOW", 50)
+LLM_MAX_ERROR_RATE = _float("LLM_MAX_ERROR_RATE", 0.5)
+STUB_FIRST_TOKEN_S = _float("STUB_FIRST_TOKEN_S", 0.05)
+STUB_TOKENS_PER_S = _float("STUB_TOKENS_PER_S", 50)
@@ -0,0 +1,210 @@
+# Micro-batching scheduler in front of Whisper. Requests that arrive within a
+# short window are stacked into one mel batch and decoded together, so the
+# encoder matmuls amortize across concurrent users on CPU-only boxes.
+#
+# Each job may carry a cancel token. Cancelled jobs are dropped before they
+# are batched, and a batch whose jobs have all been cancelled is aborted
+# between decoder steps.
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from dataclasses import dataclass, field
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+from whisper.decoding import DecodingTask, LogitFilter
+
+from cancellation import RequestCancelled
+
+# How often a waiting caller re-checks its cancel token
+CANCEL_POLL_S = 0.05
+
+
+@dataclass
+class _Job:
+    audio: np.ndarray
+    mel: torch.Tensor = None
+    cancel: object = None
+    future: Future = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel is not None and self.cancel.is_set()
+
+
+class _BatchAborted(Exception):
+    pass
+
+
+class _AbortWhenCancelled(LogitFilter):
+    """Stops the decoder loop once nobody is waiting for the batch."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def apply(self, logits, tokens):
+        if all(job.cancelled for job in self.jobs):
+            raise _BatchAborted()
+
+
+class WhisperBatcher:
+    def __init__(self, model, window_ms: float = 30, max_batch: int = 8, language: str = None,
+                 prompt: str = None):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.options = whisper.DecodingOptions(
+            language=language,
+            prompt=prompt,  # glossary of names Whisper should expect
+            without_timestamps=True,
+            fp16=model.device.type == "cuda",
+        )
+        self.batches = 0
+        self.batched_items = 0
+        self.cancelled = 0
+        self.aborted_batches = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="stt-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio: np.ndarray, cancel=None) -> Future:
+        job = _Job(audio=audio, cancel=cancel)
+        if len(audio) <= N_SAMPLES:
+            # The mel is computed on the caller's thread so it overlaps other work
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+            job.mel = mel
+        self._queue.put(job)
+        return job.future
+
+    def transcribe(self, audio: np.ndarray, cancel=None) -> dict:
+        """Blocking drop-in for ``stt_model.transcribe(audio)``."""
+        future = self.submit(audio, cancel)
+        if cancel is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_S)
+            except TimeoutError:
+                # Give up right away; the worker drops or aborts the job itself
+                cancel.check()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.batched_items,
+            "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+            "cancelled": self.cancelled,
+            "aborted_batches": self.aborted_batches,
+        }
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # finish this batch, stop on the next pass
+                break
+            batch.append(job)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [job for job in batch if not self._drop_if_cancelled(job)]
+            short = [job for job in batch if job.mel is not None]
+            long = [job for job in batch if job.mel is None]
+            if short:
+                self._run_batch(short)
+            for job in long:
+                # Clips over 30 s need Whisper's sliding-window transcribe
+                self._run_single(job)
+
+    def _drop_if_cancelled(self, job) -> bool:
+        if not job.cancelled:
+            return False
+        self.cancelled += 1
+        job.future.set_exception(RequestCancelled(job.cancel.reason))
+        return True
+
+    def _run_batch(self, jobs):
+        try:
+            mels = torch.stack([job.mel for job in jobs]).to(self.model.device)
+            # Same as whisper.decode(), plus a filter that can abort the loop
+            task = DecodingTask(self.model, self.options)
+            if any(job.cancel is not None for job in jobs):
+                task.logit_filters.append(_AbortWhenCancelled(jobs))
+            with torch.inference_mode():
+                results = task.run(mels)
+        except _BatchAborted:
+            self.aborted_batches += 1
+            for job in jobs:
+                self.cancelled += 1
+                job.future.set_exception(RequestCancelled(job.cancel.reason))
+            return
+        except Exception as e:
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_items += len(jobs)
+        for job, result in zip(jobs, results):
+            job.future.set_result({
+                "text": result.text,
+                "language": result.language,
+                "avg_logprob": result.avg_logprob,
+                "no_speech_prob": result.no_speech_prob,
+            })
+
+    def _run_single(self, job):
+        if self._drop_if_cancelled(job):
+            return
+        try:
+            job.future.set_result(self.model.transcribe(
+                job.audio, language=self.options.language, fp16=self.options.fp16,
+                initial_prompt=self.options.prompt,
+            ))
+        except Exception as e:
+            job.future.set_exception(e)
+
+
+def load_model(name: str, download_root: str = None, quantize: str = None):
+    """Load a Whisper checkpoint, optionally with int8 dynamic quantization."""
+    if quantize not in (None, "int8"):
+        raise ValueError(f"Unsupported STT_QUANTIZE value: {quantize}")
+    # Quantized kernels are CPU only
+    model = whisper.load_model(name, device="cpu" if quantize else None, download_root=download_root)
+    if quantize == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+def quantize_int8(model):
+    # whisper.model.Linear only adds a dtype cast in forward(); turn it back
+    # into nn.Linear, which is what quantize_dynamic knows how to swap out
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
@@ -0,0 +1,259 @@
+# Shared speech-to-text process. Whisper is loaded once here and every
+# uvicorn worker sends it audio over IPC, so adding HTTP workers doesn't
+# multiply the model's memory.
+#
+#   export STT_SERVER_AUTHKEY=$(python -c 'import secrets; print(secrets.token_urlsafe(32))')
+#   STT_SERVER_ADDRESS=/tmp/envision-stt.sock python -m stt_server
+#   STT_SERVER_ADDRESS=/tmp/envision-stt.sock uvicorn main:app --workers 3
+#
+# Requests from all workers meet in one WhisperBatcher, so concurrent
+# utterances are still decoded as a batch. A worker that gives up on a
+# request sends "cancel" on the same connection and the job is dropped or
+# aborted here too.
+import ipaddress
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+import settings
+from cancellation import CancelToken, RequestCancelled, check
+from memory import process_memory
+
+CANCEL_POLL_S = 0.05
+# multiprocessing.connection unpickles whatever an authenticated peer sends,
+# so the key is the only thing between the socket and code execution
+MIN_AUTHKEY_BYTES = 16
+
+
+def parse_address(address: str):
+    # "host:port" is TCP, anything else is a Unix socket path
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        host = host or "127.0.0.1"
+        if not is_loopback(host):
+            raise ValueError(f"STT server TCP address must be loopback, got {host!r}; use a Unix socket path instead")
+        return (host, int(port))
+    return address
+
+
+def is_loopback(host: str) -> bool:
+    # IPv4 only: multiprocessing.connection treats a (host, port) tuple as AF_INET
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.IPv4Address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_authkey(authkey):
+    if not authkey or len(authkey) < MIN_AUTHKEY_BYTES:
+        raise SystemExit(
+            f"Set STT_SERVER_AUTHKEY to a secret of at least {MIN_AUTHKEY_BYTES} characters, "
+            "e.g. `python -c 'import secrets; print(secrets.token_urlsafe(32))'`"
+        )
+    return authkey
+
+
+class STTServer:
+    def __init__(self, address: str, authkey: bytes, model, batcher=None, prompt: str = None, tiers=None):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.model = model
+        self.batcher = batcher
+        self.prompt = prompt
+        self.tiers = tiers
+        self.requests = 0
+        self.cancelled = 0
+        self.connections = 0
+        self._pool = ThreadPoolExecutor(thread_name_prefix="stt-server")
+
+    def transcribe(self, audio: np.ndarray, cancel=None):
+        if self.tiers is not None:
+            return self.tiers.transcribe(audio, cancel)
+        return self._transcribe_model(audio, cancel)
+
+    def _transcribe_model(self, audio: np.ndarray, cancel=None):
+        if self.batcher is not None:
+            return self.batcher.transcribe(audio, cancel)
+        check(cancel)
+        return self.model.transcribe(audio, initial_prompt=self.prompt)
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        with Listener(self.address, authkey=self.authkey) as listener:
+            if isinstance(self.address, str):
+                os.chmod(self.address, 0o600)  # only this user's workers may connect
+            print(f"🎧 STT server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # A client with the wrong authkey must not take the server down
+                    print("⚠️ Rejected STT connection:", e)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), name="stt-conn", daemon=True).start()
+
+    def _handle(self, conn):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if kind == "transcribe":
+                        self.requests += 1
+                        reply = ("ok", self._transcribe(conn, np.frombuffer(payload, dtype=np.float32)))
+                    elif kind == "cancel":
+                        continue  # arrived after the reply was sent; nothing to stop
+                    elif kind == "stats":
+                        reply = ("ok", self.stats())
+                    elif kind == "ping":
+                        reply = ("ok", None)
+                    else:
+                        reply = ("error", f"unknown request {kind!r}")
+                except RequestCancelled as e:
+                    self.cancelled += 1
+                    reply = ("cancelled", e.reason)
+                except Exception as e:
+                    reply = ("error", str(e))
+                conn.send(reply)
+        finally:
+            self.connections -= 1
+            conn.close()
+
+    def _transcribe(self, conn, audio: np.ndarray):
+        # Transcribe on a pool thread while listening for a "cancel" from the client
+        cancel = CancelToken()
+        future = self._pool.submit(self.transcribe, audio, cancel)
+        while not future.done():
+            if conn.poll(CANCEL_POLL_S):
+                kind, reason = conn.recv()
+                if kind == "cancel":
+                    cancel.cancel(reason)
+        return future.result()
+
+    def stats(self):
+        stats = {
+            "model": settings.STT_MODEL,
+            "quantize": settings.STT_QUANTIZE,
+            "requests": self.requests,
+            "cancelled": self.cancelled,
+            "connections": self.connections,
+            **process_memory(),
+        }
+        if self.batcher is not None:
+            stats["batching"] = self.batcher.stats()
+        if self.tiers is not None:
+            stats["tiers"] = self.tiers.report()
+        return stats
+
+
+class RemoteTranscriber:
+    """Drop-in ``transcribe(audio)`` backed by a shared STT server.
+
+    Each calling thread keeps its own connection, so concurrent requests
+    reach the server (and its batcher) concurrently.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self._local = threading.local()
+
+    def _call(self, kind: str, payload=None, cancel=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((kind, payload))
+            if cancel is not None:
+                sent_cancel = False
+                while not conn.poll(CANCEL_POLL_S):
+                    if not sent_cancel and cancel.is_set():
+                        conn.send(("cancel", cancel.reason))
+                        sent_cancel = True
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # Server restarted: reconnect on the next call
+            self._local.conn = None
+            conn.close()
+            raise
+        if status == "cancelled":
+            raise RequestCancelled(result)
+        if status != "ok":
+            raise RuntimeError(f"STT server error: {result}")
+        return result
+
+    def transcribe(self, audio: np.ndarray, cancel=None) -> dict:
+        return self._call("transcribe", np.ascontiguousarray(audio, dtype=np.float32).tobytes(), cancel)
+
+    def stats(self):
+        return self._call("stats")
+
+    def wait_until_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._call("ping")
+            except (OSError, EOFError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+
+def main():
+    from stt_batcher import WhisperBatcher, load_model
+    from stt_tiers import TieredTranscriber
+    from transcript_normalizer import TranscriptNormalizer
+
+    if not settings.STT_SERVER_ADDRESS:
+        raise SystemExit("Set STT_SERVER_ADDRESS to a socket path or host:port")
+
+    print(f"🎧 Loading Whisper model '{settings.STT_MODEL}' (quantize={settings.STT_QUANTIZE})...")
+    model = load_model(settings.STT_MODEL, settings.MODEL_CACHE_DIR, settings.STT_QUANTIZE)
+    prompt = None
+    if settings.STT_PROMPT_BIAS:
+        with open(settings.KNOWLEDGE_FILE, encoding="utf-8") as f:
+            prompt = TranscriptNormalizer(f.read()).initial_prompt()
+
+    def make_batcher(whisper_model):
+        return WhisperBatcher(
+            whisper_model,
+            window_ms=settings.STT_BATCH_WINDOW_MS,
+            max_batch=settings.STT_BATCH_MAX_SIZE,
+            language=settings.STT_LANGUAGE,
+            prompt=prompt,
+        )
+
+    batcher = make_batcher(model) if settings.STT_BATCHING else None
+    server = STTServer(settings.STT_SERVER_ADDRESS, settings.STT_SERVER_AUTHKEY, model, batcher, prompt)
+    if settings.STT_FAST_MODEL:
+        print(f"🎧 Loading fast Whisper tier '{settings.STT_FAST_MODEL}'...")
+        fast_model = load_model(settings.STT_FAST_MODEL, settings.MODEL_CACHE_DIR, settings.STT_QUANTIZE)
+        if settings.STT_BATCHING:
+            fast = make_batcher(fast_model).transcribe
+        else:
+            def fast(audio, cancel=None):
+                check(cancel)
+                return fast_model.transcribe(audio, initial_prompt=prompt)
+        server.tiers = TieredTranscriber(
+            fast,
+            server._transcribe_model,
+            max_fast_audio_s=settings.STT_FAST_MAX_AUDIO_S,
+            min_avg_logprob=settings.STT_ESCALATE_LOGPROB,
+            max_no_speech_prob=settings.STT_ESCALATE_NO_SPEECH,
+        )
+    print(f"📏 STT server memory: {process_memory()}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Two Whisper tiers: a small fast model (tiny) and the accurate one (base).
+# Short clips go to the fast model first and are re-run on the accurate
+# model only when the first pass looks unsure: low average log-prob, high
+# no-speech probability or no text at all. Long clips go straight to the
+# accurate model, where tiny's errors are most likely.
+#
+# The report shows how traffic split between the tiers, how often the fast
+# tier had to escalate and an estimate of the STT time saved against
+# sending everything to the accurate model.
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+FAST = "fast"
+ACCURATE = "accurate"
+
+
+def confidence(result: dict):
+    """(avg_logprob, no_speech_prob) of a decode or a whisper.transcribe() result."""
+    if "avg_logprob" in result:
+        return result["avg_logprob"], result["no_speech_prob"]
+    segments = result.get("segments") or []
+    if not segments:
+        return None, None
+    return (
+        float(np.mean([s["avg_logprob"] for s in segments])),
+        float(np.mean([s["no_speech_prob"] for s in segments])),
+    )
+
+
+class _TierStats:
+    def __init__(self, window: int):
+        self.requests = 0
+        self.audio_s = 0.0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=window)
+        # Seconds of compute per second of audio, for the savings estimate
+        self.rates = deque(maxlen=window)
+
+    def record(self, seconds: float, audio_s: float):
+        self.requests += 1
+        self.audio_s += audio_s
+        self.seconds += seconds
+        self.latencies.append(seconds)
+        if audio_s > 0:
+            self.rates.append(seconds / audio_s)
+
+    def snapshot(self):
+        latencies = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "audio_s": round(self.audio_s, 1),
+            "seconds": round(self.seconds, 3),
+            "p50_s": round(float(np.percentile(latencies, 50)), 4) if latencies else None,
+            "p95_s": round(float(np.percentile(latencies, 95)), 4) if latencies else None,
+        }
+
+
+class TieredTranscriber:
+    def __init__(self, fast, accurate, max_fast_audio_s: float = 8.0,
+                 min_avg_logprob: float = -0.7, max_no_speech_prob: float = 0.5, window: int = 200):
+        # ``fast`` / ``accurate``: transcribe(audio, cancel=None) -> dict
+        self.fast = fast
+        self.accurate = accurate
+        self.max_fast_audio_s = max_fast_audio_s
+        self.min_avg_logprob = min_avg_logprob
+        self.max_no_speech_prob = max_no_speech_prob
+        self.tiers = {FAST: _TierStats(window), ACCURATE: _TierStats(window)}
+        self.routed = Counter()
+        self.escalations = Counter()
+        # Fast-tier time spent on clips that were escalated anyway
+        self.wasted_s = 0.0
+        # Fast-tier answers that were kept
+        self.kept_seconds = 0.0
+        self.kept_audio_s = 0.0
+        self._lock = threading.Lock()
+
+    def escalation_reason(self, result: dict):
+        if not result.get("text", "").strip():
+            return "empty"
+        avg_logprob, no_speech_prob = confidence(result)
+        if avg_logprob is not None and avg_logprob < self.min_avg_logprob:
+            return "low_logprob"
+        if no_speech_prob is not None and no_speech_prob > self.max_no_speech_prob:
+            return "no_speech"
+        return None
+
+    def _run(self, tier: str, audio: np.ndarray, cancel):
+        start = time.perf_counter()
+        result = (self.fast if tier == FAST else self.accurate)(audio, cancel=cancel)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.tiers[tier].record(seconds, len(audio) / SAMPLE_RATE)
+        return result, seconds
+
+    def transcribe(self, audio: np.ndarray, cancel=None) -> dict:
+        audio_s = len(audio) / SAMPLE_RATE
+        if audio_s > self.max_fast_audio_s:
+            result, _ = self._run(ACCURATE, audio, cancel)
+            with self._lock:
+                self.routed["long"] += 1
+            return {**result, "stt_tier": ACCURATE}
+
+        result, fast_s = self._run(FAST, audio, cancel)
+        reason = self.escalation_reason(result)
+        if reason is None:
+            with self._lock:
+                self.routed[FAST] += 1
+                self.kept_seconds += fast_s
+                self.kept_audio_s += audio_s
+            return {**result, "stt_tier": FAST}
+
+        with self._lock:
+            self.routed["escalated"] += 1
+            self.escalations[reason] += 1
+            self.wasted_s += fast_s
+        result, _ = self._run(ACCURATE, audio, cancel)
+        return {**result, "stt_tier": ACCURATE, "stt_escalated": reason}
+
+    def report(self):
+        with self._lock:
+            short = self.routed[FAST] + self.routed["escalated"]
+            accurate_rates = list(self.tiers[ACCURATE].rates)
+            report = {
+                "max_fast_audio_s": self.max_fast_audio_s,
+                "thresholds": {"min_avg_logprob": self.min_avg_logprob, "max_no_speech_prob": self.max_no_speech_prob},
+                "routed": dict(self.routed),
+                "escalation_rate": round(self.routed["escalated"] / short, 3) if short else None,
+                "escalations": dict(self.escalations),
+                "tiers": {name: stats.snapshot() for name, stats in self.tiers.items()},
+                "wasted_fast_s": round(self.wasted_s, 3),
+            }
+            # What the kept fast answers would have cost on the accurate
+            # tier, at its observed compute per second of audio
+            if accurate_rates:
+                would_have_s = self.kept_audio_s * float(np.median(accurate_rates))
+                report["estimated_saved_s"] = round(would_have_s - self.kept_seconds - self.wasted_s, 3)
+            else:
+                report["estimated_saved_s"] = None
+        return report
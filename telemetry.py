@@ -0,0 +1,158 @@
+# Per-request tracing and Prometheus metrics.
+#
+# Every request gets a RequestTrace with an ID; pipeline stages are timed
+# with ``with trace.stage("stt"): ...`` and all of it is exported on
+# /metrics as histograms. A one-line JSON summary is printed per request.
+import json
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+STAGE_SECONDS = Histogram(
+    "voice_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "voice_request_seconds", "End-to-end request time", ["endpoint", "route"], buckets=STAGE_BUCKETS,
+)
+REQUESTS = Counter(
+    "voice_requests_total", "Requests by endpoint, answer route and outcome", ["endpoint", "route", "status"],
+)
+CANCELLED = Counter(
+    "voice_cancelled_total", "Requests abandoned before finishing, by reason and the stage they were in",
+    ["endpoint", "reason", "stage"],
+)
+AUDIO_SECONDS = Histogram(
+    "voice_audio_seconds", "Audio duration per request", ["kind"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 12, 20, 30, 60),
+)
+STT_TIERS = Counter(
+    "voice_stt_tier_total", "Transcriptions by the Whisper tier that produced them and why the fast tier escalated",
+    ["tier", "escalated"],
+)
+PROMPT_TOKENS = Histogram("voice_prompt_tokens", "Prompt tokens per LLM call", buckets=TOKEN_BUCKETS)
+OUTPUT_TOKENS = Histogram("voice_output_tokens", "Generated tokens per LLM call", buckets=TOKEN_BUCKETS)
+LLM_CALLS = Counter(
+    "voice_llm_calls_total", "LLM calls by provider and whether the model was already loaded",
+    ["provider", "model_state"],
+)
+PREFILL_SECONDS = Histogram(
+    "voice_llm_prefill_seconds", "Prompt evaluation time reported by Ollama, by prompt layout",
+    ["prompt_mode"], buckets=STAGE_BUCKETS,
+)
+PREFILL_TOKENS = Histogram(
+    "voice_llm_prefill_tokens", "Prompt tokens Ollama evaluated (not served from its KV cache)",
+    ["prompt_mode"], buckets=TOKEN_BUCKETS,
+)
+TOKENS_PER_SECOND = Histogram(
+    "voice_llm_tokens_per_second", "Generation speed per LLM call",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 100),
+)
+
+
+def gauge(name: str, documentation: str, fn):
+    """Export a value that is read from ``fn`` at scrape time."""
+    g = Gauge(name, documentation)
+    g.set_function(fn)
+    return g
+
+
+def metrics_payload():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestTrace:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.request_id = uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.attrs = {}
+        self.current_stage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        self.current_stage = name
+        try:
+            yield
+            # Left set when the stage is interrupted, so cancellations can
+            # be attributed to it
+            self.current_stage = None
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def record_stage(self, name: str, seconds: float):
+        # Stages can repeat (e.g. one TTS call per sentence); keep the total
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.labels(name).observe(seconds)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_audio(self, input_s: float, speech_s: float = None):
+        self.set(audio_s=round(input_s, 3))
+        AUDIO_SECONDS.labels("input").observe(input_s)
+        if speech_s is not None:
+            self.set(speech_s=round(speech_s, 3))
+            AUDIO_SECONDS.labels("speech").observe(speech_s)
+
+    def record_stt(self, result: dict):
+        """Which Whisper tier answered, when tiered STT is on."""
+        if "stt_tier" not in result:
+            return
+        escalated = result.get("stt_escalated")
+        self.set(stt_tier=result["stt_tier"])
+        if escalated:
+            self.set(stt_escalated=escalated)
+        STT_TIERS.labels(result["stt_tier"], escalated or "no").inc()
+
+    def record_generation(self, prompt_tokens: int, output_tokens: int, seconds: float):
+        tokens_per_s = output_tokens / seconds if seconds > 0 else 0.0
+        self.set(prompt_tokens=prompt_tokens, output_tokens=output_tokens, tokens_per_s=round(tokens_per_s, 2))
+        PROMPT_TOKENS.observe(prompt_tokens)
+        OUTPUT_TOKENS.observe(output_tokens)
+        if output_tokens:
+            TOKENS_PER_SECOND.observe(tokens_per_s)
+
+    def record_llm_call(self, info):
+        """Provider, warm/cold model state and prefill reported by the LLM router."""
+        provider = info.get("provider", "unknown")
+        state = info.get("model_state", "unknown")
+        mode = info.get("prompt_mode", "unknown")
+        self.set(llm_provider=provider, prompt_mode=mode)
+        if "model_state" in info:
+            self.set(llm_model=state, llm_load_s=info.get("load_s"))
+        LLM_CALLS.labels(provider, state).inc()
+        if "prefill_s" in info:
+            # Reported as its own stage so benchmarks pick it up from the timings
+            self.record_stage("llm_prefill", info["prefill_s"])
+            self.set(prefill_tokens=info["prefill_tokens"])
+            PREFILL_SECONDS.labels(mode).observe(info["prefill_s"])
+            PREFILL_TOKENS.labels(mode).observe(info["prefill_tokens"])
+
+    def record_cancel(self, reason: str, stage: str = None):
+        stage = stage or self.current_stage or "unknown"
+        self.set(cancelled=reason, cancelled_in=stage)
+        CANCELLED.labels(self.endpoint, reason, stage).inc()
+
+    def finish(self, route: str = "none", status: str = "ok"):
+        total = time.perf_counter() - self.started
+        REQUEST_SECONDS.labels(self.endpoint, route).observe(total)
+        REQUESTS.labels(self.endpoint, route, status).inc()
+        print("⏱️ " + json.dumps({
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "route": route,
+            "status": status,
+            "total_s": round(total, 4),
+            "stages": {k: round(v, 4) for k, v in self.stages.items()},
+            **self.attrs,
+        }))
+
+    def timings(self):
+        return {k: round(v, 4) for k, v in self.stages.items()}
@@ -0,0 +1,284 @@
+# Transcript cache for uploads that were heard before: the kiosk demo clip,
+# regression runs replaying the same recordings.
+#
+#   1. sha256 of the raw upload bytes: an identical file skips decode, VAD
+#      and Whisper entirely
+#   2. a tolerant fingerprint of the decoded PCM (gain-normalized loudness
+#      envelope): the same recording re-encoded or re-muxed still skips VAD
+#      and Whisper. Two different utterances can share an envelope, so a
+#      candidate is only accepted if its duration matches and a finer
+#      spectral hash (band-energy difference bits, as in audio
+#      fingerprinting) agrees too. A fingerprint hit is never stored under
+#      the new upload's sha256, so a wrong match can't become exact.
+#
+# Entries are LRU-bounded and can be mirrored to a directory so they survive
+# restarts. Keys are namespaced by the STT configuration (model, language,
+# prompt, VAD settings), so changing any of them starts a fresh cache.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from vad import frame_rms
+
+FINGERPRINT_FRAME_MS = 20
+# Power is averaged over this many frames so a sub-frame shift (encoder
+# delay) barely moves the envelope
+FINGERPRINT_SMOOTH_FRAMES = 5
+# Frames quieter than this (relative to the loudest one) are silence
+FINGERPRINT_FLOOR_DB = -40
+# Recordings whose envelopes differ by less than this on average match
+FINGERPRINT_MAX_MEAN_DB = 2.0
+FINGERPRINT_MAX_P95_DB = 6.0
+# Encoder delay / padding can shift or stretch a clip by a few frames
+FINGERPRINT_MAX_SHIFT = 3
+
+# Confirmation of an envelope match
+DURATION_TOLERANCE_S = 0.1
+DURATION_TOLERANCE_RATIO = 0.02
+SPECTRAL_FRAME = 1024
+SPECTRAL_HOP = 128
+SPECTRAL_BANDS = 9  # 8 bits per frame: sign of each adjacent-band difference over time
+SPECTRAL_FLOOR_DB = -40
+# Share of differing bits above which two recordings are different utterances
+# (unrelated audio sits near 0.5)
+SPECTRAL_MAX_BIT_ERROR = 0.35
+SPECTRAL_MAX_SHIFT = 8
+
+
+@dataclass
+class TranscriptEntry:
+    text: str
+    audio_s: float
+    speech_s: Optional[float] = None
+    audio: Optional[dict] = None  # VAD metrics, as returned to the client
+    silent: bool = False
+    fingerprint: Optional[list] = None
+    spectral: Optional[list] = None  # one byte per frame, -1 where the frame is silent
+
+
+def config_signature(**config) -> str:
+    """Short hash of everything that changes what Whisper would return."""
+    blob = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:12]
+
+
+def raw_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def pcm_fingerprint(audio: np.ndarray) -> Optional[np.ndarray]:
+    """Smoothed loudness envelope in whole dB below the peak, silence trimmed."""
+    rms = frame_rms(audio, FINGERPRINT_FRAME_MS)
+    if not len(rms):
+        return None
+    window = np.ones(FINGERPRINT_SMOOTH_FRAMES) / FINGERPRINT_SMOOTH_FRAMES
+    power = np.convolve(rms.astype(np.float64) ** 2, window, mode="same")
+    db = 10 * np.log10(np.maximum(power, 1e-20))
+    db = np.maximum(db - db.max(), FINGERPRINT_FLOOR_DB)
+    active = np.flatnonzero(db > FINGERPRINT_FLOOR_DB)
+    if not len(active):
+        return None
+    return np.round(db[active[0]:active[-1] + 1]).astype(np.int8)
+
+
+def fingerprint_distance(a: np.ndarray, b: np.ndarray):
+    """(mean, p95) absolute dB difference at the best small frame shift."""
+    a, b = a.astype(np.int16), b.astype(np.int16)
+    best, best_diff = None, None
+    for shift in range(-FINGERPRINT_MAX_SHIFT, FINGERPRINT_MAX_SHIFT + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        n = min(len(x), len(y))
+        if n == 0:
+            continue
+        diff = np.abs(x[:n] - y[:n])
+        mean = float(diff.mean())
+        if best is None or mean < best:
+            best, best_diff = mean, diff
+    if best is None:
+        return None
+    return best, float(np.percentile(best_diff, 95))
+
+
+def spectral_hash(audio: np.ndarray) -> Optional[np.ndarray]:
+    """Per-frame bits: does each band-energy difference rise or fall from the last frame."""
+    if len(audio) < SPECTRAL_FRAME + SPECTRAL_HOP:
+        return None
+    count = 1 + (len(audio) - SPECTRAL_FRAME) // SPECTRAL_HOP
+    # Log-spaced bands between 300 Hz and 4 kHz, where speech lives
+    bins = np.fft.rfftfreq(SPECTRAL_FRAME, 1 / SAMPLE_RATE)
+    edges = np.geomspace(300, 4000, SPECTRAL_BANDS + 1)
+    bands = [(bins >= lo) & (bins < hi) for lo, hi in zip(edges[:-1], edges[1:])]
+    window = np.hanning(SPECTRAL_FRAME)
+    energy = np.empty((count, SPECTRAL_BANDS))
+    # A few hundred frames at a time, so a long clip doesn't materialize every frame at once
+    for start in range(0, count, 256):
+        rows = np.arange(start, min(count, start + 256))
+        frames = audio[SPECTRAL_HOP * rows[:, None] + np.arange(SPECTRAL_FRAME)[None, :]] * window
+        power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+        energy[rows] = np.stack([power[:, band].sum(axis=1) for band in bands], axis=1)
+    db = 10 * np.log10(np.maximum(energy, 1e-20))
+    band_diff = np.diff(db, axis=1)
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    weights = 1 << np.arange(bits.shape[1])
+    hashes = (bits * weights).sum(axis=1).astype(np.int16)
+    # Bits of silent frames are noise: masked out of comparisons
+    loudness = db.max(axis=1)[1:]
+    hashes[loudness - loudness.max() < SPECTRAL_FLOOR_DB] = -1
+    return hashes
+
+
+def spectral_bit_error(a: np.ndarray, b: np.ndarray) -> Optional[float]:
+    """Lowest share of differing bits over frames loud in both, at small shifts."""
+    a, b = np.asarray(a, dtype=np.int16), np.asarray(b, dtype=np.int16)
+    best = None
+    for shift in range(-SPECTRAL_MAX_SHIFT, SPECTRAL_MAX_SHIFT + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        n = min(len(x), len(y))
+        x, y = x[:n], y[:n]
+        loud = (x >= 0) & (y >= 0)
+        if not loud.any():
+            continue
+        differing = np.unpackbits((x[loud] ^ y[loud]).astype(np.uint8)).sum()
+        error = float(differing) / (loud.sum() * (SPECTRAL_BANDS - 1))
+        if best is None or error < best:
+            best = error
+    return best
+
+
+def confirm(entry: TranscriptEntry, audio: np.ndarray, spectral: Optional[np.ndarray]) -> bool:
+    """An envelope match is the same recording only if duration and spectral hash agree."""
+    audio_s = len(audio) / SAMPLE_RATE
+    if abs(audio_s - entry.audio_s) > max(DURATION_TOLERANCE_S, DURATION_TOLERANCE_RATIO * entry.audio_s):
+        return False
+    if spectral is None or entry.spectral is None:
+        return False  # can't confirm: transcribe it instead
+    error = spectral_bit_error(spectral, entry.spectral)
+    return error is not None and error <= SPECTRAL_MAX_BIT_ERROR
+
+
+class TranscriptCache:
+    def __init__(self, max_entries: int = 512, directory: str = None, signature: str = ""):
+        self.max_entries = max_entries
+        self.directory = os.path.join(directory, signature or "default") if directory else None
+        self.entries = OrderedDict()
+        self.fingerprints = {}
+        self.raw_hits = 0
+        self.pcm_hits = 0
+        self.pcm_rejected = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load()
+
+    def _load(self):
+        # Most recently written last, so they survive the LRU bound
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[-self.max_entries:]:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = TranscriptEntry(**json.load(f))
+            except (OSError, ValueError, TypeError) as e:
+                print(f"⚠️ Skipping transcript cache file {path}: {e}")
+                continue
+            self._remember(os.path.basename(path)[:-len(".json")], entry)
+        if self.entries:
+            print(f"🗂️ Loaded {len(self.entries)} cached transcripts")
+
+    def get_raw(self, key: str) -> Optional[TranscriptEntry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.raw_hits += 1
+            return entry
+
+    def get_pcm(self, audio: np.ndarray) -> Optional[TranscriptEntry]:
+        """Match decoded audio against cached recordings (not stored under a new key)."""
+        fingerprint = pcm_fingerprint(audio)
+        if fingerprint is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        slack = FINGERPRINT_MAX_SHIFT + len(fingerprint) // 50
+        with self._lock:
+            candidates = [
+                (k, fp) for k, fp in self.fingerprints.items() if abs(len(fp) - len(fingerprint)) <= slack
+            ]
+        matches = []
+        for candidate_key, candidate in candidates:
+            distance = fingerprint_distance(fingerprint, candidate)
+            if distance is None:
+                continue
+            mean, p95 = distance
+            if mean <= FINGERPRINT_MAX_MEAN_DB and p95 <= FINGERPRINT_MAX_P95_DB:
+                matches.append((mean, candidate_key))
+        spectral = spectral_hash(audio) if matches else None
+        rejected = 0
+        for _, candidate_key in sorted(matches):
+            with self._lock:
+                entry = self.entries.get(candidate_key)
+            if entry is None:
+                continue  # evicted meanwhile
+            if not confirm(entry, audio, spectral):
+                rejected += 1
+                continue
+            with self._lock:
+                self.pcm_hits += 1
+                self.pcm_rejected += rejected
+            return entry
+        with self._lock:
+            self.misses += 1
+            self.pcm_rejected += rejected
+        return None
+
+    def put(self, key: str, entry: TranscriptEntry, audio: np.ndarray = None):
+        if audio is not None and entry.fingerprint is None:
+            fingerprint = pcm_fingerprint(audio)
+            if fingerprint is not None:
+                entry.fingerprint = fingerprint.tolist()
+        if audio is not None and entry.spectral is None:
+            spectral = spectral_hash(audio)
+            if spectral is not None:
+                entry.spectral = spectral.tolist()
+        self._remember(key, entry)
+        if self.directory:
+            path = os.path.join(self.directory, f"{key}.json")
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(asdict(entry), f)
+            os.replace(tmp, path)
+
+    def _remember(self, key: str, entry: TranscriptEntry):
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if entry.fingerprint is not None:
+                self.fingerprints[key] = np.asarray(entry.fingerprint, dtype=np.int8)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                self.fingerprints.pop(evicted, None)
+                if self.directory:
+                    try:
+                        os.remove(os.path.join(self.directory, f"{evicted}.json"))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "raw_hits": self.raw_hits,
+                "pcm_hits": self.pcm_hits,
+                "pcm_rejected": self.pcm_rejected,
+                "misses": self.misses,
+            }
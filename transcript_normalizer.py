@@ -0,0 +1,241 @@
+# Local clean-up of Whisper transcripts. Proper nouns are harvested from
+# srinivas_data.txt (people, campuses, the institute's own name) and
+# misheard spellings ("Shinwas", "Srinivaas", "Walachil") are mapped back to
+# them with a phonetic key plus a fuzzy fallback. The same terms are fed to
+# Whisper as an initial prompt so it gets them right more often to begin
+# with. Replaces the old second LLM "grammar correction" pass.
+import os
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from kb_lookup import STOPWORDS, TITLES, parse_tables
+
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z'’]*")
+ACRONYM_RE = re.compile(r"\b[A-Z]{2,5}\b")
+# Dashes join clauses ("three campuses — Pandeshwar, ..."), they don't end them
+SENTENCE_END_RE = re.compile(r"[.!?:;]\s*$")
+# "Dr. Rao", "A. Shama Rao": the period ends a title or an initial, not a sentence
+TITLE_END_RE = re.compile(r"\b(?:(?i:" + "|".join(TITLES) + r")|[A-Z])\.\s*$")
+# Capitalized words after a title or initial in running text are a name
+TITLED_NAME_RE = re.compile(r"\b(?:(?i:" + "|".join(TITLES) + r")|[A-Z])\. +((?:[A-Z][a-z]+ ?)+)")
+# Title-case vocabulary of headings and designations; not worth priming
+# Whisper with and never a correction target
+GENERIC_WORDS = {
+    "academic", "achievement", "assistant", "associate", "campus", "campuses", "college", "colleges", "cycle", "department",
+    "designation", "faculty", "grade", "group", "institute", "institution", "institutions", "name",
+    "officer", "professor", "program", "programs", "proud", "qualification", "second", "university",
+}
+GENERIC_SUFFIX_RE = re.compile(r"(tion|sion|ology|ogical|ics|ing|ment|ity|ence|ance|ical|ness|ure|ate)s?$")
+HEADING_MAX_WORDS = 4
+
+# Sound-alike spellings collapse to one key: "sh"/"s", "w"/"v", "ph"/"f",
+# aspirated consonants, hard "c"/"k"
+PHONETIC_RULES = [
+    (re.compile(p), r) for p, r in (
+        (r"[^a-z]", ""),
+        (r"ph", "f"),
+        (r"([sbdgkt])h", r"\1"),
+        (r"ch", "c"),
+        (r"c(?=[eiy])", "s"),
+        (r"[cqk]+", "k"),
+        (r"w", "v"),
+        (r"z", "s"),
+        (r"x", "ks"),
+        (r"(.)\1+", r"\1"),
+    )
+]
+
+# Whisper mishearings that aren't proper nouns but matter for retrieval
+COMMON_FIXES = {"collage": "college", "collages": "colleges"}
+
+MIN_WORD_LEN = 4
+FUZZY_MIN_LEN = 5
+FUZZY_THRESHOLD = 0.78
+# The phonetic key matters more than the spelling for misheard names
+PHONETIC_WEIGHT = 0.6
+PROMPT_MAX_CHARS = 400
+
+
+def spelling_key(word: str) -> str:
+    """Lowercase with doubled letters collapsed ("Srinivaas" -> "srinivas")."""
+    return re.sub(r"(.)\1+", r"\1", word.lower().replace("’", "'"))
+
+
+def phonetic_key(word: str) -> str:
+    key = word.lower()
+    for pattern, repl in PHONETIC_RULES:
+        key = pattern.sub(repl, key)
+    # Keep the first letter, then consonants only
+    return key[:1] + re.sub(r"[aeiouy]", "", key[1:]) if key else ""
+
+
+def similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def name_words(text: str, tables=None) -> set:
+    """Lowercased words of people's names: faculty, the placement officer and
+    anyone introduced with a title or an initial."""
+    tables = tables or parse_tables(text)
+    names = [member.name for department in tables.departments.values() for member in department.faculty]
+    if tables.placement_officer:
+        names.append(tables.placement_officer)
+    names += [match.group(1) for match in TITLED_NAME_RE.finditer(text)]
+    words = {w.lower() for name in names for w in WORD_RE.findall(name) if w.lower() not in TITLES}
+    # "A. Shama Rao Foundation": the name stops before ordinary words
+    return {w for w in words if w not in GENERIC_WORDS and not GENERIC_SUFFIX_RE.search(w)}
+
+
+def generic_words(text: str, tables=None) -> set:
+    """Lowercased title-case words that are ordinary vocabulary: table
+    columns, designations, department and program names, short headings."""
+    tables = tables or parse_tables(text)
+    phrases = list(tables.programs)
+    phrases += [p for programs in tables.programs.values() for p in programs]
+    for department in tables.departments.values():
+        phrases.append(department.name)
+        phrases += [f"{m.designation} {m.qualification}" for m in department.faculty]
+    for line in text.splitlines():
+        line = line.strip()
+        words = WORD_RE.findall(line)
+        if 0 < len(words) <= HEADING_MAX_WORDS and not SENTENCE_END_RE.search(line) and not TITLED_NAME_RE.search(line):
+            phrases.append(line)
+    words = {w.lower() for phrase in phrases for w in WORD_RE.findall(phrase)}
+    return words | GENERIC_WORDS
+
+
+def is_generic(word: str, generic: set) -> bool:
+    lower = word.lower()
+    return lower in generic or bool(GENERIC_SUFFIX_RE.search(lower))
+
+
+def extract_terms(text: str) -> Counter:
+    """Proper nouns in ``text`` with their counts.
+
+    A word counts as a proper noun when it is capitalized somewhere other
+    than the start of a sentence, never appears in lowercase and is not
+    heading or designation vocabulary. People's names always count.
+    """
+    tables = parse_tables(text)
+    vocabulary = {w.lower() for w in WORD_RE.findall(text) if w[0].islower()}
+    names = name_words(text, tables)
+    generic = generic_words(text, tables) - names
+    counts = Counter()
+    for line in text.splitlines():
+        for match in WORD_RE.finditer(line):
+            word = match.group()
+            if len(word) < MIN_WORD_LEN or not word[0].isupper() or word.isupper():
+                continue
+            before = line[:match.start()]
+            sentence_start = not before.strip() or (SENTENCE_END_RE.search(before) and not TITLE_END_RE.search(before))
+            lower = word.lower()
+            if lower in names or (lower not in vocabulary and not sentence_start and not is_generic(word, generic)):
+                counts[word] += 1
+
+    # Faculty names come from the tables, wherever they sit in a line
+    for department in tables.departments.values():
+        for member in department.faculty:
+            for word in WORD_RE.findall(member.name):
+                if len(word) >= MIN_WORD_LEN and word.lower() not in vocabulary and word.lower() not in TITLES:
+                    counts[word] += 1
+    return counts
+
+
+class TranscriptNormalizer:
+    def __init__(self, text: str):
+        self.terms = extract_terms(text)
+        self.names = name_words(text)
+        # Words the knowledge base itself uses are never "corrected"
+        self.vocabulary = {w.lower() for w in WORD_RE.findall(text)} | STOPWORDS
+        self.acronyms = Counter(ACRONYM_RE.findall(text))
+        self.by_spelling = {}
+        self.by_sound = {}
+        self.by_initial = {}
+        # Most frequent spelling wins when two terms share a key
+        for term, _ in self.terms.most_common():
+            self.by_spelling.setdefault(spelling_key(term), term)
+            sound = phonetic_key(term)
+            self.by_sound.setdefault(sound, term)
+            self.by_initial.setdefault(sound[:1], []).append((term, sound, spelling_key(term)))
+        self.corrections = 0
+        self._lookup = lru_cache(maxsize=4096)(self._find)
+
+    def _find(self, word: str):
+        if word.lower() in COMMON_FIXES:
+            return COMMON_FIXES[word.lower()]
+        key = spelling_key(word)
+        term = self.by_spelling.get(key) or self.by_sound.get(phonetic_key(word))
+        if term is not None or len(word) < FUZZY_MIN_LEN:
+            return term
+
+        sound = phonetic_key(word)
+        best, best_score = None, 0.0
+        for term, term_sound, term_key in self.by_initial.get(sound[:1], ()):
+            if abs(len(term_key) - len(key)) > 3:
+                continue
+            # Inflections of a term ("technologies") are real words, not mishearings
+            if len(os.path.commonprefix([key, term_key])) >= min(len(key), len(term_key)) - 3:
+                continue
+            score = PHONETIC_WEIGHT * similarity(sound, term_sound) + (1 - PHONETIC_WEIGHT) * similarity(key, term_key)
+            if score > best_score:
+                best, best_score = term, score
+        return best if best_score >= FUZZY_THRESHOLD else None
+
+    def _unknown_name(self, word: str) -> bool:
+        # Capitalized, not a knowledge base word and nothing we would map it to
+        return word[:1].isupper() and word.lower() not in self.vocabulary and self._lookup(word) is None
+
+    def normalize(self, text: str) -> str:
+        matches = list(WORD_RE.finditer(text))
+
+        def fix(i):
+            word = matches[i].group()
+            lower = word.lower()
+            if len(word) < MIN_WORD_LEN or (lower in self.vocabulary and lower not in COMMON_FIXES):
+                return word
+            term = self._lookup(word)
+            if term is None or spelling_key(term) == spelling_key(word) and term.lower() == lower:
+                return word
+            key, term_key = spelling_key(word), spelling_key(term)
+            # "Srinivasa" is a different name that starts with "Srinivas", not a mishearing
+            if key != term_key and (key.startswith(term_key) or term_key.startswith(key)):
+                return word
+            # Next to a name we don't know ("Srinivasa Ramanujan"): leave the whole name alone
+            neighbours = [matches[j].group() for j in (i - 1, i + 1) if 0 <= j < len(matches)]
+            if word[:1].isupper() and any(self._unknown_name(n) for n in neighbours):
+                return word
+            self.corrections += 1
+            return term
+
+        parts, last = [], 0
+        for i, match in enumerate(matches):
+            parts.append(text[last:match.start()])
+            parts.append(fix(i))
+            last = match.end()
+        parts.append(text[last:])
+        return "".join(parts)
+
+    def initial_prompt(self, max_chars: int = PROMPT_MAX_CHARS) -> str:
+        """Comma-separated glossary for Whisper's ``initial_prompt``: people's
+        names first, then places and other proper nouns, then acronyms."""
+        ranked = sorted(self.terms.items(), key=lambda item: (item[0].lower() not in self.names, -item[1]))
+        words = [term for term, _ in ranked]
+        words += [acronym for acronym, _ in self.acronyms.most_common()]
+        prompt = ""
+        for word in words:
+            candidate = f"{prompt}, {word}" if prompt else word
+            if len(candidate) > max_chars:
+                break
+            prompt = candidate
+        return prompt + "." if prompt else ""
+
+    def stats(self):
+        info = self._lookup.cache_info()
+        return {
+            "terms": len(self.terms),
+            "corrections": self.corrections,
+            "lookup_cache_hits": info.hits,
+            "lookup_cache_misses": info.misses,
+        }
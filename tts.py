@@ -1,10 +1,15 @@
 # Text-to-Speech
 import pyttsx3
 
+# One warm engine for the whole process; pyttsx3.init() is slow
+_engine = None
+
 def speak_text(text):
-    engine = pyttsx3.init()
-    engine.say(text)
-    engine.runAndWait()
+    global _engine
+    if _engine is None:
+        _engine = pyttsx3.init()
+    _engine.say(text)
+    _engine.runAndWait()
 
 speak_text("Hello World")
 
@@ -0,0 +1,349 @@
+# Server-side text-to-speech for networked clients.
+#
+# * A pool of warm pyttsx3 engines, each in its own process. pyttsx3.init()
+#   hands every thread the same cached engine, and the drivers (espeak,
+#   SAPI) keep process-wide state, so two engines in one process race.
+# * Replies are synthesized sentence by sentence so audio can be streamed
+#   while the LLM is still generating later sentences.
+# * A content-addressed cache (in memory, optionally on disk) for phrases
+#   that are spoken over and over: greetings, canned and cached answers.
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, decode_audio
+
+# Streamed audio is raw 16-bit mono PCM at the pipeline sample rate
+PCM_CONTENT_TYPE = f"audio/l16; rate={SAMPLE_RATE}; channels=1"
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+ABBREVIATION_RE = re.compile(r"\b(Dr|Mr|Mrs|Ms|Prof|St|No|Sl|[A-Z])\.$")
+
+
+def to_pcm16(audio: np.ndarray) -> bytes:
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class SentenceSplitter:
+    """Turns a token stream into complete sentences."""
+
+    def __init__(self, min_chars: int = 12):
+        self.buffer = ""
+        self.min_chars = min_chars
+
+    def feed(self, token: str):
+        self.buffer += token
+        sentences = []
+        start = pos = 0
+        while True:
+            match = SENTENCE_END_RE.search(self.buffer, pos)
+            if not match:
+                break
+            pos = match.end()
+            sentence = self.buffer[start:match.start()].strip()
+            # Don't cut after "Dr." / "K." or speak tiny fragments on their own
+            if len(sentence) >= self.min_chars and not ABBREVIATION_RE.search(sentence):
+                sentences.append(sentence)
+                start = pos
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        sentence, self.buffer = self.buffer.strip(), ""
+        return [sentence] if sentence else []
+
+
+def split_sentences(text: str):
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+class PhraseAudioCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, directory: str = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str, rate: int) -> str:
+        normalized = re.sub(r"\s+", " ", text.strip().lower())
+        return hashlib.sha256(f"{voice}|{rate}|{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            pcm = self.entries.get(key)
+            if pcm is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return pcm
+        if self.directory:
+            path = os.path.join(self.directory, f"{key}.pcm")
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+            except OSError:
+                pcm = None
+            if pcm is not None:
+                self._remember(key, pcm)
+                with self._lock:
+                    self.hits += 1
+                return pcm
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, pcm: bytes):
+        self._remember(key, pcm)
+        if self.directory:
+            path = os.path.join(self.directory, f"{key}.pcm")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp, path)
+
+    def _remember(self, key: str, pcm: bytes):
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = pcm
+            self.size += len(pcm)
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.size}
+
+
+def _engine_process(conn, scratch: str, voice: str = None, rate: int = None):
+    """One pyttsx3 engine, alone in its process, rendering into its own file."""
+    import pyttsx3
+
+    try:
+        engine = pyttsx3.init()
+        if voice:
+            engine.setProperty("voice", voice)
+        if rate:
+            engine.setProperty("rate", rate)
+        _render(engine, scratch, "Ready.")  # warm the engine up
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ok", None))
+
+    while True:
+        try:
+            text = conn.recv()
+        except EOFError:
+            break
+        if text is None:
+            break
+        try:
+            _render(engine, scratch, text)
+            conn.send(("ok", None))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+    try:
+        os.remove(scratch)
+    except OSError:
+        pass
+
+
+def _render(engine, scratch: str, text: str):
+    engine.save_to_file(text, scratch)
+    engine.runAndWait()
+
+
+class TTSEnginePool:
+    def __init__(self, size: int = 2, voice: str = None, rate: int = None):
+        self.voice = voice
+        self.rate = rate
+        self._jobs = queue.Queue()
+        self._ready = threading.Barrier(size + 1)
+        self._threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"tts-{i}", daemon=True)
+            for i in range(size)
+        ]
+        for thread in self._threads:
+            thread.start()
+        try:
+            self._ready.wait()
+        except threading.BrokenBarrierError:
+            # Each worker stops its own engine process on the way out
+            raise RuntimeError("TTS engines failed to start") from None
+
+    def _worker(self, index: int):
+        # pyttsx3 can only render to a file; each engine reuses one scratch file
+        scratch = os.path.join(tempfile.gettempdir(), f"tts-worker-{os.getpid()}-{index}.wav")
+        try:
+            conn, process = self._start_engine(index, scratch)
+        except RuntimeError as e:
+            print(f"❌ TTS engine {index} failed to start:", e)
+            self._ready.abort()
+            return
+        try:
+            # Raises if another engine failed: the pool is abandoned, and
+            # leaving this engine running would leak a process per retry
+            self._ready.wait()
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                text, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._synthesize(conn, scratch, text))
+                except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+                    # The engine process died mid-job: this job is lost, but
+                    # the next one gets a fresh engine
+                    future.set_exception(RuntimeError(f"TTS engine {index} died: {e!r}"))
+                    self._stop_engine(conn, process)
+                    print(f"⚠️ TTS engine {index} died, restarting it")
+                    conn, process = self._start_engine(index, scratch)
+                except Exception as e:
+                    future.set_exception(e)
+        except (threading.BrokenBarrierError, RuntimeError) as e:
+            if not isinstance(e, threading.BrokenBarrierError):
+                print(f"❌ TTS engine {index} could not be restarted:", e)
+        finally:
+            self._stop_engine(conn, process)
+
+    def _start_engine(self, index: int, scratch: str):
+        # Spawned, not forked: the server already runs model and pool threads
+        context = multiprocessing.get_context("spawn")
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_engine_process, args=(child_conn, scratch, self.voice, self.rate),
+            name=f"tts-engine-{index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()  # so a dead child shows up as EOF here
+        status, error = self._wait_started(conn, process)
+        if status != "ok":
+            self._stop_engine(conn, process)
+            raise RuntimeError(error)
+        return conn, process
+
+    @staticmethod
+    def _stop_engine(conn, process):
+        try:
+            conn.send(None)
+        except OSError:
+            pass  # already gone
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
+
+    @staticmethod
+    def _wait_started(conn, process, timeout: float = 60):
+        # Poll so an engine process that dies on import fails fast
+        for _ in range(int(timeout / 0.25)):
+            if conn.poll(0.25):
+                return conn.recv()
+            if not process.is_alive():
+                return "error", f"engine process exited with code {process.exitcode}"
+        return "error", "timed out starting"
+
+    @staticmethod
+    def _synthesize(conn, scratch: str, text: str) -> bytes:
+        conn.send(text)
+        status, error = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"TTS engine failed: {error}")
+        with open(scratch, "rb") as f:
+            return to_pcm16(decode_audio(f.read(), filename=scratch))
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._jobs.put((text, future))
+        return future
+
+    def close(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+
+
+class TTSService:
+    def __init__(self, pool: TTSEnginePool, cache: PhraseAudioCache = None):
+        self.pool = pool
+        self.cache = cache
+
+    def synthesize(self, text: str) -> bytes:
+        """Blocking: 16-bit mono PCM for one sentence or phrase."""
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(text, self.pool.voice or "", self.pool.rate or 0)
+            pcm = self.cache.get(key)
+            if pcm is not None:
+                return pcm
+        pcm = self.pool.submit(text).result()
+        if key is not None:
+            self.cache.put(key, pcm)
+        return pcm
+
+    def stats(self):
+        return self.cache.stats() if self.cache is not None else {}
+
+
+class SpeechStream:
+    """Speaks a token stream sentence by sentence, in order.
+
+    ``synthesize`` is a coroutine function returning PCM for one sentence and
+    ``send`` a coroutine function delivering (sentence, pcm). Synthesis of a
+    sentence starts as soon as it is complete, while later tokens arrive.
+    """
+
+    def __init__(self, synthesize, send):
+        self.synthesize = synthesize
+        self.send = send
+        self.splitter = SentenceSplitter()
+        self.pending = asyncio.Queue()
+        self.sender = asyncio.create_task(self._send_in_order())
+
+    def feed(self, text: str):
+        for sentence in self.splitter.feed(text):
+            self._speak(sentence)
+
+    def _speak(self, sentence: str):
+        self.pending.put_nowait((sentence, asyncio.ensure_future(self.synthesize(sentence))))
+
+    async def finish(self):
+        for sentence in self.splitter.flush():
+            self._speak(sentence)
+        self.pending.put_nowait(None)
+        await self.sender
+
+    def cancel(self):
+        self.sender.cancel()
+        while not self.pending.empty():
+            item = self.pending.get_nowait()
+            if item is not None:
+                item[1].cancel()
+
+    async def _send_in_order(self):
+        while True:
+            item = await self.pending.get()
+            if item is None:
+                break
+            sentence, audio = item
+            await self.send(sentence, await audio)
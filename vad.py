@@ -0,0 +1,113 @@
+# Energy-based voice-activity detection. Runs on decoded PCM before Whisper
+# so leading/trailing silence (and long pauses) never reach the model.
+from dataclasses import dataclass
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+
+@dataclass
+class VadResult:
+    audio: np.ndarray
+    segments: list
+    input_s: float
+    speech_s: float
+
+    @property
+    def is_silent(self) -> bool:
+        return not self.segments
+
+    @property
+    def trimmed_s(self) -> float:
+        return self.input_s - self.speech_s
+
+    def metrics(self):
+        return {
+            "input_s": round(self.input_s, 3),
+            "speech_s": round(self.speech_s, 3),
+            "trimmed_s": round(self.trimmed_s, 3),
+            "trimmed_ratio": round(self.trimmed_s / self.input_s, 3) if self.input_s else 0.0,
+            "segments": len(self.segments),
+        }
+
+
+def frame_rms(audio: np.ndarray, frame_ms: float = 30) -> np.ndarray:
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    usable = len(audio) - len(audio) % frame
+    if usable <= 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:usable].reshape(-1, frame)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def _to_db(rms: np.ndarray) -> np.ndarray:
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech(audio: np.ndarray, frame_ms: float = 30, threshold_db: float = -45,
+                  margin_db: float = 10, min_speech_ms: float = 150,
+                  max_gap_ms: float = 500, pad_ms: float = 200):
+    """Return ``[(start_sample, end_sample), ...]`` of speech regions."""
+    db = _to_db(frame_rms(audio, frame_ms))
+    if not len(db):
+        return []
+
+    # Adapt to the room: speech must clear both the absolute floor and the
+    # estimated noise floor (10th percentile frame energy) by a margin. The
+    # cap keeps clips that are nearly all speech from raising the bar too far.
+    noise_floor = float(np.percentile(db, 10))
+    adaptive = min(noise_floor + margin_db, float(db.max()) - 2 * margin_db)
+    voiced = db > max(threshold_db, adaptive)
+
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    segments = []
+    start = None
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            segments.append([start, i])
+            start = None
+    if start is not None:
+        segments.append([start, len(voiced)])
+
+    # Bridge short pauses, then drop clicks that are too short to be speech
+    max_gap = max_gap_ms / frame_ms
+    merged = []
+    for seg in segments:
+        if merged and seg[0] - merged[-1][1] <= max_gap:
+            merged[-1][1] = seg[1]
+        else:
+            merged.append(seg)
+    min_frames = min_speech_ms / frame_ms
+    merged = [seg for seg in merged if seg[1] - seg[0] >= min_frames]
+
+    pad = int(SAMPLE_RATE * pad_ms / 1000)
+    return [
+        (max(0, s * frame - pad), min(len(audio), e * frame + pad))
+        for s, e in merged
+    ]
+
+
+def trim_silence(audio: np.ndarray, **kwargs) -> VadResult:
+    segments = detect_speech(audio, **kwargs)
+    if segments:
+        # Padding can make neighbours overlap; keep the pieces disjoint
+        pieces = []
+        cursor = 0
+        for start, end in segments:
+            start = max(start, cursor)
+            if end > start:
+                pieces.append(audio[start:end])
+                cursor = end
+        speech = np.concatenate(pieces)
+    else:
+        speech = np.zeros(0, dtype=np.float32)
+
+    return VadResult(
+        audio=speech,
+        segments=segments,
+        input_s=len(audio) / SAMPLE_RATE,
+        speech_s=len(speech) / SAMPLE_RATE,
+    )
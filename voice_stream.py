@@ -0,0 +1,158 @@
+# Audio buffer for the /ws/voice endpoint. Chunks arrive while the user is
+# still talking; the buffer hands out a sliding window for partial
+# transcripts and detects end-of-speech from trailing silence.
+#
+# MediaRecorder sends the container header (EBML + tracks for webm, the
+# OpusHead/OpusTags pages for ogg) only in its first chunk, so the header is
+# kept when the buffer restarts for the next utterance on the same socket.
+#
+# Decoding is incremental once the header is known: webm clusters and ogg
+# pages are self-contained, so each complete one is decoded once (behind a
+# copy of the header) and only the segment still being written is decoded
+# again per chunk. Re-decoding the whole utterance on every chunk would be
+# quadratic, on the decode pool that /upload_audio shares.
+import struct
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, AudioDecodeError, decode_audio
+from vad import frame_rms
+
+WEBM_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+OGG_PAGE = b"OggS"
+
+
+def container_header(data: bytes):
+    """The stream header at the start of ``data``, or None if it isn't complete yet.
+
+    webm: everything before the first Cluster. ogg: the leading pages with
+    granule position 0 (OpusHead and OpusTags).
+    """
+    if data[:4] == b"\x1a\x45\xdf\xa3":
+        cluster = data.find(WEBM_CLUSTER_ID)
+        return data[:cluster] if cluster > 0 else None
+    if data[:4] == b"OggS":
+        offset = 0
+        while data[offset:offset + 4] == b"OggS" and len(data) >= offset + 27:
+            granule = struct.unpack_from("<q", data, offset + 6)[0]
+            segments = data[offset + 26]
+            if len(data) < offset + 27 + segments:
+                return None
+            if granule != 0:
+                return data[:offset]
+            offset += 27 + segments + sum(data[offset + 27:offset + 27 + segments])
+        return None
+    return None
+
+
+def sync_marker(header: bytes):
+    """Bytes that start each independently decodable segment, or None if unknown."""
+    if header is None:
+        return None
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return WEBM_CLUSTER_ID
+    if header[:4] == OGG_PAGE:
+        return OGG_PAGE
+    return None
+
+
+class VoiceStream:
+    def __init__(self, fmt: str = "pcm", content_type: str = None, header: bytes = None):
+        # "pcm": every chunk is raw s16le PCM and can be decoded on its own.
+        # anything else (e.g. "webm" from MediaRecorder): chunks are pieces of
+        # one container, decoded segment by segment behind the header.
+        self.fmt = fmt
+        self.content_type = content_type or ("audio/l16; rate=16000" if fmt == "pcm" else None)
+        self.header = header
+        self._pcm_chunks = []
+        self._encoded = bytearray(header or b"")
+        self._decoded = np.zeros(0, dtype=np.float32)
+        # A header on its own holds no audio: nothing to decode yet
+        self._decoded_len = len(self._encoded)
+        # Audio of the complete segments before byte _committed_to, and of
+        # the segment after it as of the last decode
+        self._committed = np.zeros(0, dtype=np.float32)
+        self._committed_to = len(header) if header else None
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._tail_from = self._committed_to
+        self.bytes_received = 0
+
+    def restart(self) -> "VoiceStream":
+        """An empty buffer for the next utterance, keeping the container header."""
+        return VoiceStream(self.fmt, self.content_type, self.header)
+
+    def feed(self, chunk: bytes):
+        """Add a chunk and decode it. Blocking: call it off the event loop."""
+        self.bytes_received += len(chunk)
+        if self.fmt == "pcm":
+            self._pcm_chunks.append(decode_audio(chunk, content_type=self.content_type, filename="chunk.pcm"))
+        else:
+            self._encoded.extend(chunk)
+            if self.header is None:
+                self.header = container_header(bytes(self._encoded))
+                if self.header is not None:
+                    self._committed_to = self._tail_from = len(self.header)
+        self.audio()
+
+    def audio(self) -> np.ndarray:
+        if self.fmt == "pcm":
+            if len(self._pcm_chunks) > 1:
+                self._pcm_chunks = [np.concatenate(self._pcm_chunks)]
+            return self._pcm_chunks[0] if self._pcm_chunks else np.zeros(0, dtype=np.float32)
+
+        if len(self._encoded) != self._decoded_len:
+            # Marked as tried even if it fails, so duration/window/ends_in_silence
+            # don't retry the same bytes; the next chunk triggers a new attempt
+            self._decoded_len = len(self._encoded)
+            marker = sync_marker(self.header)
+            try:
+                if marker is None:
+                    # Unknown layout: all we can do is decode everything again
+                    self._decoded = self._decode(bytes(self._encoded))
+                else:
+                    self._decoded = self._decode_new(marker)
+            except AudioDecodeError:
+                # A chunk boundary can cut a frame in half; keep the last good decode
+                pass
+        return self._decoded
+
+    def _decode(self, data: bytes) -> np.ndarray:
+        return decode_audio(data, filename=f"stream.{self.fmt}")
+
+    def _decode_new(self, marker: bytes) -> np.ndarray:
+        # Everything before the last sync point is complete: decode it once
+        last = self._encoded.rfind(marker, self._committed_to + 1)
+        if last > self._committed_to:
+            segments = self._decode(self.header + bytes(self._encoded[self._committed_to:last]))
+            self._committed = np.concatenate([self._committed, segments])
+            self._committed_to = last
+        try:
+            self._tail = self._decode(self.header + bytes(self._encoded[self._committed_to:]))
+            self._tail_from = self._committed_to
+        except AudioDecodeError:
+            if self._tail_from != self._committed_to:
+                # The previous tail is part of the committed audio now
+                self._tail = np.zeros(0, dtype=np.float32)
+                self._tail_from = self._committed_to
+        return np.concatenate([self._committed, self._tail])
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio()) / SAMPLE_RATE
+
+    def window(self, seconds: float) -> np.ndarray:
+        audio = self.audio()
+        return audio[-int(seconds * SAMPLE_RATE):]
+
+    def ends_in_silence(self, seconds: float, rms_threshold: float) -> bool:
+        """True once speech was heard and the last ``seconds`` are quiet."""
+        audio = self.audio()
+        tail_len = int(seconds * SAMPLE_RATE)
+        if len(audio) <= tail_len:
+            return False
+
+        head = frame_rms(audio[:len(audio) - tail_len], frame_ms=20)
+        if not len(head) or float(head.max()) < rms_threshold:
+            return False
+        tail = audio[-tail_len:]
+        return float(np.sqrt(np.mean(tail ** 2))) < rms_threshold